@@ -4,9 +4,10 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 from scipy import stats
+from correlation import cluster_order, correlation_matrix, plot_heatmap
+from metrics import timed
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'STHeiti']
@@ -16,9 +17,9 @@ BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
 
 
-def correlation_analysis():
+def correlation_analysis(output_dir=OUTPUT_DIR):
     """相关性分析"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
+    df = pd.read_csv(Path(output_dir) / "villain_features.csv", encoding="utf-8-sig")
     
     # 选择数值列
     numeric_cols = [
@@ -27,26 +28,22 @@ def correlation_analysis():
         'avg_sentence_length', 'complex_ratio', 'command_ratio'
     ]
     
-    corr_matrix = df[numeric_cols].corr()
+    # 关键词配置中没有的分组不参与
+    numeric_cols = [c for c in numeric_cols if c in df.columns]
+    corr = correlation_matrix(df[numeric_cols].to_numpy())
+    corr_matrix = pd.DataFrame(corr.astype(np.float64), index=numeric_cols, columns=numeric_cols)
     
-    # 绘制热力图
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(corr_matrix, annot=True, fmt='.2f', cmap='coolwarm', center=0,
-                square=True, linewidths=1, cbar_kws={"shrink": 0.8})
-    plt.title('角色特征相关性热力图', fontsize=14, fontweight='bold', pad=20)
-    plt.tight_layout()
-    
-    output_path = OUTPUT_DIR / "correlation_heatmap.png"
-    plt.savefig(output_path, dpi=300, bbox_inches='tight')
+    # 绘制热力图（按层次聚类排序；指标少时逐格标注，多时画成栅格图）
+    output_path = Path(output_dir) / "correlation_heatmap.png"
+    plot_heatmap(corr, numeric_cols, output_path, '角色特征相关性热力图', order=cluster_order(corr))
     print(f"✓ 相关性热力图已保存: {output_path}")
-    plt.close()
     
     return corr_matrix
 
 
-def create_comparison_chart():
+def create_comparison_chart(output_dir=OUTPUT_DIR):
     """创建综合对比图"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
+    df = pd.read_csv(Path(output_dir) / "villain_features.csv", encoding="utf-8-sig")
     
     fig, axes = plt.subplots(2, 2, figsize=(14, 12))
     fig.suptitle('莎士比亚反派性格量化特征综合对比', fontsize=16, fontweight='bold')
@@ -57,7 +54,7 @@ def create_comparison_chart():
         '麦克白': '#1E90FF',
         '伊阿古': '#FF8C00'
     }
-    bar_colors = [colors[char] for char in characters]
+    bar_colors = [colors.get(char, '#808080') for char in characters]
     
     x = np.arange(len(characters))
     width = 0.25
@@ -140,7 +137,7 @@ def create_comparison_chart():
     x_pos = np.arange(len(metric_labels))
     for i, char in enumerate(characters):
         values = [normalized_data[j][i] for j in range(len(metrics))]
-        ax4.plot(x_pos, values, 'o-', label=char, color=colors[char], linewidth=2, markersize=8)
+        ax4.plot(x_pos, values, 'o-', label=char, color=colors.get(char, '#808080'), linewidth=2, markersize=8)
     
     ax4.set_xlabel('特征维度')
     ax4.set_ylabel('归一化值（0-1）')
@@ -152,15 +149,15 @@ def create_comparison_chart():
     ax4.set_ylim(0, 1.1)
     
     plt.tight_layout()
-    output_path = OUTPUT_DIR / "comprehensive_comparison.png"
+    output_path = Path(output_dir) / "comprehensive_comparison.png"
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"✓ 综合对比图已保存: {output_path}")
     plt.close()
 
 
-def generate_statistical_summary():
+def generate_statistical_summary(output_dir=OUTPUT_DIR):
     """生成统计摘要"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
+    df = pd.read_csv(Path(output_dir) / "villain_features.csv", encoding="utf-8-sig")
     
     summary = []
     summary.append("="*80)
@@ -190,7 +187,7 @@ def generate_statistical_summary():
             summary.append(f"  {i}. {row['character']}: {row[col]:.4f}")
     
     summary_text = "\n".join(summary)
-    output_path = OUTPUT_DIR / "statistical_summary.txt"
+    output_path = Path(output_dir) / "statistical_summary.txt"
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(summary_text)
     
@@ -201,19 +198,20 @@ def generate_statistical_summary():
     return summary_text
 
 
-def main():
+@timed("advanced")
+def main(output_dir=OUTPUT_DIR):
     print("正在进行高级分析...")
     
     # 相关性分析
-    corr_matrix = correlation_analysis()
+    corr_matrix = correlation_analysis(output_dir)
     print("\n相关性矩阵:")
     print(corr_matrix)
     
     # 综合对比图
-    create_comparison_chart()
+    create_comparison_chart(output_dir)
     
     # 统计摘要
-    generate_statistical_summary()
+    generate_statistical_summary(output_dir)
     
     print("\n✓ 高级分析完成！")
 
@@ -0,0 +1,219 @@
+"""
+批处理：一个进程（或固定大小的进程池）依次处理多个语料任务
+- 每个任务有自己的输入目录、剧本/角色配置、关键词配置和输出目录，互不覆盖
+- jieba 词典、pandas/matplotlib 导入和字体查找只在进程启动时做一次，之后的任务直接复用；
+  每个任务开始时去掉先前任务加入的领域词（角色名、关键词）并清空共享词表，
+  分词结果与任务的执行顺序、所在进程无关，内存也不随任务数增长
+- 每个任务依次运行 extract -> features -> visualize -> advanced -> evidence -> report，
+  某一步（或任务开始时切换关键词配置）出错时记录错误并跳过该任务的后续步骤，不影响其他任务
+- 各任务的运行指标（见 metrics.py）交回主进程，按 corpus=任务名 合并后写出一个 metrics.prom
+
+任务清单（JSON），相对路径按清单所在目录解析：
+    {
+        "jobs": [
+            {
+                "name": "zhu",
+                "input_dir": "corpora/zhu",
+                "output_dir": "runs/zhu",
+                "plays": {"麦克白": {"character": "麦克白", "alt_names": []}},
+                "keywords": "keywords_zhu.json",
+                "patterns": ["*.docx", "*.txt"],
+                "stages": ["extract", "features", "evidence"]
+            }
+        ]
+    }
+除 input_dir、output_dir 外都可省略：plays 默认 extract_word.PLAY_CONFIGS，keywords 默认 data/ 下的关键词配置，
+patterns 默认 Word 和 PDF，stages 默认全部步骤；plays 的值也可以只写角色名
+
+用法：
+    python batch.py jobs.json
+    python batch.py jobs.json --workers 2 --stages extract features
+    python batch.py jobs.json --metrics-file /var/lib/node_exporter/villain.prom --metrics-port 9108
+"""
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+
+from metrics import METRICS_PATH, REGISTRY, Registry, serve
+
+BASE_DIR = Path(__file__).parent
+
+STAGES = ("extract", "features", "visualize", "advanced", "evidence", "report")
+
+
+def load_jobs(path):
+    """读取任务清单，补全默认值并把相对路径解析为绝对路径"""
+    from extract_word import DOCUMENT_PATTERNS, PLAY_CONFIGS
+
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    root = path.parent.resolve()
+    jobs = []
+    for i, spec in enumerate(data["jobs"] if isinstance(data, dict) else data):
+        if "input_dir" not in spec or "output_dir" not in spec:
+            raise ValueError(f"任务 {spec.get('name', i)} 缺少 input_dir 或 output_dir")
+        plays = {
+            play: {"character": cfg, "alt_names": []} if isinstance(cfg, str) else dict(cfg)
+            for play, cfg in (spec.get("plays") or PLAY_CONFIGS).items()
+        }
+        unknown = [s for s in spec.get("stages", ()) if s not in STAGES]
+        if unknown:
+            raise ValueError(f"未知的步骤: {', '.join(unknown)}（可选: {', '.join(STAGES)}）")
+        jobs.append({
+            "name": spec.get("name") or f"job-{i:03d}",
+            "input_dir": str(root / spec["input_dir"]),
+            "output_dir": str(root / spec["output_dir"]),
+            "plays": plays,
+            "characters": spec.get("characters") or [cfg["character"] for cfg in plays.values()],
+            "keywords": str(root / spec["keywords"]) if spec.get("keywords") else None,
+            "patterns": tuple(spec.get("patterns") or DOCUMENT_PATTERNS),
+            "stages": [s for s in STAGES if s in spec.get("stages", STAGES)],
+        })
+    return jobs
+
+
+def warm_up():
+    """进程级初始化：导入各步骤模块、加载 jieba 词典、查找中文字体（进程池的 initializer）"""
+    start = time.perf_counter()
+    # 指标由主进程统一写出
+    REGISTRY.textfile = None
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+
+    import advanced_analysis, extract_evidence, generate_report, visualize  # noqa: F401
+    from jieba_setup import init_jieba
+    from main import DATA_DIR, load_synonyms
+
+    init_jieba(load_synonyms(os.path.join(DATA_DIR, "synonyms.json")))
+    font_manager.findfont(font_manager.FontProperties(family=plt.rcParams["font.sans-serif"]))
+    return round(time.perf_counter() - start, 3)
+
+
+def run_stage(stage, job):
+    import advanced_analysis
+    import extract_evidence
+    import extract_word
+    import generate_report
+    import main as features
+    import visualize
+
+    output_dir = job["output_dir"]
+    if stage == "extract":
+        extract_word.main(job["input_dir"], output_dir, job["plays"], job["patterns"])
+    elif stage == "features":
+        features.main(output_dir=output_dir, villains=job["characters"])
+    elif stage == "visualize":
+        visualize.main(output_dir)
+    elif stage == "advanced":
+        advanced_analysis.main(output_dir)
+    elif stage == "evidence":
+        extract_evidence.generate_evidence_report(output_dir)
+    elif stage == "report":
+        generate_report.main(output_dir)
+
+
+def run_job(job):
+    """
+    运行一个任务的各个步骤
+    返回 {"name", "output_dir", "seconds", "stages": {步骤: 耗时}, "error", "metrics": 本任务的指标快照}
+    """
+    from jieba_setup import reset_jieba
+    from keyword_config import use_keyword_file
+    from vocab import reset_vocabulary
+
+    Path(job["output_dir"]).mkdir(parents=True, exist_ok=True)
+    REGISTRY.reset()
+    summary = {"name": job["name"], "output_dir": job["output_dir"], "seconds": 0.0, "stages": {}, "error": None}
+    start = time.perf_counter()
+    # 关键词配置在进程内共享，每个任务开始时切换（依赖已变化分组的缓存会自动清理）；
+    # 关键词文件缺失或格式不对时与步骤出错一样记入 error，不影响其他任务
+    try:
+        use_keyword_file(job["keywords"])
+        reset_jieba()
+        reset_vocabulary()
+    except Exception as e:
+        traceback.print_exc()
+        summary["error"] = f"setup: {e}"
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        summary["metrics"] = REGISTRY.snapshot()
+        return summary
+    for stage in job["stages"]:
+        stage_start = time.perf_counter()
+        print(f"\n[{job['name']}] {stage}")
+        try:
+            run_stage(stage, job)
+        except Exception as e:
+            traceback.print_exc()
+            summary["error"] = f"{stage}: {e}"
+            break
+        finally:
+            summary["stages"][stage] = round(time.perf_counter() - stage_start, 3)
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    summary["metrics"] = REGISTRY.snapshot()
+    return summary
+
+
+def run_jobs(jobs, workers=1, metrics=None):
+    """
+    workers=1 时在当前进程依次运行；否则用固定大小的进程池，每个工作进程只预热一次
+    metrics: 汇总各任务指标的 Registry（每个任务完成后合并并写出其 textfile）
+    """
+    def collect(summaries):
+        for summary in summaries:
+            if metrics is not None:
+                metrics.merge(summary["metrics"], corpus=summary["name"])
+                if metrics.textfile is not None:
+                    metrics.write_textfile()
+            yield summary
+
+    if workers <= 1:
+        print(f"预热: {warm_up()}s")
+        return list(collect(run_job(job) for job in jobs))
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as executor:
+        return list(collect(executor.map(run_job, jobs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在同一进程中批量处理多个语料任务")
+    parser.add_argument("jobs", help="任务清单（JSON）")
+    parser.add_argument("--workers", type=int, default=1, help="进程数（默认在当前进程中依次运行）")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="只运行这些步骤（覆盖任务清单中的设置）")
+    parser.add_argument("--metrics-file", default=str(METRICS_PATH), help="指标输出文件（Prometheus textfile 格式）")
+    parser.add_argument("--metrics-port", type=int, help="运行期间在本地该端口开启 /metrics 指标端点")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.jobs)
+    if args.stages:
+        for job in jobs:
+            job["stages"] = [s for s in STAGES if s in args.stages]
+    print(f"共 {len(jobs)} 个任务")
+
+    metrics = Registry(textfile=args.metrics_file)
+    if args.metrics_port:
+        serve(args.metrics_port, registry=metrics)
+    summaries = run_jobs(jobs, args.workers, metrics)
+
+    print(f"\n{'='*60}")
+    for summary in summaries:
+        status = f"失败（{summary['error']}）" if summary["error"] else "完成"
+        stages = ", ".join(f"{s} {t}s" for s, t in summary["stages"].items())
+        print(f"  {summary['name']}: {status}，{summary['seconds']}s [{stages}] -> {summary['output_dir']}")
+    failed = [s["name"] for s in summaries if s["error"]]
+    if failed:
+        print(f"\n以下任务失败: {', '.join(failed)}")
+    else:
+        print(f"\n✓ 全部 {len(summaries)} 个任务完成")
+    print(f"✓ 指标已保存: {metrics.textfile}")
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+分块检查点：长时间运行的提取/特征计算每完成一块（一个文档、一批台词）就提交一次，
+中途失败后重新运行会跳过已提交的块
+- 每块一个 JSON 文件，先写临时文件再原子替换，不会留下写了一半的检查点
+- 检查点目录名带输入指纹（输入文件、配置等），输入变化后旧检查点自动失效
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+CHECKPOINT_DIR = BASE_DIR / "output" / "checkpoints"
+
+
+def fingerprint(*parts) -> str:
+    """任意可 JSON 序列化的输入描述 -> 短哈希"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class CheckpointStore:
+    """output/checkpoints/<任务名>-<指纹>/<块名>.json"""
+
+    def __init__(self, name, digest, root=CHECKPOINT_DIR):
+        self.root = Path(root)
+        self.name = name
+        self.dir = self.root / f"{name}-{digest}"
+
+    def _path(self, key):
+        return self.dir / f"{key}.json"
+
+    def has(self, key) -> bool:
+        return self._path(key).exists()
+
+    def get(self, key):
+        """已提交的块；没有则返回 None"""
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, key, value):
+        """提交一块（原子写入）"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def keys(self):
+        if not self.dir.exists():
+            return []
+        return sorted(p.stem for p in self.dir.glob("*.json"))
+
+    def prune_stale(self):
+        """删除同一任务其他指纹（输入已变化）的检查点"""
+        if not self.root.exists():
+            return
+        for path in self.root.glob(f"{self.name}-*"):
+            if path.is_dir() and path != self.dir:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self):
+        """全部完成后删除检查点"""
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,262 @@
+"""
+关键词搭配分析：每个反派的台词里，哪些词经常出现在 权力/谎言/野心 等关键词附近
+- 在 main.tokenize_text 同一条分词流水线（过滤停用词、单字，同义词归并）的词ID序列上取 ±window 窗口
+- 词对计数稀疏累积（只保存出现过的词对），可选两种方式限制内存：
+  prune：词对数超过 max_pairs 时只保留计数最高的词对
+  sketch：词对计数放进 CountMinSketch（sketches.py），内存固定
+- 搭配强度：PMI 与对数似然比（Dunning G²）
+
+用法：
+    python collocation.py --window 5 --top 15
+    python collocation.py --mode sketch --epsilon 1e-6
+"""
+import argparse
+import os
+from pathlib import Path
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from config import VILLAINS
+from keyword_config import get_keywords
+from sketches import CountMinSketch
+from vocab import get_pipeline
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+MODES = ("exact", "prune", "sketch")
+MEASURES = ("llr", "pmi")
+# 缓冲的词对数达到这个量时合并进稀疏表
+FLUSH_PAIRS = 1 << 20
+
+
+def pair_keys(centers, contexts):
+    """(中心词ID, 上下文词ID) -> 64 位词对ID"""
+    return (centers.astype(np.uint64) << np.uint64(32)) | contexts.astype(np.uint64)
+
+
+class CooccurrenceCounter:
+    """
+    窗口共现计数（对称窗口，词对按 中心词 -> 上下文词 计）
+    - unigrams[id]: 词频
+    - slots[id]: 以该词为中心产生的词对数（列联表的行/列合计）
+    - 词对计数：exact/prune 为排序后的稀疏数组，sketch 为 CountMinSketch
+    """
+
+    def __init__(self, window=5, mode="exact", max_pairs=1_000_000, sketch=None):
+        if mode not in MODES:
+            raise ValueError(f"未知的计数方式: {mode}（可选: {', '.join(MODES)}）")
+        self.window = window
+        self.mode = mode
+        self.max_pairs = max_pairs
+        self.sketch = sketch if sketch is not None else (CountMinSketch() if mode == "sketch" else None)
+        self.unigrams = np.zeros(0, dtype=np.int64)
+        self.slots = np.zeros(0, dtype=np.int64)
+        self.total_tokens = 0
+        self.total_pairs = 0
+        self.pruned_pairs = 0
+        self._keys = np.zeros(0, dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._buffer = []
+        self._buffered = 0
+
+    def _grow(self, size):
+        if size > len(self.unigrams):
+            self.unigrams = np.pad(self.unigrams, (0, size - len(self.unigrams)))
+            self.slots = np.pad(self.slots, (0, size - len(self.slots)))
+
+    def add(self, ids: np.ndarray):
+        """加入一段词ID序列（一句台词）；窗口不跨越台词边界"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size == 0:
+            return
+        self._grow(int(ids.max()) + 1)
+        self.unigrams += np.bincount(ids, minlength=len(self.unigrams))
+        self.total_tokens += ids.size
+
+        centers, contexts = [], []
+        for d in range(1, min(self.window, ids.size - 1) + 1):
+            centers += [ids[:-d], ids[d:]]
+            contexts += [ids[d:], ids[:-d]]
+        if not centers:
+            return
+        centers = np.concatenate(centers)
+        contexts = np.concatenate(contexts)
+        self.slots += np.bincount(centers, minlength=len(self.slots))
+        self.total_pairs += centers.size
+
+        keys = pair_keys(centers, contexts)
+        if self.sketch is not None:
+            self.sketch.add(keys)
+            return
+        self._buffer.append(keys)
+        self._buffered += keys.size
+        if self._buffered >= FLUSH_PAIRS:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        keys = np.concatenate([self._keys, *self._buffer])
+        weights = np.concatenate([self._counts, np.ones(self._buffered, dtype=np.int64)])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._counts = np.bincount(inverse, weights=weights).astype(np.int64)
+        self._buffer, self._buffered = [], 0
+        if self.mode == "prune" and len(self._keys) > self.max_pairs:
+            keep = np.sort(np.argpartition(-self._counts, self.max_pairs)[:self.max_pairs])
+            self.pruned_pairs += len(self._keys) - len(keep)
+            self._keys, self._counts = self._keys[keep], self._counts[keep]
+
+    def cooccurrence(self, anchor_ids) -> np.ndarray:
+        """一组中心词（关键词分组）与每个词的共现次数，下标为词ID"""
+        anchor_ids = np.unique(np.asarray(anchor_ids, dtype=np.int64))
+        anchor_ids = anchor_ids[anchor_ids < len(self.unigrams)]
+        counts = np.zeros(len(self.unigrams), dtype=np.int64)
+        if anchor_ids.size == 0:
+            return counts
+        if self.sketch is not None:
+            candidates = np.flatnonzero(self.unigrams)
+            for anchor in anchor_ids:
+                keys = pair_keys(np.full(candidates.size, anchor), candidates)
+                counts[candidates] += self.sketch.query(keys)
+            return counts
+        self._flush()
+        centers = (self._keys >> np.uint64(32)).astype(np.int64)
+        mask = np.isin(centers, anchor_ids)
+        contexts = (self._keys[mask] & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        np.add.at(counts, contexts, self._counts[mask])
+        return counts
+
+    @property
+    def nbytes(self):
+        if self.sketch is not None:
+            pairs = self.sketch.nbytes
+        else:
+            pairs = self._keys.nbytes + self._counts.nbytes + sum(b.nbytes for b in self._buffer)
+        return pairs + self.unigrams.nbytes + self.slots.nbytes
+
+
+def association_scores(cooccur, anchor_slots, context_slots, total_pairs):
+    """
+    以"窗口位置"为样本的 2×2 列联表：
+    k11 = 共现次数，行合计 = 关键词的窗口位置数，列合计 = 搭配词的窗口位置数
+    返回 (PMI, 对数似然比 G²)
+    """
+    k11 = cooccur.astype(np.float64)
+    k12 = anchor_slots - k11
+    k21 = context_slots - k11
+    k22 = np.maximum(total_pairs - anchor_slots - context_slots + k11, 0)
+    n = float(total_pairs)
+    expected = anchor_slots * context_slots / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pmi = np.where(k11 > 0, np.log2(k11 / expected), -np.inf)
+        rows = (k11 + k12, k11 + k12, k21 + k22, k21 + k22)
+        cols = (k11 + k21, k12 + k22, k11 + k21, k12 + k22)
+        g2 = np.zeros_like(k11)
+        for k, r, c in zip((k11, k12, k21, k22), rows, cols):
+            g2 += np.where(k > 0, k * np.log(k * n / (r * c)), 0.0)
+    return pmi, 2 * g2
+
+
+def top_collocates(counter, anchor_ids, vocab, top=20, min_count=2, measure="llr"):
+    """某个关键词分组的前 top 个搭配词（不含分组自身的关键词）"""
+    if measure not in MEASURES:
+        raise ValueError(f"未知的搭配强度: {measure}（可选: {', '.join(MEASURES)}）")
+    anchor_ids = np.asarray(anchor_ids, dtype=np.int64)
+    anchor_ids = anchor_ids[anchor_ids < len(counter.unigrams)]
+    cooccur = counter.cooccurrence(anchor_ids)
+    cooccur[anchor_ids] = 0
+    candidates = np.flatnonzero(cooccur >= min_count)
+    if candidates.size == 0 or counter.total_pairs == 0:
+        return pd.DataFrame(columns=["collocate", "cooccur", "frequency", "pmi", "llr"])
+    anchor_slots = float(counter.slots[anchor_ids].sum())
+    pmi, llr = association_scores(cooccur[candidates], anchor_slots,
+                                  counter.slots[candidates].astype(np.float64), counter.total_pairs)
+    scores = llr if measure == "llr" else pmi
+    order = np.argsort(-scores, kind="stable")[:top]
+    return pd.DataFrame({
+        "collocate": vocab.decode(candidates[order]),
+        "cooccur": cooccur[candidates[order]],
+        "frequency": counter.unigrams[candidates[order]],
+        "pmi": pmi[order].round(3),
+        "llr": llr[order].round(3),
+    })
+
+
+def build_counter(texts, stopwords, synonyms, window=5, mode="exact", **kwargs):
+    """逐句分词（与 tokenize_text 相同的过滤与归并）并累积共现"""
+    pipeline = get_pipeline(stopwords, synonyms)
+    counter = CooccurrenceCounter(window, mode, **kwargs)
+    for text in texts:
+        counter.add(pipeline.folded(pipeline.encode(jieba.lcut(str(text)))))
+    return counter
+
+
+def collocations_by_character(df, stopwords, synonyms, groups=None, window=5, mode="exact",
+                              top=20, min_count=2, measure="llr", sketch_error=(1e-5, 1e-3), max_pairs=1_000_000):
+    """
+    每个角色、每个关键词分组的搭配词
+    返回长表：character, group, rank, collocate, cooccur, frequency, pmi, llr
+    """
+    pipeline = get_pipeline(stopwords, synonyms)
+    groups = groups or get_keywords().groups
+    frames = []
+    for character, char_df in df.groupby("character", sort=False):
+        sketch = CountMinSketch.from_error(*sketch_error) if mode == "sketch" else None
+        counter = build_counter(char_df["text"], stopwords, synonyms, window, mode,
+                                max_pairs=max_pairs, sketch=sketch)
+        for group, keywords in groups.items():
+            anchors = np.unique(pipeline.folded(pipeline.keyword_ids(keywords)))
+            table = top_collocates(counter, anchors, pipeline.vocab, top, min_count, measure)
+            table.insert(0, "rank", np.arange(1, len(table) + 1))
+            table.insert(0, "group", group)
+            table.insert(0, "character", character)
+            frames.append(table)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反派台词中关键词分组的搭配词")
+    parser.add_argument("--window", type=int, default=5, help="共现窗口（左右各几个词）")
+    parser.add_argument("--top", type=int, default=15, help="每个分组输出的搭配词数")
+    parser.add_argument("--min-count", type=int, default=2, help="最少共现次数")
+    parser.add_argument("--measure", choices=MEASURES, default="llr", help="排序依据")
+    parser.add_argument("--mode", choices=MODES, default="exact", help="词对计数方式")
+    parser.add_argument("--max-pairs", type=int, default=1_000_000, help="prune 模式保留的词对数上限")
+    parser.add_argument("--epsilon", type=float, default=1e-5, help="sketch 模式的相对误差上界")
+    parser.add_argument("--delta", type=float, default=1e-3, help="sketch 模式超出误差上界的概率")
+    args = parser.parse_args()
+
+    csv_path = OUTPUT_DIR / "villain_lines.csv"
+    if not csv_path.exists():
+        print(f"错误: 找不到数据文件 {csv_path}")
+        print("请先运行 extract_word.py 提取台词数据")
+        return
+
+    from jieba_setup import init_jieba
+    from main import DATA_DIR, load_stopwords, load_synonyms
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    df = df[df["character"].isin(VILLAINS)]
+    stopwords = load_stopwords(os.path.join(DATA_DIR, "stopwords.txt"))
+    synonyms = load_synonyms(os.path.join(DATA_DIR, "synonyms.json"))
+    init_jieba(synonyms, VILLAINS)
+
+    result = collocations_by_character(
+        df, stopwords, synonyms, window=args.window, mode=args.mode, top=args.top,
+        min_count=args.min_count, measure=args.measure,
+        sketch_error=(args.epsilon, args.delta), max_pairs=args.max_pairs,
+    )
+    out_path = OUTPUT_DIR / "collocations.csv"
+    result.to_csv(out_path, index=False, encoding="utf-8-sig")
+    for (character, group), table in result.groupby(["character", "group"], sort=False):
+        words = "、".join(table["collocate"].head(8))
+        print(f"  {character} - {group}: {words}")
+    print(f"\n✓ 搭配词已保存: {out_path}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
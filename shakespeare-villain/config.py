@@ -46,3 +46,8 @@ COMPLEX_CLAUSE_MARKERS = [
     "尽管", "不过", "只是", "而且", "并且", "不仅", "不但", "除非"
 ]
 
+
+# 关键词匹配发生在同义词归并之前还是之后：
+# "raw"    - 只统计关键词原词（"王冠"只算"王冠"）
+# "folded" - 关键词也按同义词表归并（列出"王冠"即统计所有归并为"权力"的词）
+KEYWORD_MATCH_STAGE = "folded"
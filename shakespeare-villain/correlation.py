@@ -0,0 +1,247 @@
+"""
+大规模相关/相似度矩阵：分块计算、层次聚类排序、热力图
+- 相关系数 = 列标准化后的 Z.T @ Z；余弦相似度 = 行单位化后的 U @ U.T
+  都按 block_size × block_size 的块计算上三角再镜像，除结果外只多占一个块的内存；
+  结果可直接写入磁盘上的 .npy（memmap），上万维也不必整体放进内存
+- 排序：层次聚类（average linkage）的叶子顺序，相近的行列排在一起；
+  超过 max_linkage 维时两两距离表太大，改用谱排序（归一化拉普拉斯矩阵的 Fiedler 向量，
+  分块的矩阵-向量乘法做幂迭代）
+- 热力图：小矩阵（annotate_limit 以内）逐格标注数值；
+  大矩阵不标注，按块平均缩小到 max_pixels 以内后作为栅格图绘制
+
+用法：
+    python correlation.py                       # 全体角色：指标相关矩阵 + 角色相似度矩阵
+    python correlation.py --min-utterances 10 --block-size 512 --save-matrix
+"""
+import argparse
+import math
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+# 设置中文字体
+plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'STHeiti']
+plt.rcParams['axes.unicode_minus'] = False
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+BLOCK_SIZE = 1024
+
+
+def standardize_columns(matrix) -> np.ndarray:
+    """
+    观测 × 变量 -> 按列标准化并除以 sqrt(观测数)，使 Z.T @ Z 即为相关系数
+    缺失值按列均值填充；常数列置零
+    """
+    x = np.asarray(matrix, dtype=np.float64)
+    missing = np.isnan(x)
+    x = np.where(missing, 0.0, x)
+    counts = np.maximum((~missing).sum(axis=0), 1)
+    mean = x.sum(axis=0) / counts
+    x = np.where(missing, mean, x) - mean
+    norm = np.sqrt((x * x).sum(axis=0))
+    return (x / np.where(norm == 0, 1, norm)).astype(np.float32)
+
+
+def open_matrix(path, n) -> np.ndarray:
+    """磁盘上的 n × n float32 矩阵（.npy，可用 np.load(path, mmap_mode='r') 读回）"""
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, n))
+
+
+def blocked_gram(rows, block_size=BLOCK_SIZE, out=None) -> np.ndarray:
+    """rows @ rows.T：逐块计算上三角并镜像到下三角；out 可为预先分配的数组或 memmap"""
+    n = len(rows)
+    if out is None:
+        out = np.empty((n, n), dtype=np.float32)
+    for i in range(0, n, block_size):
+        a = rows[i:i + block_size]
+        for j in range(i, n, block_size):
+            block = a @ rows[j:j + block_size].T
+            out[i:i + block_size, j:j + block_size] = block
+            if j != i:
+                out[j:j + block_size, i:i + block_size] = block.T
+    return out
+
+
+def correlation_matrix(matrix, block_size=BLOCK_SIZE, out=None) -> np.ndarray:
+    """观测 × 变量 -> 变量 × 变量 的皮尔逊相关系数（常数列与其他列的相关记为 0）"""
+    z = np.ascontiguousarray(standardize_columns(matrix).T)
+    out = blocked_gram(z, block_size, out)
+    np.fill_diagonal(out, 1.0)
+    return out
+
+
+def cosine_similarity_matrix(vectors, block_size=BLOCK_SIZE, out=None) -> np.ndarray:
+    """行向量两两余弦相似度（零向量与其他行的相似度为 0）"""
+    v = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=1, keepdims=True)
+    return blocked_gram(v / np.where(norms == 0, 1, norms), block_size, out)
+
+
+def spectral_order(sim, block_size=BLOCK_SIZE, iterations=200, tol=1e-6) -> np.ndarray:
+    """
+    谱排序：按归一化拉普拉斯矩阵的 Fiedler 向量排序，相近的行列排在一起
+    亲和度 W = max(相似度, 0)；A = D^-1/2 W D^-1/2 的最大特征向量是平凡的 sqrt(度)，
+    对 (A + I) / 2 做幂迭代并每步减去平凡方向，收敛到第二特征向量，即 Fiedler 向量
+    矩阵-向量乘法按行块进行，sim 可以是 memmap
+    """
+    n = len(sim)
+
+    def affinity_dot(v):
+        return np.concatenate([
+            np.maximum(np.asarray(sim[i:i + block_size], dtype=np.float32), 0) @ v
+            for i in range(0, n, block_size)
+        ])
+
+    degree = affinity_dot(np.ones(n, dtype=np.float32)).astype(np.float64)
+    inv_sqrt = 1.0 / np.sqrt(np.where(degree > 0, degree, 1.0))
+    trivial = np.sqrt(np.maximum(degree, 0))
+    trivial /= np.linalg.norm(trivial) or 1.0
+
+    v = np.random.default_rng(0).standard_normal(n)
+    v -= (trivial @ v) * trivial
+    v /= np.linalg.norm(v)
+    for _ in range(iterations):
+        w = 0.5 * (inv_sqrt * affinity_dot((inv_sqrt * v).astype(np.float32)) + v)
+        w -= (trivial @ w) * trivial
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            break
+        w /= norm
+        done = np.linalg.norm(w - v) < tol
+        v = w
+        if done:
+            break
+    return np.argsort(inv_sqrt * v, kind="stable")
+
+
+def cluster_order(sim, method="average", max_linkage=4000, block_size=BLOCK_SIZE) -> np.ndarray:
+    """相似矩阵（相关系数/余弦）-> 层次聚类的叶子顺序；距离 = 1 - 相似度"""
+    n = len(sim)
+    if n <= 2:
+        return np.arange(n)
+    if n > max_linkage:
+        return spectral_order(sim, block_size)
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.spatial.distance import squareform
+
+    dist = 1.0 - np.asarray(sim, dtype=np.float64)
+    dist = np.clip((dist + dist.T) / 2, 0.0, 2.0)
+    np.fill_diagonal(dist, 0.0)
+    return leaves_list(linkage(squareform(dist, checks=False), method=method))
+
+
+def reduce_matrix(matrix, order, max_pixels=2000) -> np.ndarray:
+    """
+    按 order 重排后的显示用矩阵；超过 max_pixels 行时每 factor × factor 个格子取平均
+    每次只读入 factor 行，matrix 可以是 memmap
+    """
+    n = len(order)
+    if n <= max_pixels:
+        return np.asarray(matrix[np.ix_(order, order)], dtype=np.float32)
+    factor = math.ceil(n / max_pixels)
+    m = math.ceil(n / factor)
+    image = np.empty((m, m), dtype=np.float32)
+    pad = m * factor - n
+    for k, i in enumerate(range(0, n, factor)):
+        rows = np.asarray(matrix[np.sort(order[i:i + factor])], dtype=np.float32)[:, order].mean(axis=0)
+        rows = np.pad(rows, (0, pad), constant_values=np.nan)
+        image[k] = np.nanmean(rows.reshape(m, factor), axis=1)
+    return image
+
+
+def plot_heatmap(matrix, labels, output_path, title, order=None,
+                 annotate_limit=30, label_limit=120, max_pixels=2000):
+    """
+    相关/相似度热力图（按 order 重排）
+    - annotate_limit 以内：seaborn 逐格标注数值
+    - 更大的矩阵：不标注，缩小后用 imshow 画成栅格图；label_limit 以内才显示行列名
+    """
+    n = len(labels)
+    order = np.arange(n) if order is None else np.asarray(order)
+    names = [labels[i] for i in order]
+
+    if n <= annotate_limit:
+        plt.figure(figsize=(10, 8))
+        frame = pd.DataFrame(np.asarray(matrix)[np.ix_(order, order)], index=names, columns=names)
+        sns.heatmap(frame, annot=True, fmt='.2f', cmap='coolwarm', center=0, vmin=-1, vmax=1,
+                    square=True, linewidths=1, cbar_kws={"shrink": 0.8})
+        plt.title(title, fontsize=14, fontweight='bold', pad=20)
+        plt.tight_layout()
+        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.close()
+        return
+
+    image = reduce_matrix(matrix, order, max_pixels)
+    fig, ax = plt.subplots(figsize=(12, 10))
+    im = ax.imshow(image, cmap='coolwarm', vmin=-1, vmax=1, interpolation='nearest', rasterized=True)
+    fig.colorbar(im, ax=ax, shrink=0.8)
+    if n <= label_limit:
+        ax.set_xticks(range(n))
+        ax.set_yticks(range(n))
+        ax.set_xticklabels(names, rotation=90, fontsize=6)
+        ax.set_yticklabels(names, fontsize=6)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_xlabel(f"共 {n} 项，按层次聚类顺序排列" + (f"（每格为 {len(image)}² 缩略中的平均值）" if len(image) < n else ""))
+    ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
+    fig.savefig(output_path, dpi=200, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main(min_utterances=5, block_size=BLOCK_SIZE, save_matrix=False, output_dir=OUTPUT_DIR):
+    from jieba_setup import init_jieba
+    from main import DATA_DIR, load_stopwords, load_synonyms
+    from similarity import build_index_from_lines
+
+    output_dir = Path(output_dir)
+    csv_path = output_dir / "all_lines.csv"
+    if not csv_path.exists():
+        csv_path = output_dir / "villain_lines.csv"
+    if not csv_path.exists():
+        print(f"错误: 找不到台词数据 {csv_path}")
+        print("请先运行 extract_word.py 提取台词数据")
+        return
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    print(f"读取台词: {len(df)} 条, {df['character'].nunique()} 个角色 ({csv_path.name})")
+    stopwords = load_stopwords(str(Path(DATA_DIR) / "stopwords.txt"))
+    synonyms = load_synonyms(str(Path(DATA_DIR) / "synonyms.json"))
+    init_jieba(synonyms, df["character"].unique())
+    index, features_df = build_index_from_lines(df, stopwords, synonyms, min_utterances=min_utterances)
+    print(f"角色数: {len(index.names)}, 向量维度: {index.vectors.shape[1]}")
+
+    # 指标 × 指标（全体角色上的相关系数）
+    metrics = [c for c in features_df.columns if c != "character" and pd.api.types.is_numeric_dtype(features_df[c])]
+    corr = correlation_matrix(features_df[metrics].to_numpy(), block_size)
+    path = output_dir / "metric_correlation_heatmap.png"
+    plot_heatmap(corr, metrics, path, '全体角色特征相关性热力图', order=cluster_order(corr))
+    print(f"✓ 指标相关性热力图已保存: {path}")
+
+    # 角色 × 角色（指标 + 词语分布向量的余弦相似度）
+    n = len(index.names)
+    out = open_matrix(output_dir / "character_similarity.npy", n) if save_matrix else None
+    sim = cosine_similarity_matrix(index.vectors, block_size, out)
+    path = output_dir / "character_similarity_heatmap.png"
+    plot_heatmap(sim, index.names, path, '角色相似度热力图', order=cluster_order(sim, block_size=block_size))
+    print(f"✓ 角色相似度热力图已保存: {path}")
+    if save_matrix:
+        sim.flush()
+        with open(output_dir / "character_similarity_names.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(index.names) + "\n")
+        print(f"✓ 角色相似度矩阵已保存: {output_dir / 'character_similarity.npy'}")
+    return corr, sim
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全体角色的指标相关矩阵与角色相似度矩阵（分块计算、聚类排序）")
+    parser.add_argument("--min-utterances", type=int, default=5, help="台词数少于此值的角色不参与")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="分块大小（行/列数）")
+    parser.add_argument("--save-matrix", action="store_true", help="把角色相似度矩阵写入 character_similarity.npy")
+    args = parser.parse_args()
+    main(args.min_utterances, args.block_size, args.save_matrix)
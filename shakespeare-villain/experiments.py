@@ -0,0 +1,131 @@
+"""
+关键词表实验：基于 main.py 保存的角色词频（output/token_counts.json）
+批量重算不同关键词表方案下的每千词频次，无需重新分词
+
+用法：
+    python experiments.py --variants variants.json
+variants.json 格式：{"方案名": {"power": ["权力", ...], "lie": [...]}, ...}
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import KEYWORD_MATCH_STAGE
+from keyword_config import get_keywords
+from sketches import VocabularySketch
+from vocab import expand_keywords
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+
+class TokenCounts:
+    """
+    角色词频表
+    只为实验中用到的关键词取出计数，组成 角色 × 关键词 的稠密矩阵
+    """
+
+    def __init__(self, counts_by_character: dict):
+        self.characters = list(counts_by_character)
+        self.counts = [counts_by_character[c]["counts"] for c in self.characters]
+        totals = [counts_by_character[c]["total_tokens"] for c in self.characters]
+        self.totals = np.maximum(np.asarray(totals, dtype=np.float64), 1)
+        # 近似模式（main.py --approximate）：counts 只含当时的关键词，其他词用词频草图估计
+        self.sketches = [
+            VocabularySketch.from_dict(counts_by_character[c]["sketch"]) if "sketch" in counts_by_character[c] else None
+            for c in self.characters
+        ]
+
+    @classmethod
+    def load(cls, path=OUTPUT_DIR / "token_counts.json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def keyword_matrix(self, keywords):
+        """角色 × 关键词 计数矩阵"""
+        matrix = np.zeros((len(self.characters), len(keywords)), dtype=np.float64)
+        for i, (counts, sketch) in enumerate(zip(self.counts, self.sketches)):
+            matrix[i] = [counts.get(k, 0) for k in keywords]
+            if sketch is not None:
+                missing = [j for j, k in enumerate(keywords) if k not in counts]
+                if missing:
+                    matrix[i, missing] = sketch.query([keywords[j] for j in missing])
+        return matrix
+
+
+def rescore_keyword_groups(token_counts: TokenCounts, variants: dict,
+                           synonyms: dict = None, stage: str = KEYWORD_MATCH_STAGE) -> pd.DataFrame:
+    """
+    一次性对多个关键词表方案重算关键词频次
+    variants: {方案名: {分组名: [关键词, ...]}}
+    synonyms / stage: 与 main.py 相同的同义词表和关键词匹配阶段（见 vocab.py）
+    返回长表：variant, character, group, count, per_1000
+
+    所有方案的所有分组组成 (分组 × 关键词) 的 0/1 矩阵，
+    与 (角色 × 关键词) 计数矩阵相乘即得全部结果
+    """
+    synonyms = synonyms or {}
+    group_keys = [(variant, group) for variant, groups in variants.items() for group in groups]
+    expanded = [expand_keywords(variants[v][g], synonyms, stage) for v, g in group_keys]
+    keywords = sorted(set().union(*expanded)) if expanded else []
+    keyword_index = {k: j for j, k in enumerate(keywords)}
+
+    membership = np.zeros((len(group_keys), len(keywords)), dtype=np.float64)
+    for g, words in enumerate(expanded):
+        membership[g, [keyword_index[k] for k in words]] = 1
+
+    counts = token_counts.keyword_matrix(keywords) @ membership.T   # 角色 × 分组
+    per_1000 = counts / token_counts.totals[:, None] * 1000
+
+    n_chars, n_groups = counts.shape
+    return pd.DataFrame({
+        "variant": np.tile([v for v, _ in group_keys], n_chars),
+        "character": np.repeat(token_counts.characters, n_groups),
+        "group": np.tile([g for _, g in group_keys], n_chars),
+        "count": counts.ravel().astype(int),
+        "per_1000": per_1000.ravel().round(2),
+    })
+
+
+def compare_variants(scores: pd.DataFrame) -> pd.DataFrame:
+    """宽表：行为 角色×分组，列为各方案的每千词频次"""
+    return scores.pivot_table(index=["character", "group"], columns="variant",
+                              values="per_1000", sort=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于已保存词频批量试验关键词表")
+    parser.add_argument("--variants", help="关键词表方案 JSON 文件")
+    parser.add_argument("--counts", default=str(OUTPUT_DIR / "token_counts.json"), help="角色词频文件")
+    args = parser.parse_args()
+
+    if not Path(args.counts).exists():
+        print(f"错误: 找不到角色词频 {args.counts}")
+        print("请先运行 main.py 生成词频数据")
+        return
+
+    variants = {"current": dict(get_keywords().groups)}
+    if args.variants:
+        with open(args.variants, "r", encoding="utf-8") as f:
+            variants.update(json.load(f))
+
+    from main import DATA_DIR, load_synonyms
+    synonyms = load_synonyms(str(Path(DATA_DIR) / "synonyms.json"))
+
+    token_counts = TokenCounts.load(args.counts)
+    scores = rescore_keyword_groups(token_counts, variants, synonyms)
+    table = compare_variants(scores)
+
+    out_path = OUTPUT_DIR / "keyword_experiments.csv"
+    scores.to_csv(out_path, index=False, encoding="utf-8-sig")
+    print(f"方案数: {len(variants)}, 角色数: {len(token_counts.characters)}")
+    print(table.to_string())
+    print(f"\n✓ 实验结果已保存: {out_path}")
+    return scores
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+把提取的台词导出到本地 SQLite 数据库（output/lines.db），建立 FTS5 全文索引
+- lines：反派台词（villain_lines.csv，id 即 CSV 行号）和全角色台词（all_lines.csv），
+  含剧本、幕次场次、发言者、对话对象、出处（文档ID、全文中的字节偏移/长度，见 provenance.py）及逐行指标标记（指令句、复杂句）
+- speakers：每个剧本各角色的话轮数
+- lines_fts：原文的 trigram 索引（任意三字及以上的子串都能检索，不依赖分词结果）；
+  一两个字的关键词（如"血"、"副将"）无法用 trigram 检索，查询时直接在 lines.text 中查找子串，
+  因此 LineIndex.search 的结果包含正则能在原文中找到的所有台词
+- meta：导出时的关键词配置版本和全文索引分词器；两者都与当前一致时数据库才可直接用于查询
+
+用法：
+    python export_sqlite.py
+    sqlite3 output/lines.db "SELECT character, text FROM lines JOIN lines_fts ON lines.id = lines_fts.rowid
+                             WHERE lines_fts MATCH '野心勃勃 OR 指挥权'"
+"""
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+from keyword_config import get_keywords
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+DB_PATH = OUTPUT_DIR / "lines.db"
+
+# 全角色台词的 id 从这里开始，与反派台词（CSV 行号）错开
+SPEAKER_ID_OFFSET = 1_000_000
+
+SCHEMA = """
+CREATE TABLE lines (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,          -- villain / all
+    play TEXT, act TEXT, scene TEXT,
+    character TEXT, to_character TEXT,
+    is_interrupt INTEGER DEFAULT 0,
+    multiplicity INTEGER DEFAULT 1,
+    is_command INTEGER DEFAULT 0,
+    is_complex INTEGER DEFAULT 0,
+    doc_id TEXT DEFAULT '',
+    byte_offset INTEGER DEFAULT -1,
+    byte_length INTEGER DEFAULT -1,
+    text TEXT NOT NULL
+);
+CREATE INDEX idx_lines_character ON lines (source, character);
+CREATE INDEX idx_lines_command ON lines (character, is_command);
+CREATE TABLE speakers (
+    play TEXT, character TEXT, turns INTEGER,
+    PRIMARY KEY (play, character)
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE VIRTUAL TABLE lines_fts USING fts5(text, content='', tokenize='trigram case_sensitive 1');
+"""
+
+# 全文索引分词器（记录在 meta 中；旧版数据库用 jieba 分词索引，会漏掉长词中的短关键词，需要重新导出）
+FTS_TOKENIZER = "trigram"
+# trigram 索引能检索的最短子串
+TRIGRAM = 3
+
+
+def _line_rows(df: pd.DataFrame, source: str, id_offset: int = 0):
+    from main import is_command_sentence, is_complex_sentence
+
+    def column(name, default):
+        return df[name].fillna(default) if name in df else pd.Series(default, index=df.index)
+
+    texts = df["text"].astype(str)
+    for line_id, play, act, scene, character, to, interrupt, multiplicity, doc_id, offset, length, text in zip(
+            df.index, column("play", ""), column("act", ""), column("scene", ""), df["character"],
+            column("to", ""), column("is_interrupt", 0), column("multiplicity", 1),
+            column("doc_id", ""), column("offset", -1), column("length", -1), texts):
+        yield (int(line_id) + id_offset, source, play, str(act), str(scene), character, to,
+               int(interrupt), int(multiplicity), int(is_command_sentence(text)), int(is_complex_sentence(text)),
+               str(doc_id), int(offset), int(length), text)
+
+
+def export_lines(villain_df: pd.DataFrame, speaker_df: pd.DataFrame = None, path=DB_PATH) -> dict:
+    """
+    重建数据库：整个导出在一个事务内完成，逐表批量插入
+    返回各表行数
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            rows = list(_line_rows(villain_df, "villain"))
+            if speaker_df is not None:
+                rows.extend(_line_rows(speaker_df, "all", SPEAKER_ID_OFFSET))
+            conn.executemany("INSERT INTO lines VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+            conn.executemany("INSERT INTO lines_fts (rowid, text) VALUES (?, ?)",
+                             ((row[0], row[-1]) for row in rows))
+            if speaker_df is not None:
+                turns = speaker_df.groupby(["play", "character"], sort=False).size()
+                conn.executemany("INSERT INTO speakers VALUES (?,?,?)",
+                                 ((play, character, int(n)) for (play, character), n in turns.items()))
+            conn.execute("INSERT INTO meta VALUES ('keyword_version', ?)", (get_keywords().version,))
+            conn.execute("INSERT INTO meta VALUES ('fts_tokenizer', ?)", (FTS_TOKENIZER,))
+        counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("lines", "speakers")}
+    finally:
+        conn.close()
+    return counts
+
+
+def fts_query(keywords) -> str:
+    """关键词列表 -> FTS5 查询表达式（任一关键词命中）；trigram 索引只用于三字及以上的关键词"""
+    return " OR ".join('"{}"'.format(k.replace('"', '""')) for k in keywords if len(k) >= TRIGRAM)
+
+
+class LineIndex:
+    """lines.db 上的索引查询，返回与 villain_lines.csv 相同列名的 DataFrame（索引为 id）"""
+
+    COLUMNS = ("id, play, act, scene, character, to_character AS \"to\", is_interrupt, multiplicity, "
+               "doc_id, byte_offset AS \"offset\", byte_length AS \"length\", text")
+
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def keyword_version(self):
+        return self._meta("keyword_version")
+
+    def is_fresh(self, source_path) -> bool:
+        """
+        数据库比 CSV 新，导出时的关键词配置与当前一致，且含出处列 doc_id、使用 trigram 全文索引
+        （旧版数据库需重新导出）
+        """
+        source_path = Path(source_path)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(lines)")}
+        return (not source_path.exists() or self.path.stat().st_mtime >= source_path.stat().st_mtime) \
+            and self.keyword_version == get_keywords().version and "doc_id" in columns \
+            and self._meta("fts_tokenizer") == FTS_TOKENIZER
+
+    def _frame(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params, index_col="id")
+
+    def search(self, keywords, character=None, source="villain") -> pd.DataFrame:
+        """
+        原文中包含任一关键词的台词（按 id 排序，即原文顺序）
+        三字及以上的关键词走 trigram 索引，更短的关键词直接查找子串，结果不会漏掉正则能匹配的台词
+        """
+        conditions, params = [], []
+        query = fts_query(keywords)
+        if query:
+            conditions.append("id IN (SELECT rowid FROM lines_fts WHERE lines_fts MATCH ?)")
+            params.append(query)
+        for keyword in keywords:
+            if len(keyword) < TRIGRAM:
+                conditions.append("instr(text, ?) > 0")
+                params.append(keyword)
+        sql = f"SELECT {self.COLUMNS} FROM lines WHERE ({' OR '.join(conditions) or '0'}) AND source = ?"
+        params.append(source)
+        if character is not None:
+            sql += " AND character = ?"
+            params.append(character)
+        return self._frame(sql + " ORDER BY id", params)
+
+    def command_lines(self, character, limit=None) -> pd.DataFrame:
+        """某角色的指令句（按原文顺序）"""
+        sql = f"SELECT {self.COLUMNS} FROM lines WHERE character = ? AND source = 'villain' AND is_command = 1 ORDER BY id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._frame(sql, (character,))
+
+
+def main():
+    villain_path = OUTPUT_DIR / "villain_lines.csv"
+    if not villain_path.exists():
+        print(f"错误: 找不到数据文件 {villain_path}")
+        print("请先运行 extract_word.py 提取台词数据")
+        return
+
+    villain_df = pd.read_csv(villain_path, encoding="utf-8-sig", dtype={"doc_id": str})
+    speakers_path = OUTPUT_DIR / "all_lines.csv"
+    speaker_df = pd.read_csv(speakers_path, encoding="utf-8-sig", dtype={"doc_id": str}) \
+        if speakers_path.exists() else None
+
+    counts = export_lines(villain_df, speaker_df)
+    print(f"✓ 已导出: {DB_PATH}（台词 {counts['lines']} 条，角色 {counts['speakers']} 个）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,205 @@
 """
 提取文本证据：为每个角色的关键特征找出具体台词示例
+示例只记录出处（文档ID、全文中的字节偏移和长度），展示时再从全文 mmap 中切片、截断、高亮，
+并附上前后的发言作为上下文（见 provenance.py）
 """
+import heapq
 import pandas as pd
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from config import KEYWORD_GROUPS
+from keyword_config import alternation, get_keywords
+from metrics import timed
+from provenance import RawTextSource, SpeakerTimeline
+from segmenter import SentenceSpans, SPANS_PATH
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
 
 
+# 报告中展示证据的关键词分组及标题
+EVIDENCE_SECTIONS = [
+    ("power", "权力词汇特征"),
+    ("ambition", "野心词汇特征"),
+    ("lie", "谎言/欺骗词汇特征"),
+]
+
+
+def score_evidence(text, found):
+    """
+    候选台词得分：
+    - 关键词多样性（不同关键词个数）权重最高
+    - 关键词密度（每百字命中次数）
+    - 长度适中（15~100字）便于引用，过短或过长扣分
+    """
+    length = max(len(text), 1)
+    diversity = len(set(found))
+    density = len(found) / length * 100
+    if length < 15:
+        length_score = length / 15
+    elif length > 100:
+        length_score = 100 / length
+    else:
+        length_score = 1.0
+    return 2.0 * diversity + density + length_score
+
+
+def keyword_pattern(keyword_list):
+    """关键词列表对应的正则：与某个配置分组相同时复用 CompiledKeywords.group_patterns，否则现场编译"""
+    words = tuple(keyword_list)
+    compiled = get_keywords()
+    for name, pattern in compiled.group_patterns.items():
+        if compiled.groups[name] == words:
+            return pattern
+    return re.compile(alternation(words))
+
+
+def rank_keyword_examples(char_df, keyword_list, max_examples=3):
+    """
+    单遍扫描某角色全部台词，用大小为 max_examples 的最小堆保留得分最高的示例
+    同分时保留出现较早的台词；关键词为空时没有证据
+    """
+    if not keyword_list:
+        return []
+    pattern = keyword_pattern(keyword_list)
+    heap = []
+    missing = pd.Series(-1, index=char_df.index)
+    rows = zip(char_df['text'].astype(str), char_df['play'], char_df['act'], char_df['scene'],
+               char_df.get('doc_id', pd.Series("", index=char_df.index)).fillna(""),
+               char_df.get('offset', missing), char_df.get('length', missing))
+    for pos, (text, play, act, scene, doc_id, offset, length) in enumerate(rows):
+        found = pattern.findall(text)
+        if not found:
+            continue
+        item = (score_evidence(text, found), -pos, text, found, play, act, scene, doc_id, offset, length)
+        if len(heap) < max_examples:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    examples = []
+    for score, _, text, found, play, act, scene, doc_id, offset, length in sorted(heap, reverse=True):
+        examples.append({
+            'keyword': found[0],
+            'keywords': sorted(set(found), key=found.index),
+            'score': round(score, 3),
+            'text': text,
+            'play': play,
+            'act': act,
+            'scene': scene,
+            'doc_id': str(doc_id),
+            'offset': int(offset),
+            'length': int(length),
+        })
+    return examples
+
+
+def render_example(ex, source=None, limit=100):
+    """
+    示例台词的显示文本：有出处时从全文 mmap 切片（只解码前 limit+1 个字），否则用示例中的 text
+    先截断再高亮关键词（一次替换全部命中），被截断时末尾加"..."
+    """
+    text = None
+    if source is not None and ex.get('offset', -1) >= 0:
+        text = source.slice(ex.get('doc_id'), ex['offset'], ex['length'], limit + 1)
+    if text is None:
+        text = str(ex['text'])[:limit + 1]
+    suffix = "..." if len(text) > limit else ""
+    text = text[:limit]
+    if ex.get('keywords'):
+        text = re.sub(alternation(ex['keywords']), lambda m: f"【{m.group(0)}】", text)
+    return text + suffix
+
+
+def context_lines(ex, source, timeline, before=1, after=1, limit=60):
+    """示例前后的发言：[("上文"/"下文", 角色, 文本), ...]；没有出处或全文时返回空列表"""
+    if timeline is None or ex.get('offset', -1) < 0:
+        return []
+    previous, following = timeline.around(ex.get('doc_id'), ex['offset'], before, after)
+    lines = []
+    for label, entries in (("上文", previous), ("下文", following)):
+        for character, offset, length in entries:
+            text = render_example({'doc_id': ex['doc_id'], 'offset': offset, 'length': length, 'text': ''},
+                                  source, limit)
+            if text:
+                lines.append((label, character, text))
+    return lines
+
+
+def merge_examples(example_lists, max_examples=3):
+    """合并多份 rank_keyword_examples 的结果（如各分片的证据候选），按得分保留前 max_examples 条"""
+    merged = [ex for examples in example_lists for ex in examples]
+    merged.sort(key=lambda ex: -ex['score'])
+    return merged[:max_examples]
+
+
 def find_keyword_examples(df, character, keyword_group, keyword_list, max_examples=3):
-    """找出包含特定关键词的台词示例"""
+    """找出包含特定关键词的台词示例（按得分排序的前 max_examples 条）"""
     char_df = df[df['character'] == character]
-    examples = []
-    
-    for keyword in keyword_list:
-        matches = char_df[char_df['text'].str.contains(keyword, na=False, regex=False)]
-        for idx, row in matches.head(max_examples).iterrows():
-            text = row['text'].strip()
-            # 高亮关键词
-            highlighted = text.replace(keyword, f"【{keyword}】")
-            examples.append({
-                'keyword': keyword,
-                'text': text,
-                'highlighted': highlighted,
-                'play': row['play'],
-                'act': row['act'],
-                'scene': row['scene']
-            })
-            if len(examples) >= max_examples * len(keyword_list):
-                break
-        if len(examples) >= max_examples * len(keyword_list):
-            break
-    
-    return examples[:max_examples]
+    return rank_keyword_examples(char_df, keyword_list, max_examples)
 
 
-def generate_evidence_report():
+def _character_evidence(char_df, keyword_groups, max_examples):
+    """单个角色各分组的证据（在子进程中运行）"""
+    return {
+        group: rank_keyword_examples(char_df, keywords, max_examples)
+        for group, keywords in keyword_groups.items()
+    }
+
+
+def collect_evidence(df, characters, keyword_groups, max_examples=2, workers=None):
+    """
+    并行计算所有角色、所有分组的证据
+    返回 {角色: {分组: [示例, ...]}}
+    """
+    char_dfs = {c: df[df['character'] == c] for c in characters}
+    if workers == 1 or len(characters) <= 1:
+        return {c: _character_evidence(char_dfs[c], keyword_groups, max_examples) for c in characters}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            c: executor.submit(_character_evidence, char_dfs[c], keyword_groups, max_examples)
+            for c in characters
+        }
+        return {c: f.result() for c, f in futures.items()}
+
+
+def open_line_index(csv_path=OUTPUT_DIR / "villain_lines.csv"):
+    """与台词表同目录、且未过期的 lines.db（见 export_sqlite.py）；否则返回 None，退回 DataFrame 扫描"""
+    from export_sqlite import LineIndex
+    db_path = Path(csv_path).parent / "lines.db"
+    if not db_path.exists():
+        return None
+    index = LineIndex(db_path)
+    if not index.is_fresh(csv_path):
+        index.close()
+        return None
+    return index
+
+
+def collect_evidence_indexed(index, characters, keyword_groups, max_examples=2):
+    """用 FTS 索引取出含关键词的候选台词，再按同样的得分规则排序（空分组不查询）"""
+    return {
+        c: {
+            group: rank_keyword_examples(index.search(keywords, character=c), keywords, max_examples)
+            if keywords else []
+            for group, keywords in keyword_groups.items()
+        }
+        for c in characters
+    }
+
+
+@timed("evidence")
+def generate_evidence_report(output_dir=OUTPUT_DIR):
     """生成文本证据报告"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_lines.csv", encoding="utf-8-sig")
-    features_df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
+    output_dir = Path(output_dir)
+    df = pd.read_csv(output_dir / "villain_lines.csv", encoding="utf-8-sig", dtype={"doc_id": str})
+    features_df = pd.read_csv(output_dir / "villain_features.csv", encoding="utf-8-sig")
+    
+    # 复用 main.py 保存的分句结果（line_id 即 villain_lines.csv 的行号）；台词表之后被替换过则重新分句
+    spans = SentenceSpans.load_for(output_dir / "villain_lines.csv", output_dir / SPANS_PATH.name)
+    if spans is None:
+        spans = SentenceSpans.from_series(df['text'])
+    texts = df['text'].astype(str)
     
     report = []
     report.append("="*80)
@@ -48,77 +207,81 @@ def generate_evidence_report():
     report.append("="*80)
     report.append("")
     
+    keyword_groups = get_keywords().groups
+    evidence_groups = {g: keyword_groups[g] for g, _ in EVIDENCE_SECTIONS if g in keyword_groups}
+    index = open_line_index(output_dir / "villain_lines.csv")
+    if index is not None:
+        print(f"使用全文索引: {index.path}")
+        evidence = collect_evidence_indexed(index, features_df['character'].tolist(), evidence_groups, max_examples=2)
+    else:
+        evidence = collect_evidence(df, features_df['character'].tolist(), evidence_groups, max_examples=2)
+    
+    # 示例文本从全文 mmap 中切片，上下文取自全角色台词的出处
+    source = RawTextSource(output_dir)
+    timeline = SpeakerTimeline.load(output_dir / "all_lines.csv")
+    
     for idx, row in features_df.iterrows():
         character = row['character']
         report.append(f"\n【{character}】")
         report.append("-"*80)
         
-        # 权力词汇证据
-        if row['power_per_1000'] > 0:
-            report.append(f"\n1. 权力词汇特征（频次: {row['power_per_1000']:.2f}/千词）")
-            examples = find_keyword_examples(
-                df, character, "power", KEYWORD_GROUPS["power"], max_examples=2
-            )
+        # 关键词证据（权力、野心、谎言）
+        for section_no, (group, title) in enumerate(EVIDENCE_SECTIONS, 1):
+            column = f"{group}_per_1000"
+            if column not in row or not row[column] > 0:
+                continue
+            report.append(f"\n{section_no}. {title}（频次: {row[column]:.2f}/千词）")
+            examples = evidence[character].get(group, [])
             if examples:
                 for i, ex in enumerate(examples, 1):
-                    report.append(f"   示例{i}: {ex['highlighted'][:100]}...")
+                    report.append(f"   示例{i}: {render_example(ex, source)}")
+                    for label, speaker, text in context_lines(ex, source, timeline):
+                        report.append(f"      {label}（{speaker}）: {text}")
             else:
                 report.append("   （未找到直接关键词，可能使用间接表达）")
         
-        # 野心词汇证据
-        if row['ambition_per_1000'] > 0:
-            report.append(f"\n2. 野心词汇特征（频次: {row['ambition_per_1000']:.2f}/千词）")
-            examples = find_keyword_examples(
-                df, character, "ambition", KEYWORD_GROUPS["ambition"], max_examples=2
-            )
-            if examples:
-                for i, ex in enumerate(examples, 1):
-                    report.append(f"   示例{i}: {ex['highlighted'][:100]}...")
-        
-        # 谎言词汇证据
-        if row['lie_per_1000'] > 0:
-            report.append(f"\n3. 谎言/欺骗词汇特征（频次: {row['lie_per_1000']:.2f}/千词）")
-            examples = find_keyword_examples(
-                df, character, "lie", KEYWORD_GROUPS["lie"], max_examples=2
-            )
-            if examples:
-                for i, ex in enumerate(examples, 1):
-                    report.append(f"   示例{i}: {ex['highlighted'][:100]}...")
-        
         # 句法特征
         report.append(f"\n4. 句法特征")
         report.append(f"   平均句长: {row['avg_sentence_length']:.2f} 字符")
         report.append(f"   复杂句比例: {row['complex_ratio']*100:.2f}%")
         
-        # 找出长句示例
+        # 找出长句示例（与平均句长使用同一套分句）
         char_df = df[df['character'] == character]
-        long_sentences = char_df[char_df['text'].str.len() > 50].head(2)
-        if len(long_sentences) > 0:
+        char_spans = spans.subset(char_df.index)
+        long_sentences = [i for i in char_spans.longest(2) if char_spans.lengths[i] > 50]
+        if long_sentences:
             report.append(f"   长句示例:")
-            for i, (idx2, row2) in enumerate(long_sentences.iterrows(), 1):
-                report.append(f"     示例{i}: {row2['text'][:80]}...")
+            for i, span_idx in enumerate(long_sentences, 1):
+                report.append(f"     示例{i}（{char_spans.lengths[span_idx]}字）: {char_spans.text(texts, span_idx)[:80]}...")
         
         # 互动特征
         report.append(f"\n5. 互动特征")
         report.append(f"   指令句比例: {row['command_ratio']*100:.2f}%")
         
         # 找出指令句示例
-        from main import is_command_sentence
-        command_examples = []
-        for idx2, row2 in char_df.iterrows():
-            if is_command_sentence(row2['text']):
-                command_examples.append(row2['text'])
-                if len(command_examples) >= 2:
-                    break
+        if index is not None:
+            command_examples = index.command_lines(character, limit=2).to_dict('records')
+        else:
+            from main import is_command_sentence
+            command_examples = []
+            for row2 in char_df.to_dict('records'):
+                if is_command_sentence(row2['text']):
+                    command_examples.append(row2)
+                    if len(command_examples) >= 2:
+                        break
         
         if command_examples:
             report.append(f"   指令句示例:")
             for i, ex in enumerate(command_examples, 1):
-                report.append(f"     示例{i}: {ex[:80]}...")
+                report.append(f"     示例{i}: {render_example(ex, source, limit=80)}")
+    
+    if index is not None:
+        index.close()
+    source.close()
     
     # 保存报告
     report_text = "\n".join(report)
-    output_path = OUTPUT_DIR / "evidence_report.txt"
+    output_path = output_dir / "evidence_report.txt"
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(report_text)
     
@@ -0,0 +1,174 @@
+"""
+从PDF文档中提取剧本文本（与 extract_word.extract_text_from_docx 接口相同）
+- 按页分块在多个子进程中并行提取，按页码顺序流式返回
+- 每页结果按文件内容哈希缓存在 output/pdf_cache/，重复运行只处理改动过的文件
+- iter_pdf_text_lines 逐页产出规范化后的行，可直接交给 extract_word.extract_speaker_turns 单遍提取台词，
+  不必先拼成全文
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import pdfplumber
+    HAS_PDFPLUMBER = True
+except ImportError:
+    HAS_PDFPLUMBER = False
+
+try:
+    from PyPDF2 import PdfReader
+    HAS_PYPDF2 = True
+except ImportError:
+    HAS_PYPDF2 = False
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+PDF_CACHE_DIR = OUTPUT_DIR / "pdf_cache"
+
+
+def _require_backend():
+    if not (HAS_PDFPLUMBER or HAS_PYPDF2):
+        raise ImportError("请安装 pdfplumber 或 PyPDF2: pip install pdfplumber")
+
+
+def count_pages(pdf_path):
+    """PDF总页数"""
+    _require_backend()
+    if HAS_PDFPLUMBER:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_page_range(pdf_path, start, end):
+    """提取 [start, end) 页的文本（在子进程中运行，每个分块只打开一次文件）"""
+    _require_backend()
+    if HAS_PDFPLUMBER:
+        with pdfplumber.open(pdf_path) as pdf:
+            return [(pdf.pages[i].extract_text() or "") for i in range(start, end)]
+    reader = PdfReader(pdf_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+class PageCache:
+    """
+    按页缓存：output/pdf_cache/<文件哈希>/
+    - pages.json 记录总页数
+    - 0001.txt ... 每页文本
+    文件内容变化后哈希不同，自然落到新目录
+    """
+
+    def __init__(self, pdf_path, cache_dir=PDF_CACHE_DIR):
+        from extract_word import file_hash
+        self.dir = Path(cache_dir) / file_hash(pdf_path)
+
+    def _page_path(self, page_no):
+        return self.dir / f"{page_no + 1:04d}.txt"
+
+    def page_count(self):
+        manifest = self.dir / "pages.json"
+        if not manifest.exists():
+            return None
+        with open(manifest, "r", encoding="utf-8") as f:
+            return json.load(f)["pages"]
+
+    def set_page_count(self, pages):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / "pages.json", "w", encoding="utf-8") as f:
+            json.dump({"pages": pages}, f)
+
+    def get(self, page_no):
+        path = self._page_path(page_no)
+        if not path.exists():
+            return None
+        return path.read_text(encoding="utf-8")
+
+    def put(self, page_no, text):
+        self._page_path(page_no).write_text(text, encoding="utf-8")
+
+
+def iter_pdf_pages(pdf_path, workers=None, chunk_size=8, use_cache=True):
+    """
+    按页码顺序逐页产出文本
+    未缓存的页按 chunk_size 分块交给进程池并行提取；前面的块一完成就开始产出
+    """
+    pdf_path = str(pdf_path)
+    cache = PageCache(pdf_path) if use_cache else None
+    total = cache.page_count() if cache else None
+    if total is None:
+        total = count_pages(pdf_path)
+        if cache:
+            cache.set_page_count(total)
+
+    cached = {}
+    if cache:
+        for page_no in range(total):
+            text = cache.get(page_no)
+            if text is not None:
+                cached[page_no] = text
+
+    missing = [p for p in range(total) if p not in cached]
+    if not missing:
+        for page_no in range(total):
+            yield cached[page_no]
+        return
+
+    # 把连续的缺失页分块
+    chunks = []
+    for page_no in missing:
+        if chunks and page_no == chunks[-1][1] and chunks[-1][1] - chunks[-1][0] < chunk_size:
+            chunks[-1][1] = page_no + 1
+        else:
+            chunks.append([page_no, page_no + 1])
+
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {start: executor.submit(extract_page_range, pdf_path, start, end) for start, end in chunks}
+        page_no = 0
+        for start, end in chunks:
+            while page_no < start:
+                yield cached[page_no]
+                page_no += 1
+            for text in futures[start].result():
+                if cache:
+                    cache.put(page_no, text)
+                yield text
+                page_no += 1
+        while page_no < total:
+            yield cached[page_no]
+            page_no += 1
+
+
+def iter_pdf_lines(pdf_path, **kwargs):
+    """按阅读顺序逐行产出非空文本行"""
+    for page_text in iter_pdf_pages(pdf_path, **kwargs):
+        for line in page_text.split("\n"):
+            line = line.strip()
+            if line:
+                yield line
+
+
+def iter_pdf_text_lines(pdf_path, **kwargs):
+    """
+    按页码顺序逐行产出规范化后的文本（见 normalize.py）
+    各行依次用换行连接，即为 extract_word.extract_text(pdf_path) 的全文，台词出处的字节偏移一致
+    """
+    from normalize import normalize_text
+    for line in iter_pdf_lines(pdf_path, **kwargs):
+        yield from normalize_text(line).split("\n")
+
+
+def extract_text_from_pdf(pdf_path, **kwargs):
+    """从PDF提取所有文本（每个非空行一行，与 extract_text_from_docx 的输出格式一致）"""
+    return "\n".join(iter_pdf_lines(pdf_path, **kwargs))
+
+
+def main():
+    # PDF 与 Word 文档走同一套台词提取流程
+    from extract_word import main as extract_main
+    extract_main()
+
+
+if __name__ == "__main__":
+    main()
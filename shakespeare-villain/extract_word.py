@@ -1,11 +1,21 @@
 """
-从Word文档(.docx)中提取莎士比亚三个剧本的文本，并识别反派角色的台词
+从Word文档(.docx)或PDF中提取莎士比亚三个剧本的文本，并识别反派角色的台词
 """
 import os
 import re
+import hashlib
+from collections import Counter
 import pandas as pd
 from pathlib import Path
 
+from extract_pdf import extract_text_from_pdf
+from normalize import normalize_text
+from turns import SCENE_BREAK, build_turn_graph, is_interrupted, stage_direction_pattern
+from play_sections import iter_play_sections
+from speaker_index import SpeakerIndex, build_speaker_index
+from checkpoint import CheckpointStore, fingerprint
+from metrics import DOCUMENTS, ERRORS, EXTRACTED_LINES, LINES, cache_lookup, timed
+
 try:
     from docx import Document
     HAS_DOCX = True
@@ -43,174 +53,248 @@ def extract_text_from_docx(docx_path):
     return "\n".join(text_parts)
 
 
-def identify_play_sections(full_text):
+def extract_text_from_txt(txt_path):
+    """读取纯文本版本（如 output/raw_text_*.txt 或其他版本的文本导出）"""
+    with open(txt_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# 文档后缀 -> 文本提取函数（接口相同：路径 -> 全文字符串）
+TEXT_EXTRACTORS = {
+    ".docx": extract_text_from_docx,
+    ".doc": extract_text_from_docx,
+    ".pdf": extract_text_from_pdf,
+    ".txt": extract_text_from_txt,
+}
+
+
+def extract_text(path):
+    """根据文件后缀选择提取方式，返回规范化后的全文（繁简、全半角、空白，见 normalize.py）"""
+    extractor = TEXT_EXTRACTORS.get(Path(path).suffix.lower())
+    if extractor is None:
+        raise ValueError(f"不支持的文件类型: {path}")
+    return normalize_text(extractor(str(path)))
+
+
+def identify_play_sections(full_text, plays=("哈姆雷特", "麦克白", "奥赛罗")):
     """
-    识别三个剧本的章节：
-    - 哈姆雷特（Hamlet）
-    - 麦克白（Macbeth）
-    - 奥赛罗（Othello）
+    识别文本中各剧本的章节（见 play_sections.py：剧名独占一行且其后紧跟剧中人物/第一幕等结构标志）
+    返回 {剧名: [行, ...]}，plays 中的剧本即使未出现也有对应的空列表；全集中的其他剧本按标准剧名收录
     """
-    plays = {
-        "哈姆雷特": [],
-        "麦克白": [],
-        "奥赛罗": []
-    }
-    
-    lines = full_text.split('\n')
-    current_play = None
-    current_text = []
-    
-    # 更灵活的匹配模式
-    play_keywords = {
-        "哈姆雷特": ["哈姆雷特", "Hamlet", "HAMLET"],
-        "麦克白": ["麦克白", "Macbeth", "MACBETH"],
-        "奥赛罗": ["奥赛罗", "Othello", "OTHELLO"]
-    }
-    
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        if not line_stripped:
-            continue
-        
-        # 检查是否是剧本标题（可能是单独一行，或包含在行中）
-        for play_name, keywords in play_keywords.items():
-            for keyword in keywords:
-                # 检查整行是否主要是标题
-                if keyword in line_stripped:
-                    # 如果这一行看起来像标题（短且包含关键词）
-                    if len(line_stripped) < 50 or line_stripped.startswith(keyword):
-                        # 保存之前的剧本
-                        if current_play and current_text:
-                            plays[current_play].extend(current_text)
-                        current_play = play_name
-                        current_text = []
-                        break
-            if current_play:
-                break
-        
-        if current_play:
-            current_text.append(line)
-    
-    # 保存最后一个剧本
-    if current_play and current_text:
-        plays[current_play].extend(current_text)
-    
-    return plays
+    sections = {play: [] for play in plays}
+    for play, line in iter_play_sections(full_text.split('\n')):
+        if play is not None and line.strip():
+            sections.setdefault(play, []).append(line)
+    return sections
+
 
+# 名字单独一行时，下一行若以中文数字开头（幕次场次）则不是台词
+SECTION_NUMBER_PATTERN = re.compile(r"^第?[一二三四五六七八九十]+")
 
-def extract_character_lines(text, character_name, play_name):
+
+def extract_speaker_turns(text, play_name, index, doc_id=None, turn_tails=None):
     """
-    从文本中提取特定角色的台词
-    朱生豪译本格式通常是：角色名 + 冒号/空格 + 台词
+    用角色名索引（见 speaker_index.py）逐行识别发言者，每行一次查找
+    朱生豪译本格式通常是：角色名 + 冒号/空格 + 台词；也支持角色名单独一行、下一行是台词
+    text: 全文字符串，或按顺序产出各行的可迭代对象（如 extract_pdf.iter_pdf_text_lines 逐页流式产出的行）；
+          单遍扫描，只缓存"角色名单独一行"时等待的一行
+    每条台词记录出处 doc_id/offset/length：全文的文档ID（document_id），台词在全文 UTF-8 编码中的字节偏移和字节长度
+    （全文即 save_raw_text 保存的 raw_text_<文档ID>.txt，见 provenance.py）；幕次场次取自发言所在行之前的标题
+    turn_tails: 给出列表时，同一遍扫描中为每条台词追加 (场次序号, 话轮是否以"——"/"……"结尾)
+    （场次序号在每个幕次/场次标题处加一；话轮延续到下一位发言者或标题之前，舞台说明不算；
+    供 turns.build_turn_graph 使用）
     """
+    if isinstance(text, str):
+        text = text.split('\n')
+    # 未给出 doc_id 时边扫描边计算（与 document_id(全文) 相同）
+    digest = hashlib.sha256() if doc_id is None else None
+    direction = stage_direction_pattern({*index.names, *index.names.values()})
     lines = []
-    text_lines = text.split('\n')
+    tails = []
+    section = 0         # 已经过的幕次/场次标题数
+    tail = None         # 当前话轮最后一行（不含舞台说明）
+    pending = None      # 角色名单独一行时的 (角色, 行号, 幕, 场)
+    line_start = 0      # 当前行在全文中的字节偏移
     
-    # 匹配模式1：角色名：台词（冒号可能是中文或英文）
-    pattern1 = re.compile(
-        rf"^\s*{re.escape(character_name)}\s*[：:]\s*(.+)$"
-    )
+    def continue_turn(line_stripped):
+        nonlocal tail, section
+        if SCENE_BREAK.match(line_stripped):
+            section += 1
+            tail = None
+        elif tail is not None and not direction.match(line_stripped):
+            tail = line_stripped
     
-    # 匹配模式2：角色名单独一行，下一行是台词
-    # 匹配模式3：角色名（台词）或 角色名 台词（无标点）
+    def append(character, dialogue, line, start, line_no, act, scene):
+        nonlocal tail
+        if lines:
+            tails.append(is_interrupted(tail))
+        tails.append(section)
+        tail = dialogue
+        # 台词是该行（去掉首尾空白后）的后缀，取最后一次出现的位置
+        offset = start + len(line[:line.rfind(dialogue)].encode("utf-8"))
+        lines.append({
+            "play": play_name,
+            "doc_id": doc_id,
+            "act": act,
+            "scene": scene,
+            "character": character,
+            "text": dialogue,
+            "offset": offset,
+            "length": len(dialogue.encode("utf-8")),
+            "line_no": line_no
+        })
     
-    for i, line in enumerate(text_lines):
+    for i, (line, act, scene) in enumerate(iter_act_scene(text)):
+        encoded = line.encode("utf-8")
+        if digest is not None:
+            digest.update(b"\n" + encoded if i else encoded)
+        start, line_start = line_start, line_start + len(encoded) + 1
         line_stripped = line.strip()
+        
+        if pending is not None:
+            character, name_line, name_act, name_scene = pending
+            pending = None
+            # 上一行是单独的角色名，本行不是场次标题、也不是另一句台词时即为其台词
+            if (line_stripped and
+                not SECTION_NUMBER_PATTERN.match(line_stripped) and
+                index.match(line_stripped) is None):
+                if len(line_stripped) > 2:
+                    append(character, line_stripped, line, start, name_line, name_act, name_scene)
+                else:
+                    continue_turn(line_stripped)
+                continue
+        
         if not line_stripped:
             continue
         
-        # 模式1：角色名：台词
-        match = pattern1.match(line_stripped)
-        if match:
-            dialogue = match.group(1).strip()
-            if dialogue and len(dialogue) > 2:  # 至少3个字符
-                lines.append({
-                    "play": play_name,
-                    "character": character_name,
-                    "text": dialogue,
-                    "raw_line": line_stripped
-                })
-                continue
+        match = index.match(line_stripped)
+        if match is None:
+            continue_turn(line_stripped)
+            continue
+        character, dialogue = match
         
-        # 模式2：角色名单独一行，下一行是台词
-        if line_stripped == character_name and i + 1 < len(text_lines):
-            next_line = text_lines[i + 1].strip()
-            # 下一行不是空，不是另一个角色名，不是幕次场次
-            if (next_line and 
-                len(next_line) > 2 and
-                not re.match(r"^第[一二三四五六七八九十]+", next_line) and
-                not re.match(r"^[一二三四五六七八九十]+", next_line)):
-                lines.append({
-                    "play": play_name,
-                    "character": character_name,
-                    "text": next_line,
-                    "raw_line": f"{line_stripped}\n{next_line}"
-                })
-                continue
+        # 角色名单独一行（不含字间空格，排除页眉"麦     克     白"），下一行是台词
+        if not dialogue and not re.search(r"\s", line_stripped):
+            pending = (character, i, act, scene)
+            continue
         
-        # 模式3：行首是角色名，后面直接跟台词（无冒号）
-        if line_stripped.startswith(character_name):
-            remaining = line_stripped[len(character_name):].strip()
-            # 去掉可能的标点
-            remaining = re.sub(r"^[：:\s]+", "", remaining)
-            if remaining and len(remaining) > 2:
-                lines.append({
-                    "play": play_name,
-                    "character": character_name,
-                    "text": remaining,
-                    "raw_line": line_stripped
-                })
+        if len(dialogue) > 2:  # 至少3个字符
+            append(character, dialogue, line, start, i, act, scene)
+        else:
+            continue_turn(line_stripped)
     
+    if lines:
+        tails.append(is_interrupted(tail))
+    if turn_tails is not None:
+        turn_tails.extend(zip(tails[::2], tails[1::2]))
+    if digest is not None:
+        doc_id = digest.hexdigest()[:16]
+        for line in lines:
+            line["doc_id"] = doc_id
     return lines
 
 
-def parse_act_scene_from_text(text_lines):
+def extract_character_lines(text, character_name, play_name, aliases=()):
     """
-    尝试识别幕次和场次
-    返回每行对应的act和scene
+    从文本中提取特定角色的台词
+    text: 全文，或逐行产出的可迭代对象（角色名已知，不需要先扫描全文发现角色，
+          PDF 可直接传入 extract_pdf.iter_pdf_text_lines 逐页流式提取）
+    aliases: 替代名称（如"国王"代表"克劳狄斯"），与角色名一起一次识别
+    """
+    index = SpeakerIndex({name: character_name for name in (character_name, *aliases)})
+    return extract_speaker_turns(text, play_name, index)
+
+
+def extract_all_speaker_lines(text, play_name, min_turns=3, aliases=None):
+    """
+    提取剧本中所有角色的台词（不只是反派）
+    角色名从剧本中自动发现，出现次数少于 min_turns 的行首词视为噪声（人物表、舞台说明等）
+    aliases: {别名: 标准角色名}，始终识别
+    """
+    index = build_speaker_index(text.split('\n'), aliases, min_turns)
+    return extract_speaker_turns(text, play_name, index)
+
+
+ACT_HEADER_PATTERN = re.compile(r"^第([一二三四五六七八九十]+)幕")
+SCENE_HEADER_PATTERN = re.compile(r"^第([一二三四五六七八九十]+)场")
+CHINESE_DIGITS = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+def chinese_number(text):
+    """一~九十九的中文数字 -> 整数（"十一" -> 11，"二十" -> 20）"""
+    if "十" not in text:
+        return CHINESE_DIGITS.get(text, 1)
+    tens, _, ones = text.partition("十")
+    return CHINESE_DIGITS.get(tens, 1) * 10 + CHINESE_DIGITS.get(ones, 0)
+
+
+def iter_act_scene(text_lines):
+    """
+    识别幕次和场次：行首（去掉字间空格后）为"第一幕"/"第一场"的行是标题
+    （如"第 一 幕"、"第一场  艾尔西诺。城堡前的露台"；对白中提到"那幕戏"不算），换幕时场次回到 1
+    逐行产出 (行, 幕, 场)；第一个标题之前的行记为第1幕第1场
     """
-    act_scene_pattern = re.compile(
-        r"(第[一二三四五六七八九十]+幕)\s*(第[一二三四五六七八九十]+场)?",
-        re.IGNORECASE
-    )
-    
-    act_map = {
-        "一": "1", "二": "2", "三": "3", "四": "4", "五": "5",
-        "六": "6", "七": "7", "八": "8", "九": "9", "十": "10"
-    }
-    
     current_act = "1"
     current_scene = "1"
-    act_scene_list = []
-    
     for line in text_lines:
-        match = act_scene_pattern.search(line)
+        compact = re.sub(r"\s+", "", line)
+        match = ACT_HEADER_PATTERN.match(compact)
         if match:
-            act_str = match.group(1)
-            scene_str = match.group(2) if match.group(2) else None
-            
-            # 转换中文数字
-            for cn, num in act_map.items():
-                if cn in act_str:
-                    current_act = num
-                    break
-            
-            if scene_str:
-                for cn, num in act_map.items():
-                    if cn in scene_str:
-                        current_scene = num
-                        break
-        
-        act_scene_list.append({
-            "act": current_act,
-            "scene": current_scene
-        })
-    
-    return act_scene_list
+            current_act = str(chinese_number(match.group(1)))
+            current_scene = "1"
+            compact = compact[match.end():]
+        match = SCENE_HEADER_PATTERN.match(compact)
+        if match:
+            current_scene = str(chinese_number(match.group(1)))
+        yield line, current_act, current_scene
+
+
+def parse_act_scene_from_text(text_lines):
+    """每行对应的act和scene"""
+    return [{"act": act, "scene": scene} for _, act, scene in iter_act_scene(text_lines)]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """文件字节内容的哈希（同一文件换了文件名也能识别）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    """文本内容哈希：忽略空白差异，同一文本的不同文件格式/排版得到相同哈希"""
+    return hashlib.sha256(re.sub(r"\s+", "", text).encode("utf-8")).hexdigest()
 
 
-def identify_play_from_filename(filename):
-    """从文件名识别剧本"""
+def document_id(text):
+    """
+    文档ID：规范化全文 UTF-8 字节的哈希（前16位），台词出处的字节偏移指向这份全文
+    与 text_hash 不同，空白不同的版本字节偏移也不同，因此得到不同的ID
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def dedupe_lines(lines):
+    """
+    合并重复台词（叠句、表格重复单元格等），保留首次出现的位置
+    每条记录增加 multiplicity 字段记录重复次数
+    """
+    unique = {}
+    for line in lines:
+        key = hashlib.sha1(
+            f"{line['play']}\x00{line['character']}\x00{line['text']}".encode("utf-8")
+        ).digest()
+        if key in unique:
+            unique[key]["multiplicity"] += 1
+        else:
+            unique[key] = dict(line, multiplicity=1)
+    return list(unique.values())
+
+
+def identify_play_from_filename(filename, plays=()):
+    """从文件名识别剧本；plays 为额外配置的剧名（批处理任务中的其他剧本）"""
     filename_lower = filename.lower()
     if "哈姆雷特" in filename or "hamlet" in filename_lower:
         return "哈姆雷特"
@@ -218,6 +302,9 @@ def identify_play_from_filename(filename):
         return "麦克白"
     elif "奥赛罗" in filename or "othello" in filename_lower:
         return "奥赛罗"
+    for play_name in plays:
+        if play_name in filename:
+            return play_name
     return None
 
 
@@ -240,40 +327,233 @@ def identify_play_from_content(text):
     return None
 
 
-def main():
-    base_dir = Path(__file__).parent.parent
+# 三个剧本的配置
+# 注意：哈姆雷特中克劳狄斯的台词可能以"国王"或"国  王"标识
+PLAY_CONFIGS = {
+    "哈姆雷特": {"character": "克劳狄斯", "alt_names": ["国王", "国  王"]},
+    "麦克白": {"character": "麦克白", "alt_names": []},
+    "奥赛罗": {"character": "伊阿古", "alt_names": []}
+}
+
+DOCUMENT_PATTERNS = ("*.docx", "*.doc", "*.pdf")
+
+LINE_COLUMNS = ["play", "act", "scene", "character", "to", "is_interrupt", "multiplicity",
+                "doc_id", "offset", "length", "text"]
+# all_lines.csv 与 turn_edges.csv 的列（逐文档追加写入，列顺序固定，不依赖检查点中记录的键顺序）
+SPEAKER_LINE_COLUMNS = ["play", "doc_id", "act", "scene", "character", "text", "offset", "length",
+                        "line_no", "to", "is_interrupt", "multiplicity"]
+TURN_EDGE_COLUMNS = ["play", "from", "to", "count"]
+# 台词记录的结构版本，计入检查点指纹：记录字段变化后旧检查点自动失效
+RECORD_SCHEMA = 2
+
+
+def is_skipped_file(path):
+    """跳过临时文件（含Word编辑时的 ~$ 锁文件）和演讲稿文件"""
+    name = Path(path).name
+    return name.startswith(('.~', '~$')) or '新闻稿子' in name or '演讲稿' in name
+
+
+def find_word_files(base_dir, patterns=DOCUMENT_PATTERNS):
+    """查找目录下所有待处理文档（Word 和 PDF）"""
+    word_files = []
+    for pattern in patterns:
+        word_files.extend(Path(base_dir).glob(pattern))
+    return word_files
+
+
+def annotate_turns(turns, turn_tails, character_lines, speaker_lines, play_name):
+    """
+    用话轮序列（见 turns.py）填写每条台词的对话对象 to 和打断标记 is_interrupt
+    turns / turn_tails: extract_speaker_turns 的台词记录及其 (场次序号, 是否被打断)（不再重新扫描全文）
+    返回话轮邻接边列表
+    """
+    graph = build_turn_graph(turns, turn_tails)
+    annotations = graph.annotations()
+    for line in (*speaker_lines, *character_lines):
+        line["to"], line["is_interrupt"] = annotations.get(line["line_no"], ("", 0))
+    print(f"话轮: {len(graph)} 个, 打断: {int(graph.interrupts.sum())} 次")
+    return graph.edges(play_name)
+
+
+def extract_play_lines(full_text, play_name, config):
+    """
+    从一个剧本的全文中提取反派台词和全角色台词
+    返回 (反派台词列表, 全角色台词列表, 话轮邻接边列表)
+    """
+    character_name = config["character"]
+    
+    # 所有角色一次识别；替代名称（如"国王"代表"克劳狄斯"）与角色名在同一个索引里
+    aliases = {name: character_name for name in (character_name, *config.get("alt_names", []))}
+    index = build_speaker_index(full_text.split('\n'), aliases)
+    turn_tails = []
+    turns = extract_speaker_turns(full_text, play_name, index, document_id(full_text), turn_tails)
+    print(f"识别角色: {len(index)} 个")
+    
+    # 全角色台词（用于角色相似度检索）；与反派台词是不同的记录，annotate_turns 分别标注
+    speaker_lines = [dict(line) for line in turns]
+    
+    # 提取角色台词
+    print(f"\n正在提取 {character_name} 的台词...")
+    character_lines = [line for line in turns if line["character"] == character_name]
+    
+    # 去重前标注话轮，重复台词保留首次出现时的对话对象
+    turn_edges = annotate_turns(turns, turn_tails, character_lines, speaker_lines, play_name)
+    speaker_lines = dedupe_lines(speaker_lines)
+    print(f"全角色台词: {len(speaker_lines)} 条")
+    
+    # 重复台词只保留一条，记录重复次数
+    extracted_count = len(character_lines)
+    character_lines = dedupe_lines(character_lines)
+    print(f"找到 {len(character_lines)} 条台词")
+    if extracted_count > len(character_lines):
+        print(f"  合并重复台词: {extracted_count - len(character_lines)} 条")
+    return character_lines, speaker_lines, turn_edges
+
+
+def save_raw_text(full_text, output_dir):
+    """
+    保存规范化后的全文：用于调试，也是台词出处（doc_id/offset/length）所指的文档
+    文件名为文档ID（内容哈希），同一剧本的多个版本各自保存，互不覆盖
+    """
+    raw_text_path = Path(output_dir) / f"raw_text_{document_id(full_text)}.txt"
+    # 不做换行符转换，保证字节偏移与提取时一致
+    with open(raw_text_path, "w", encoding="utf-8", newline="") as f:
+        f.write(full_text)
+    return raw_text_path
+
+
+def process_document(word_file, output_dir, play_configs=PLAY_CONFIGS):
+    """
+    处理单个文档：识别剧本、保存原始文本、提取台词
+    可在子进程中运行（watch 模式的工作进程池）；无法识别剧本时返回 None
+    output_dir 为 None 时不保存原始文本（台词出处所指的全文不存在，展示时退回 text 列）
+    """
+    word_file = Path(word_file)
+    full_text = extract_text(word_file)
+    play_name = identify_play_from_filename(word_file.name) or identify_play_from_content(full_text)
+    if play_name not in play_configs:
+        return None
+    
+    if output_dir is not None:
+        save_raw_text(full_text, output_dir)
+    character_lines, speaker_lines, turn_edges = extract_play_lines(
+        full_text, play_name, play_configs[play_name])
+    return {
+        "play": play_name,
+        "file": str(word_file),
+        "text_hash": text_hash(full_text),
+        "lines": character_lines,
+        "speaker_lines": speaker_lines,
+        "turn_edges": turn_edges,
+    }
+
+
+def _fill_line_defaults(df):
+    """台词记录中缺失的字段（旧检查点）取默认值"""
+    # 幕次场次由 extract_speaker_turns 从标题识别；缺失时（旧检查点）记为第1幕第1场
+    for column in ("act", "scene"):
+        df[column] = df[column].fillna("1") if column in df else "1"
+    # 对话对象和打断标记由 annotate_turns 填写，缺失时取默认值
+    if "to" not in df:
+        df["to"] = ""
+    if "is_interrupt" not in df:
+        df["is_interrupt"] = 0
+    df["to"] = df["to"].fillna("")
+    df["is_interrupt"] = df["is_interrupt"].fillna(0).astype(int)
+    # 没有出处的记录（旧检查点）记为 -1，展示时退回 text 列
+    df["doc_id"] = df["doc_id"].fillna("") if "doc_id" in df else ""
+    for column in ("offset", "length"):
+        df[column] = df[column].fillna(-1).astype(int) if column in df else -1
+    df["multiplicity"] = df["multiplicity"].fillna(1).astype(int) if "multiplicity" in df else 1
+    return df
+
+
+def build_lines_dataframe(all_lines):
+    """把台词记录整理为 villain_lines.csv 的表结构"""
+    df = _fill_line_defaults(pd.DataFrame(all_lines))
+    # 重新排列列顺序
+    return df[LINE_COLUMNS]
+
+
+def build_speaker_lines_dataframe(speaker_lines):
+    """把全角色台词记录整理为 all_lines.csv 的表结构（固定列顺序，多余的键丢弃）"""
+    df = _fill_line_defaults(pd.DataFrame(speaker_lines))
+    df["line_no"] = df["line_no"].fillna(-1).astype(int) if "line_no" in df else -1
+    return df.reindex(columns=SPEAKER_LINE_COLUMNS)
+
+
+def append_csv(df, path):
+    """追加写入 CSV（文件不存在时写表头）"""
+    path = Path(path)
+    df.to_csv(path, mode="a", header=not path.exists(), index=False,
+              encoding="utf-8-sig" if not path.exists() else "utf-8")
+
+
+def save_turn_edges(all_turn_edges, output_dir):
+    """保存话轮邻接边（谁紧接着谁发言及次数）"""
+    edges_df = pd.DataFrame(all_turn_edges).reindex(columns=TURN_EDGE_COLUMNS)
+    edges_path = Path(output_dir) / "turn_edges.csv"
+    edges_df.to_csv(edges_path, index=False, encoding="utf-8-sig")
+    print(f"话轮邻接边已保存: {edges_path} ({len(edges_df)} 条)")
+    return edges_path
+
+
+def save_speaker_lines(all_speaker_lines, output_dir):
+    """保存全角色台词"""
+    speakers_df = build_speaker_lines_dataframe(all_speaker_lines)
+    speakers_path = Path(output_dir) / "all_lines.csv"
+    speakers_df.to_csv(speakers_path, index=False, encoding="utf-8-sig")
+    print(f"\n全角色台词已保存: {speakers_path} ({speakers_df['character'].nunique()} 个角色)")
+    return speakers_path
+
+
+@timed("extract")
+def main(base_dir=None, output_dir=None, play_configs=PLAY_CONFIGS, patterns=DOCUMENT_PATTERNS):
+    """
+    base_dir: 文档所在目录（默认项目根目录）
+    output_dir: 输出目录（默认 shakespeare-villain/output）
+    play_configs: 剧本 -> 反派配置（默认 PLAY_CONFIGS）
+    patterns: 文档文件名模式（默认 Word 和 PDF）
+    """
+    base_dir = Path(base_dir) if base_dir else Path(__file__).parent.parent
+    output_dir = Path(output_dir) if output_dir else Path(__file__).parent / "output"
     
     # 查找所有Word文档
-    word_files = list(base_dir.glob("*.docx")) + list(base_dir.glob("*.doc"))
+    word_files = find_word_files(base_dir, patterns)
     
     if not word_files:
-        print(f"错误: 在 {base_dir} 中找不到Word文档(.docx或.doc)")
+        print(f"错误: 在 {base_dir} 中找不到Word文档(.docx或.doc)或PDF")
         print("请将三个Word文档（哈姆雷特、麦克白、奥赛罗）放在项目根目录")
         return
     
-    print(f"找到 {len(word_files)} 个Word文档:")
+    print(f"找到 {len(word_files)} 个文档:")
     for f in word_files:
         print(f"  - {f.name}")
     
-    # 三个剧本的配置
-    # 注意：哈姆雷特中克劳狄斯的台词可能以"国王"或"国  王"标识
-    play_configs = {
-        "哈姆雷特": {"character": "克劳狄斯", "alt_names": ["国王", "国  王"], "file": None},
-        "麦克白": {"character": "麦克白", "alt_names": [], "file": None},
-        "奥赛罗": {"character": "伊阿古", "alt_names": [], "file": None}
-    }
+    configured = play_configs
+    play_configs = {name: dict(config, file=None) for name, config in configured.items()}
     
     # 为每个剧本匹配对应的Word文档
     print("\n正在识别每个文档对应的剧本...")
     
-    # 先按文件名精确匹配
+    # 内容完全相同的文件（换了文件名的副本）只保留一个
+    seen_files = {}
+    unique_files = []
     for word_file in word_files:
-        # 跳过临时文件和演讲稿文件
-        if word_file.name.startswith('.~') or '新闻稿子' in word_file.name or '演讲稿' in word_file.name:
+        if is_skipped_file(word_file):
             print(f"  跳过: {word_file.name} (临时文件或演讲稿)")
             continue
-        
-        play_name = identify_play_from_filename(word_file.name)
+        digest = file_hash(word_file)
+        if digest in seen_files:
+            print(f"  跳过: {word_file.name} (与 {seen_files[digest].name} 内容相同)")
+            continue
+        seen_files[digest] = word_file
+        unique_files.append(word_file)
+    word_files = unique_files
+    
+    # 先按文件名精确匹配
+    for word_file in word_files:
+        play_name = identify_play_from_filename(word_file.name, play_configs)
         
         if play_name and play_name in play_configs:
             if play_configs[play_name]["file"] is None:
@@ -286,16 +566,12 @@ def main():
     for play_name, config in play_configs.items():
         if config["file"] is None:
             for word_file in word_files:
-                # 跳过临时文件和演讲稿文件
-                if word_file.name.startswith('.~') or '新闻稿子' in word_file.name or '演讲稿' in word_file.name:
-                    continue
-                
                 # 跳过已匹配的文件
                 if any(c["file"] == word_file for c in play_configs.values() if c["file"]):
                     continue
                 
                 try:
-                    text = extract_text_from_docx(str(word_file))
+                    text = extract_text(word_file)
                     identified = identify_play_from_content(text)
                     if identified == play_name:
                         play_configs[play_name]["file"] = word_file
@@ -311,11 +587,19 @@ def main():
         print("请确保文件名包含剧本名称（如：哈姆雷特.docx、麦克白.docx、奥赛罗.docx）")
     
     # 保存原始文本用于调试
-    output_dir = base_dir / "shakespeare-villain" / "output"
-    output_dir.mkdir(exist_ok=True)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # 每处理完一个文档就提交到检查点；中途失败后重新运行，已完成的文档直接复用
+    file_digests = {word_file: digest for digest, word_file in seen_files.items()}
+    store = CheckpointStore("extract", fingerprint(
+        RECORD_SCHEMA, configured, sorted((name, file_digests.get(c["file"])) for name, c in play_configs.items())),
+        root=output_dir / "checkpoints")
+    store.prune_stale()
     
     # 提取每个剧本的台词
-    all_lines = []
+    committed = []
+    failed = []
+    seen_texts = {}
     
     for play_name, config in play_configs.items():
         if config["file"] is None:
@@ -324,84 +608,106 @@ def main():
         
         word_file = config["file"]
         character_name = config["character"]
+        key = f"{play_name}-{file_digests[word_file][:16]}"
         
         print(f"\n{'='*60}")
         print(f"处理: {play_name} ({word_file.name})")
         print(f"提取角色: {character_name}")
         print(f"{'='*60}")
         
-        try:
-            full_text = extract_text_from_docx(str(word_file))
-            print(f"文本长度: {len(full_text)} 字符")
-            
-            # 保存原始文本
-            raw_text_path = output_dir / f"raw_text_{play_name}.txt"
-            with open(raw_text_path, "w", encoding="utf-8") as f:
-                f.write(full_text)
-            print(f"原始文本已保存: {raw_text_path}")
-            
-            # 提取角色台词
-            print(f"\n正在提取 {character_name} 的台词...")
-            character_lines = extract_character_lines(full_text, character_name, play_name)
-            
-            # 如果主要角色名提取失败，尝试使用替代名称（如"国王"代表"克劳狄斯"）
-            if len(character_lines) < 10 and "alt_names" in config:
-                for alt_name in config.get("alt_names", []):
-                    print(f"  尝试使用替代名称: {alt_name}")
-                    alt_lines = extract_character_lines(full_text, alt_name, play_name)
-                    if len(alt_lines) > len(character_lines):
-                        character_lines = alt_lines
-                        print(f"  使用 {alt_name} 找到 {len(character_lines)} 条台词")
-            
-            # 统一角色名（如果使用了替代名称，改为标准名称）
-            for line in character_lines:
-                line["character"] = character_name
-            
-            print(f"找到 {len(character_lines)} 条台词")
-            
-            if len(character_lines) > 0:
-                print(f"\n前5条示例:")
-                for i, line in enumerate(character_lines[:5]):
-                    print(f"  {i+1}. {line['text'][:60]}...")
-            
-            all_lines.extend(character_lines)
-            
-        except Exception as e:
-            print(f"处理 {play_name} 时出错: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-    
-    # 转换为DataFrame
-    if all_lines:
-        df = pd.DataFrame(all_lines)
-        
-        # 为每条台词分配幕次场次（简化处理，默认值）
-        # 后续可以根据文本内容改进，自动识别幕次场次
-        df["act"] = "1"
-        df["scene"] = "1"
-        df["to"] = ""  # 对话对象，需要人工标注或后续改进
-        df["is_interrupt"] = 0
-        
-        # 重新排列列顺序
-        df = df[["play", "act", "scene", "character", "to", "is_interrupt", "text"]]
+        result = store.get(key)
+        cache_lookup("checkpoint", result is not None)
+        if result is not None:
+            print(f"从检查点恢复: {len(result['lines'])} 条台词")
+        else:
+            try:
+                full_text = extract_text(word_file)
+                print(f"文本长度: {len(full_text)} 字符")
+                
+                # 不同文件中的同一文本（如另存为的版本）只处理一次
+                digest = text_hash(full_text)
+                if digest in seen_texts:
+                    print(f"跳过: 文本与 {seen_texts[digest]} 相同")
+                    continue
+                
+                # 保存原始文本
+                raw_text_path = save_raw_text(full_text, output_dir)
+                print(f"原始文本已保存: {raw_text_path}")
+                
+                character_lines, speaker_lines, turn_edges = extract_play_lines(full_text, play_name, config)
+                result = {
+                    "play": play_name,
+                    "file": word_file.name,
+                    "text_hash": digest,
+                    "lines": character_lines,
+                    "speaker_lines": speaker_lines,
+                    "turn_edges": turn_edges,
+                }
+                store.put(key, result)
+                
+            except Exception as e:
+                print(f"处理 {play_name} 时出错: {e}")
+                ERRORS.inc(stage="extract", play=play_name)
+                import traceback
+                traceback.print_exc()
+                failed.append(play_name)
+                continue
         
-        # 保存CSV
-        csv_path = output_dir / "villain_lines.csv"
-        df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+        if result["text_hash"] in seen_texts:
+            print(f"跳过: 文本与 {seen_texts[result['text_hash']]} 相同")
+            continue
+        seen_texts[result["text_hash"]] = result["file"]
         
+        character_lines = result["lines"]
+        if len(character_lines) > 0:
+            print(f"\n前5条示例:")
+            for i, line in enumerate(character_lines[:5]):
+                print(f"  {i+1}. {line['text'][:60]}...")
+        committed.append(key)
+        DOCUMENTS.inc(stage="extract")
+    
+    # 逐个文档从检查点读出并追加写入，内存中只保留一个文档的台词
+    csv_path = output_dir / "villain_lines.csv"
+    speakers_path = output_dir / "all_lines.csv"
+    edges_path = output_dir / "turn_edges.csv"
+    for path in (csv_path, speakers_path, edges_path):
+        if path.exists():
+            path.unlink()
+    
+    stats = Counter()
+    speaker_names = set()
+    preview = []
+    for key in committed:
+        result = store.get(key)
+        LINES.inc(len(result["speaker_lines"]) or len(result["lines"]), stage="extract")
+        if result["speaker_lines"]:
+            append_csv(build_speaker_lines_dataframe(result["speaker_lines"]), speakers_path)
+            append_csv(pd.DataFrame(result["turn_edges"]).reindex(columns=TURN_EDGE_COLUMNS), edges_path)
+            speaker_names.update((result["play"], line["character"]) for line in result["speaker_lines"])
+        if result["lines"]:
+            df = build_lines_dataframe(result["lines"])
+            append_csv(df, csv_path)
+            stats.update(zip(df["play"], df["character"]))
+            if len(preview) < 10:
+                preview.extend(df.head(10 - len(preview)).to_dict("records"))
+    
+    if speaker_names:
+        print(f"\n全角色台词已保存: {speakers_path} ({len({c for _, c in speaker_names})} 个角色)")
+        print(f"话轮邻接边已保存: {edges_path}")
+    
+    if stats:
         print(f"\n{'='*60}")
         print(f"✓ 提取完成！")
         print(f"{'='*60}")
-        print(f"总共提取 {len(df)} 条台词")
+        print(f"总共提取 {sum(stats.values())} 条台词")
         print(f"已保存到: {csv_path}")
         print(f"\n各角色台词统计:")
-        stats = df.groupby(["play", "character"]).size()
-        for (play, char), count in stats.items():
+        for (play, char), count in sorted(stats.items()):
             print(f"  {play} - {char}: {count} 条")
+            EXTRACTED_LINES.set(count, play=play, character=char)
         
         print(f"\n数据预览（前10条）:")
-        print(df.head(10).to_string())
+        print(pd.DataFrame(preview, columns=LINE_COLUMNS).to_string())
         
     else:
         print("\n" + "="*60)
@@ -415,6 +721,12 @@ def main():
         print("1. 查看 output/raw_text_*.txt 检查文本提取是否正确")
         print("2. 如果提取正确但未识别到台词，可能需要手动调整提取规则")
         print("3. 确保Word文档文件名包含剧本名称（如：哈姆雷特.docx）")
+    
+    # 所有剧本都成功处理后才删除检查点，否则保留供下次续跑
+    if not failed:
+        store.clear()
+    else:
+        print(f"\n以下剧本处理失败，已完成的部分保存在检查点中，修复后重新运行即可继续: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
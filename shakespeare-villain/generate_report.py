@@ -1,126 +1,478 @@
 """
 生成论文用的格式化报告
+- 一次遍历特征表，同时写出 Markdown、LaTeX、HTML 三种格式（以及单独的 LaTeX 表格片段 latex_table.txt）
+- 报告结构（数据概览、特征表、主要发现、文本证据、图表）由 ReportWriter 逐段分发给各格式的渲染器，
+  每一行表格格式化一次后立即写入各个文件，不在内存中拼接整份报告
+- 角色、指标列都来自特征表本身：任意角色名单、关键词配置下的分组都能生成报告
+- 角色很多时表格分页：LaTeX 用 longtable（跨页自动重复表头），Markdown/HTML 每 page_size 行另起一个表格
+
+用法：
+    python generate_report.py
+    python generate_report.py --formats md html --page-size 100 --evidence-limit 10
 """
-import pandas as pd
+import argparse
+import html
 from pathlib import Path
+from typing import NamedTuple
+
+import pandas as pd
+
+from metrics import timed
+from provenance import RawTextSource
 
 BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
 
+TITLE = "莎士比亚反派性格量化分析结果报告"
+TABLE_CAPTION = "莎士比亚反派性格量化特征数据表"
+
+# 关键词分组的中文名（关键词配置中的其他分组直接用分组名）
+GROUP_LABELS = {
+    "power": "权力词汇",
+    "lie": "谎言词汇",
+    "ambition": "野心词汇",
+    "violence": "暴力词汇",
+    "fear": "恐惧词汇",
+}
+
+# 报告中列出的图表（只列出输出目录中实际存在的文件）
+FIGURES = [
+    ("radar_chart.png", "雷达图展示多维度性格差异"),
+    ("bar_charts.png", "柱状图展示单项指标对比"),
+    ("correlation_heatmap.png", "相关性热力图"),
+    ("comprehensive_comparison.png", "综合对比图"),
+]
+
+
+class Column(NamedTuple):
+    """特征表中的一列：列名、表头、单位、数值后缀、显示倍数、小数位数、主要发现中取最大(1)还是最小(-1)"""
+    key: str
+    label: str
+    unit: str
+    suffix: str = ""
+    scale: float = 1.0
+    digits: int = 2
+    direction: int = 1
+
+    def format(self, value) -> str:
+        if pd.isna(value):
+            return "-"
+        return f"{value * self.scale:.{self.digits}f}"
+
+
+def report_columns(df: pd.DataFrame) -> list:
+    """特征表中要展示的列：各关键词分组频次、句法特征、情感倾向（缺少的列跳过）"""
+    groups = [
+        c for c in df.columns
+        if c.endswith("_per_1000") and not c.startswith("emotion_")
+    ]
+    columns = [
+        Column(c, GROUP_LABELS.get(c[:-len("_per_1000")], c[:-len("_per_1000")]), "每千词", "/千词")
+        for c in groups
+    ]
+    columns += [
+        Column("avg_sentence_length", "平均句长", "字符", "字符"),
+        Column("complex_ratio", "复杂句比例", "%", "%", scale=100),
+        Column("command_ratio", "指令句比例", "%", "%", scale=100),
+        Column("sentiment", "情感倾向", "-1~1", digits=3, direction=-1),
+    ]
+    return [c for c in columns if c.key in df.columns]
+
+
+# ---------------------------------------------------------------- 渲染器
+
+class Renderer:
+    """
+    某一种格式的输出：ReportWriter 按文档顺序调用下列方法，渲染器直接写入文件
+    行内强调用 bullets 的 (标题, 正文) 二元组表示，由各格式自行转义和加粗
+    """
+
+    def __init__(self, path, page_size=50):
+        self.path = Path(path)
+        self.page_size = page_size
+        self.file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, text=""):
+        self.file.write(text + "\n")
+
+    def escape(self, text) -> str:
+        return str(text)
+
+    def begin(self, title): ...
+    def heading(self, text, level=2): ...
+    def paragraph(self, text): ...
+    def bullets(self, items, ordered=False): ...
+    def table_begin(self, columns, caption): ...
+    def table_page(self, columns, caption, page): ...
+    def table_row(self, name, cells): ...
+    def table_end(self): ...
+    def end(self): ...
+
+    def close(self):
+        self.file.close()
+
+
+class MarkdownRenderer(Renderer):
+
+    def escape(self, text):
+        return str(text).replace("|", "\\|")
+
+    def begin(self, title):
+        self.write(f"# {title}")
+        self.write()
+
+    def heading(self, text, level=2):
+        self.write(f"{'#' * level} {text}")
+        self.write()
+
+    def paragraph(self, text):
+        self.write(text)
+        self.write()
+
+    def bullets(self, items, ordered=False):
+        for i, (term, text) in enumerate(items, 1):
+            marker = f"{i}." if ordered else "-"
+            self.write(f"{marker} **{term}**: {text}" if term else f"{marker} {text}")
+        self.write()
+
+    def table_page(self, columns, caption, page):
+        if page > 1:
+            self.write()
+            self.write(f"*{caption}（续，第 {page} 页）*")
+            self.write()
+        self.write("| 角色 | " + " | ".join(f"{c.label}<br>({c.unit})" for c in columns) + " |")
+        self.write("|------|" + "|".join(":---:" for _ in columns) + "|")
+
+    def table_row(self, name, cells):
+        self.write(f"| {self.escape(name)} | " + " | ".join(cells) + " |")
+
+    def table_end(self):
+        self.write()
+
+
+class LatexRenderer(Renderer):
+    """
+    完整的 ctexart 文档；fragment=True 时只输出表格（latex_table.txt，直接粘贴进论文）
+    longtable 自己分页，\\LTchunksize 控制每次排版的行数，几千行也不会耗尽 TeX 内存
+    """
+    SPECIALS = {"\\": r"\textbackslash{}", "&": r"\&", "%": r"\%", "$": r"\$", "#": r"\#",
+                "_": r"\_", "{": r"\{", "}": r"\}", "~": r"\textasciitilde{}", "^": r"\textasciicircum{}"}
+    TABLE = str.maketrans(SPECIALS)
+
+    def __init__(self, path, page_size=50, fragment=False):
+        super().__init__(path, page_size)
+        self.fragment = fragment
+
+    def escape(self, text):
+        return str(text).translate(self.TABLE)
+
+    def begin(self, title):
+        if self.fragment:
+            return
+        self.write(r"\documentclass{ctexart}")
+        self.write(r"\usepackage{booktabs}")
+        self.write(r"\usepackage{longtable}")
+        self.write(f"\\title{{{self.escape(title)}}}")
+        self.write(r"\date{}")
+        self.write(r"\begin{document}")
+        self.write(r"\maketitle")
+        self.write()
+
+    def heading(self, text, level=2):
+        if not self.fragment:
+            command = {2: "section", 3: "subsection"}.get(level, "paragraph")
+            self.write(f"\\{command}*{{{self.escape(text)}}}")
+
+    def paragraph(self, text):
+        if not self.fragment:
+            self.write(self.escape(text))
+            self.write()
+
+    def bullets(self, items, ordered=False):
+        if self.fragment:
+            return
+        env = "enumerate" if ordered else "itemize"
+        self.write(f"\\begin{{{env}}}")
+        for term, text in items:
+            term = f"\\textbf{{{self.escape(term)}}}: " if term else ""
+            self.write(f"  \\item {term}{self.escape(text)}")
+        self.write(f"\\end{{{env}}}")
+        self.write()
+
+    def table_begin(self, columns, caption):
+        header = "角色 & " + " & ".join(self.escape(c.label) for c in columns) + r" \\"
+        units = " & " + " & ".join(f"({self.escape(c.unit)})" for c in columns) + r" \\"
+        self.write(f"\\setcounter{{LTchunksize}}{{{self.page_size}}}")
+        self.write(r"{\small")
+        self.write(f"\\begin{{longtable}}{{l{'c' * len(columns)}}}")
+        self.write(f"\\caption{{{self.escape(caption)}}}")
+        self.write(r"\label{tab:villain_features} \\")
+        for line in (r"\toprule", header, units, r"\midrule", r"\endfirsthead"):
+            self.write(line)
+        self.write(f"\\multicolumn{{{len(columns) + 1}}}{{l}}{{\\small {self.escape(caption)}（续）}} \\\\")
+        for line in (r"\toprule", header, units, r"\midrule", r"\endhead"):
+            self.write(line)
+        self.write(r"\midrule")
+        self.write(f"\\multicolumn{{{len(columns) + 1}}}{{r}}{{\\small 续下页}} \\\\")
+        self.write(r"\endfoot")
+        self.write(r"\bottomrule")
+        self.write(r"\endlastfoot")
+
+    def table_row(self, name, cells):
+        self.write(f"{self.escape(name)} & " + " & ".join(map(self.escape, cells)) + r" \\")
+
+    def table_end(self):
+        self.write(r"\end{longtable}")
+        self.write("}")
+        self.write()
+
+    def end(self):
+        if not self.fragment:
+            self.write(r"\end{document}")
+
+
+class HtmlRenderer(Renderer):
+    STYLE = (
+        "body{font-family:sans-serif;max-width:960px;margin:2em auto;line-height:1.6}"
+        "table{border-collapse:collapse;margin:1em 0}"
+        "th,td{border:1px solid #ccc;padding:4px 8px;text-align:center}"
+        "td:first-child{text-align:left}caption{font-style:italic}"
+    )
+
+    def escape(self, text):
+        return html.escape(str(text))
+
+    def begin(self, title):
+        self.write("<!DOCTYPE html>")
+        self.write('<html lang="zh-CN">')
+        self.write(f'<head><meta charset="utf-8"><title>{self.escape(title)}</title>'
+                   f"<style>{self.STYLE}</style></head>")
+        self.write("<body>")
+        self.write(f"<h1>{self.escape(title)}</h1>")
 
-def generate_latex_table():
-    """生成LaTeX格式的表格"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
-    
-    latex = []
-    latex.append("\\begin{table}[h]")
-    latex.append("\\centering")
-    latex.append("\\caption{莎士比亚反派性格量化特征数据表}")
-    latex.append("\\label{tab:villain_features}")
-    latex.append("\\begin{tabular}{lcccccc}")
-    latex.append("\\toprule")
-    latex.append("角色 & 权力词汇 & 谎言词汇 & 野心词汇 & 平均句长 & 复杂句比例 & 指令句比例 \\\\")
-    latex.append(" & (每千词) & (每千词) & (每千词) & (字符) & (\\%) & (\\%) \\\\")
-    latex.append("\\midrule")
-    
-    for idx, row in df.iterrows():
-        char = row['character']
-        power = row['power_per_1000']
-        lie = row['lie_per_1000']
-        ambition = row['ambition_per_1000']
-        sentence_len = row['avg_sentence_length']
-        complex_ratio = row['complex_ratio'] * 100
-        command_ratio = row['command_ratio'] * 100
-        
-        latex.append(f"{char} & {power:.2f} & {lie:.2f} & {ambition:.2f} & {sentence_len:.2f} & {complex_ratio:.2f} & {command_ratio:.2f} \\\\")
-    
-    latex.append("\\bottomrule")
-    latex.append("\\end{tabular}")
-    latex.append("\\end{table}")
-    
-    latex_text = "\n".join(latex)
-    output_path = OUTPUT_DIR / "latex_table.txt"
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(latex_text)
-    
-    print("✓ LaTeX表格已生成:", output_path)
-    return latex_text
-
-
-def generate_markdown_report():
-    """生成Markdown格式的报告"""
-    df = pd.read_csv(OUTPUT_DIR / "villain_features.csv", encoding="utf-8-sig")
-    
-    md = []
-    md.append("# 莎士比亚反派性格量化分析结果报告")
-    md.append("")
-    md.append("## 一、数据概览")
-    md.append("")
-    md.append(f"- **总台词数**: {df['total_utterances'].sum()} 条")
-    md.append(f"- **克劳狄斯**: {df[df['character']=='克劳狄斯']['total_utterances'].values[0]} 条")
-    md.append(f"- **麦克白**: {df[df['character']=='麦克白']['total_utterances'].values[0]} 条")
-    md.append(f"- **伊阿古**: {df[df['character']=='伊阿古']['total_utterances'].values[0]} 条")
-    md.append("")
-    
-    md.append("## 二、量化特征数据表")
-    md.append("")
-    md.append("| 角色 | 权力词汇<br>(每千词) | 谎言词汇<br>(每千词) | 野心词汇<br>(每千词) | 平均句长<br>(字符) | 复杂句比例<br>(%) | 指令句比例<br>(%) |")
-    md.append("|------|:---:|:---:|:---:|:---:|:---:|:---:|")
-    
-    for idx, row in df.iterrows():
-        char = row['character']
-        power = row['power_per_1000']
-        lie = row['lie_per_1000']
-        ambition = row['ambition_per_1000']
-        sentence_len = row['avg_sentence_length']
-        complex_ratio = row['complex_ratio'] * 100
-        command_ratio = row['command_ratio'] * 100
-        
-        md.append(f"| {char} | {power:.2f} | {lie:.2f} | {ambition:.2f} | {sentence_len:.2f} | {complex_ratio:.2f} | {command_ratio:.2f} |")
-    
-    md.append("")
-    md.append("## 三、主要发现")
-    md.append("")
-    
-    # 找出各维度的最高值
-    power_max = df.loc[df['power_per_1000'].idxmax()]
-    ambition_max = df.loc[df['ambition_per_1000'].idxmax()]
-    command_max = df.loc[df['command_ratio'].idxmax()]
-    
-    md.append(f"1. **权力词汇**: {power_max['character']}最高（{power_max['power_per_1000']:.2f}/千词）")
-    md.append(f"2. **野心词汇**: {ambition_max['character']}最高（{ambition_max['ambition_per_1000']:.2f}/千词）")
-    md.append(f"3. **指令句比例**: {command_max['character']}最高（{command_max['command_ratio']*100:.2f}%）")
-    md.append("")
-    
-    md.append("## 四、可视化图表")
-    md.append("")
-    md.append("- `radar_chart.png`: 雷达图展示多维度性格差异")
-    md.append("- `bar_charts.png`: 柱状图展示单项指标对比")
-    md.append("- `correlation_heatmap.png`: 相关性热力图")
-    md.append("- `comprehensive_comparison.png`: 综合对比图")
-    md.append("")
-    
-    md_text = "\n".join(md)
-    output_path = OUTPUT_DIR / "analysis_report.md"
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(md_text)
-    
-    print("✓ Markdown报告已生成:", output_path)
-    return md_text
-
-
-def main():
+    def heading(self, text, level=2):
+        self.write(f"<h{level}>{self.escape(text)}</h{level}>")
+
+    def paragraph(self, text):
+        self.write(f"<p>{self.escape(text)}</p>")
+
+    def bullets(self, items, ordered=False):
+        tag = "ol" if ordered else "ul"
+        self.write(f"<{tag}>")
+        for term, text in items:
+            term = f"<strong>{self.escape(term)}</strong>: " if term else ""
+            self.write(f"<li>{term}{self.escape(text)}</li>")
+        self.write(f"</{tag}>")
+
+    def table_page(self, columns, caption, page):
+        if page > 1:
+            self.write("</tbody></table>")
+            caption = f"{caption}（续，第 {page} 页）"
+        self.write(f"<table><caption>{self.escape(caption)}</caption><thead><tr><th>角色</th>")
+        self.write("".join(f"<th>{self.escape(c.label)}<br>({self.escape(c.unit)})</th>" for c in columns))
+        self.write("</tr></thead><tbody>")
+
+    def table_row(self, name, cells):
+        self.write(f"<tr><td>{self.escape(name)}</td>" + "".join(f"<td>{c}</td>" for c in cells) + "</tr>")
+
+    def table_end(self):
+        self.write("</tbody></table>")
+
+    def end(self):
+        self.write("</body>")
+        self.write("</html>")
+
+
+# 格式 -> (输出文件名, 渲染器)
+FORMATS = {
+    "md": ("analysis_report.md", MarkdownRenderer),
+    "tex": ("analysis_report.tex", LatexRenderer),
+    "html": ("analysis_report.html", HtmlRenderer),
+    "latex_table": ("latex_table.txt", lambda path, page_size: LatexRenderer(path, page_size, fragment=True)),
+}
+
+
+class ReportWriter:
+    """把每个报告片段依次分发给所有渲染器；表格逐行写入，分页由 page_size 控制"""
+
+    def __init__(self, renderers, page_size=50):
+        self.renderers = renderers
+        self.page_size = page_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for r in self.renderers:
+            r.close()
+
+    def _each(self, method, *args, **kwargs):
+        for r in self.renderers:
+            getattr(r, method)(*args, **kwargs)
+
+    def begin(self, title):
+        self._each("begin", title)
+
+    def heading(self, text, level=2):
+        self._each("heading", text, level)
+
+    def paragraph(self, text):
+        self._each("paragraph", text)
+
+    def bullets(self, items, ordered=False):
+        self._each("bullets", list(items), ordered)
+
+    def table(self, df, columns, caption):
+        """逐行格式化（每个单元格只格式化一次）并写入所有渲染器"""
+        self._each("table_begin", columns, caption)
+        values = df[[c.key for c in columns]].itertuples(index=False, name=None)
+        for i, (name, row) in enumerate(zip(df["character"], values)):
+            if i % self.page_size == 0:
+                self._each("table_page", columns, caption, i // self.page_size + 1)
+            cells = [c.format(v) for c, v in zip(columns, row)]
+            self._each("table_row", name, cells)
+        self._each("table_end")
+
+    def end(self):
+        self._each("end")
+
+
+# ---------------------------------------------------------------- 报告内容
+
+def overview_items(df, limit=20):
+    """数据概览：总台词数、角色数，台词最多的前 limit 个角色"""
+    counts = df.set_index("character")["total_utterances"]
+    yield "总台词数", f"{counts.sum()} 条"
+    yield "角色数", f"{len(counts)} 个"
+    for character, n in counts.nlargest(limit).items():
+        yield character, f"{n} 条"
+    if len(counts) > limit:
+        yield "", f"其余 {len(counts) - limit} 个角色共 {counts.nsmallest(len(counts) - limit).sum()} 条"
+
+
+def finding_items(df, columns):
+    """主要发现：每个指标最突出的角色（情感倾向取最低，即最负面）"""
+    for column in columns:
+        values = df[column.key].dropna()
+        if values.empty:
+            continue
+        idx = values.idxmax() if column.direction > 0 else values.idxmin()
+        extreme = "最高" if column.direction > 0 else "最低"
+        yield column.label, f"{df.at[idx, 'character']}{extreme}（{column.format(values[idx])}{column.suffix}）"
+
+
+def load_evidence(output_dir, characters):
+    """各角色的关键词证据（与 extract_evidence.py 同一套排序规则）；缺少台词表时返回 None"""
+    from extract_evidence import (EVIDENCE_SECTIONS, collect_evidence,
+                                  collect_evidence_indexed, open_line_index)
+    from keyword_config import get_keywords
+
+    csv_path = Path(output_dir) / "villain_lines.csv"
+    if not csv_path.exists() or not characters:
+        return None
+    keyword_groups = get_keywords().groups
+    groups = {g: keyword_groups[g] for g, _ in EVIDENCE_SECTIONS if g in keyword_groups}
+    index = open_line_index(csv_path)
+    if index is not None:
+        try:
+            return collect_evidence_indexed(index, characters, groups, max_examples=2)
+        finally:
+            index.close()
+    df = pd.read_csv(csv_path, encoding="utf-8-sig", dtype={"doc_id": str})
+    return collect_evidence(df[df["character"].isin(characters)], characters, groups, max_examples=2)
+
+
+def write_evidence(writer, df, evidence, source=None):
+    from extract_evidence import EVIDENCE_SECTIONS, render_example
+
+    rows = df.set_index("character")
+    for character, groups in evidence.items():
+        writer.heading(character, 3)
+        items = []
+        for group, title in EVIDENCE_SECTIONS:
+            column = f"{group}_per_1000"
+            if column not in rows.columns or not rows.at[character, column] > 0:
+                continue
+            examples = groups.get(group, [])
+            if not examples:
+                items.append((title, f"{rows.at[character, column]:.2f}/千词，未找到直接关键词"))
+            for ex in examples:
+                items.append((title, f"{render_example(ex, source)}（{ex['play']} 第{ex['act']}幕）"))
+        if items:
+            writer.bullets(items)
+        else:
+            writer.paragraph("（无关键词证据）")
+
+
+def generate_reports(output_dir=OUTPUT_DIR, formats=tuple(FORMATS), features=None,
+                     page_size=50, overview_limit=20, evidence_limit=20):
+    """
+    一次生成所有格式的报告
+    features: 已在内存中的特征表（默认读取 villain_features.csv）
+    evidence_limit: 只为台词最多的前若干个角色列出文本证据（0 表示不列）
+    返回 {格式: 输出路径}
+    """
+    output_dir = Path(output_dir)
+    df = features if features is not None else pd.read_csv(
+        output_dir / "villain_features.csv", encoding="utf-8-sig")
+    df = df.reset_index(drop=True)
+    columns = report_columns(df)
+    top = df.nlargest(evidence_limit, "total_utterances")["character"].tolist() if evidence_limit else []
+    evidence = load_evidence(output_dir, top)
+
+    paths = {fmt: output_dir / FORMATS[fmt][0] for fmt in formats}
+    renderers = [FORMATS[fmt][1](path, page_size) for fmt, path in paths.items()]
+    with ReportWriter(renderers, page_size) as writer:
+        writer.begin(TITLE)
+        sections = iter("一二三四五六")
+        writer.heading(f"{next(sections)}、数据概览")
+        writer.bullets(overview_items(df, overview_limit))
+
+        writer.heading(f"{next(sections)}、量化特征数据表")
+        writer.table(df, columns, TABLE_CAPTION)
+
+        writer.heading(f"{next(sections)}、主要发现")
+        writer.bullets(finding_items(df, columns), ordered=True)
+
+        if evidence:
+            writer.heading(f"{next(sections)}、文本证据")
+            if len(df) > len(evidence):
+                writer.paragraph(f"以下为台词最多的 {len(evidence)} 个角色的关键词台词示例，完整证据见 evidence_report.txt。")
+            with RawTextSource(output_dir) as source:
+                write_evidence(writer, df, evidence, source)
+
+        figures = [(f, desc) for f, desc in FIGURES if (output_dir / f).exists()]
+        if figures:
+            writer.heading(f"{next(sections)}、可视化图表")
+            writer.bullets(figures)
+        writer.end()
+
+    for fmt, path in paths.items():
+        print(f"✓ 报告已生成（{fmt}）:", path)
+    return paths
+
+
+def generate_latex_table(output_dir=OUTPUT_DIR):
+    """只生成LaTeX表格片段"""
+    return generate_reports(output_dir, formats=("latex_table",), evidence_limit=0)["latex_table"]
+
+
+def generate_markdown_report(output_dir=OUTPUT_DIR):
+    """只生成Markdown报告"""
+    return generate_reports(output_dir, formats=("md",))["md"]
+
+
+@timed("report")
+def main(output_dir=OUTPUT_DIR, formats=tuple(FORMATS), page_size=50, evidence_limit=20):
     print("正在生成论文用报告...")
-    
-    # LaTeX表格
-    generate_latex_table()
-    
-    # Markdown报告
-    generate_markdown_report()
-    
+    generate_reports(output_dir, formats, page_size=page_size, evidence_limit=evidence_limit)
     print("\n✓ 报告生成完成！")
 
 
 if __name__ == "__main__":
-    main()
-
+    parser = argparse.ArgumentParser(description="生成 Markdown / LaTeX / HTML 格式的分析报告")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS), help="输出格式")
+    parser.add_argument("--page-size", type=int, default=50, help="表格每页行数")
+    parser.add_argument("--evidence-limit", type=int, default=20, help="列出文本证据的角色数（按台词数排序）")
+    args = parser.parse_args()
+    main(formats=args.formats, page_size=args.page_size, evidence_limit=args.evidence_limit)
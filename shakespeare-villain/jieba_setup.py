@@ -0,0 +1,88 @@
+"""
+jieba 初始化管理：
+1. 前缀词典缓存固定保存在 output/jieba_cache/，后续运行直接加载
+2. 关键词表、同义词表和角色名作为领域词直接加入进程内的 jieba 词典（不经过共享的用户词典文件，
+   多个进程同时初始化时互不影响），避免"野心勃勃"、"指挥权"、角色名被切碎
+3. reset_jieba() 把词典恢复到只有默认前缀词典的状态（批处理中每个任务开始时调用，
+   分词结果不受同一进程中先前任务的领域词影响）
+"""
+import os
+import time
+import jieba
+
+from keyword_config import get_keywords
+from metrics import cache_lookup
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+DEFAULT_CACHE_DIR = os.path.join(OUTPUT_DIR, "jieba_cache")
+
+# 已加入 jieba 的领域词（同一进程内多次调用时只补充新词）
+_loaded_words = set()
+# 加入领域词之前的默认前缀词典 (FREQ, total)，供 reset_jieba 恢复
+_base_dict = None
+
+
+def collect_domain_words(synonyms: dict = None, speaker_names=()) -> set:
+    """收集需要整体切分的领域词：关键词分组、同义词表两侧、角色名"""
+    words = set()
+    for keywords in get_keywords().groups.values():
+        words.update(keywords)
+    if synonyms:
+        words.update(synonyms.keys())
+        words.update(synonyms.values())
+    words.update(str(name).strip() for name in speaker_names)
+    # 单字交给 jieba 默认词典处理
+    return {w for w in words if len(w) >= 2}
+
+
+def add_domain_words(words):
+    """
+    把领域词加入 jieba 词典
+    词频取 jieba 建议值（先对全部词计算，再统一加入，结果与加入顺序无关），保证该词能被整体切出
+    """
+    freqs = {word: jieba.suggest_freq(word, tune=False) for word in sorted(words)}
+    for word, freq in freqs.items():
+        jieba.add_word(word, freq)
+
+
+def init_jieba(synonyms: dict = None, speaker_names=(), cache_dir: str = DEFAULT_CACHE_DIR) -> dict:
+    """
+    初始化 jieba：使用持久化的前缀词典缓存，并加入领域词
+    返回初始化信息（耗时、缓存是否命中、新增领域词数）
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    cache_hit = jieba.dt.initialized
+    if not jieba.dt.initialized:
+        jieba.dt.tmp_dir = cache_dir
+        jieba.dt.cache_file = "jieba.cache"
+        cache_hit = os.path.exists(os.path.join(cache_dir, jieba.dt.cache_file))
+        jieba.initialize()
+    cache_lookup("jieba", cache_hit)
+    global _base_dict
+    if _base_dict is None and not _loaded_words:
+        _base_dict = (dict(jieba.dt.FREQ), jieba.dt.total)
+
+    new_words = collect_domain_words(synonyms, speaker_names) - _loaded_words
+    if new_words:
+        add_domain_words(new_words)
+        _loaded_words.update(new_words)
+
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "cache_hit": cache_hit,
+        "new_words": len(new_words),
+    }
+
+
+def reset_jieba():
+    """去掉已加入的全部领域词，恢复默认前缀词典（内存中复制，不重新读取缓存文件）"""
+    if _base_dict is None:
+        return
+    freq, total = _base_dict
+    jieba.dt.FREQ = dict(freq)
+    jieba.dt.total = total
+    jieba.dt.user_word_tag_tab.clear()
+    _loaded_words.clear()
@@ -0,0 +1,261 @@
+"""
+关键词配置层：把 config.py 中的关键词表编译为正则，并支持从外部文件热加载
+
+外部文件（可选）：data/keywords.json 或 data/keywords.yaml，格式
+    {
+        "keyword_groups": {"power": [...], ...},
+        "command_cues": [...],
+        "complex_clause_markers": [...]
+    }
+文件中缺少的部分沿用 config.py 的默认值；keyword_groups 按分组合并到默认分组上
+（文件中的分组替换同名默认分组，未列出的默认分组保留，值为 null 的分组被删除）。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+
+import config
+from normalize import to_simplified
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+DEFAULT_CONFIG_PATHS = [
+    os.path.join(DATA_DIR, "keywords.json"),
+    os.path.join(DATA_DIR, "keywords.yaml"),
+    os.path.join(DATA_DIR, "keywords.yml"),
+]
+
+# 行首即为指令的动词（原 is_command_sentence 中的 startswith 判断）
+COMMAND_PREFIXES = ["去", "给", "把", "让", "叫"]
+
+
+def _digest(value) -> str:
+    """配置片段的内容哈希（与顺序无关的部分已先排序）"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def alternation(words) -> str:
+    """多个词编译为一个交替正则（长词在前，如"野心勃勃"先于"野心"）"""
+    unique = sorted(set(words), key=lambda w: (-len(w), w))
+    return "|".join(re.escape(w) for w in unique)
+
+
+def load_keyword_file(path: str) -> dict:
+    """读取 JSON / YAML 关键词配置文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if not HAS_YAML:
+                raise ImportError("读取 YAML 配置需要安装 PyYAML: pip install pyyaml")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+# 读取 / 校验配置文件时可能出现的错误（热加载时只告警，保留上一次的配置）
+CONFIG_ERRORS = (OSError, ValueError) + ((yaml.YAMLError,) if HAS_YAML else ())
+
+
+def _word_list(value, where: str):
+    """校验关键词列表：必须是字符串组成的列表（单个字符串会被逐字拆开，视为错误）"""
+    if not isinstance(value, (list, tuple)) or not all(isinstance(w, str) for w in value):
+        raise ValueError(f"{where} 应为字符串列表，实际为 {value!r}")
+    return value
+
+
+class CompiledKeywords:
+    """
+    编译后的关键词配置（只读）
+    - groups: 分组名 -> 关键词元组
+    - group_sets: 分组名 -> frozenset，用于词频表查找
+    - group_patterns: 分组名 -> 交替正则，用于原文检索
+    - command_pattern / complex_pattern: 指令句、复杂句判断
+    - section_hashes: 每个配置片段的哈希，version 为整体哈希
+    """
+
+    def __init__(self, keyword_groups: dict, command_cues, complex_clause_markers):
+        # 外部配置可能用繁体字书写，与规范化后的文本保持一致
+        self.groups = {name: tuple(map(to_simplified, words)) for name, words in keyword_groups.items()}
+        self.group_sets = {name: frozenset(words) for name, words in self.groups.items()}
+        self.group_patterns = {
+            name: re.compile(alternation(words)) for name, words in self.groups.items() if words
+        }
+        self.command_cues = tuple(map(to_simplified, command_cues))
+        self.complex_clause_markers = tuple(map(to_simplified, complex_clause_markers))
+
+        command_parts = [rf"^\s*(?:{alternation(COMMAND_PREFIXES)})"]
+        if self.command_cues:
+            command_parts.append(alternation(self.command_cues))
+        self.command_pattern = re.compile("|".join(command_parts))
+        # 空列表时使用永不匹配的正则
+        self.complex_pattern = re.compile(alternation(self.complex_clause_markers) or r"(?!x)x")
+
+        self.section_hashes = {f"group:{name}": _digest(sorted(words)) for name, words in self.groups.items()}
+        self.section_hashes["command_cues"] = _digest(sorted(self.command_cues))
+        self.section_hashes["complex_clause_markers"] = _digest(sorted(self.complex_clause_markers))
+        self.version = _digest(self.section_hashes)
+
+    @classmethod
+    def from_mapping(cls, data: dict):
+        """
+        从配置字典构建，缺失的部分使用 config.py 默认值；keyword_groups 逐组覆盖默认分组
+        格式不对（如分组写成字符串而不是列表）时抛出 ValueError
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"关键词配置应为字典，实际为 {type(data).__name__}")
+        overrides = data.get("keyword_groups") or {}
+        if not isinstance(overrides, dict):
+            raise ValueError("keyword_groups 应为 分组名 -> 关键词列表 的字典")
+        groups = dict(config.KEYWORD_GROUPS)
+        for name, words in overrides.items():
+            if words is None:
+                groups.pop(name, None)
+            else:
+                groups[name] = _word_list(words, f"keyword_groups.{name}")
+        return cls(
+            groups,
+            _word_list(data.get("command_cues", config.COMMAND_CUES), "command_cues"),
+            _word_list(data.get("complex_clause_markers", config.COMPLEX_CLAUSE_MARKERS),
+                       "complex_clause_markers"),
+        )
+
+
+def default_config_path() -> str:
+    """data/ 下第一个存在的关键词配置文件；都不存在时为 data/keywords.json"""
+    return next((p for p in DEFAULT_CONFIG_PATHS if os.path.exists(p)), DEFAULT_CONFIG_PATHS[0])
+
+
+class KeywordConfig:
+    """
+    可热加载的关键词配置
+    - compiled: 当前编译结果；距上次检查超过 check_interval 秒时检查文件 mtime
+    - register_cache(sections, clear): 登记依赖某些配置片段的缓存，
+      重新加载时只清理依赖于已变化片段的缓存
+    """
+
+    def __init__(self, path: str = None, check_interval: float = 1.0):
+        self.path = path or default_config_path()
+        self.check_interval = check_interval
+        self._mtime = None
+        self._last_check = 0.0
+        self._compiled = None
+        self._failed_mtime = None  # 上次加载失败的文件版本（同一版本只告警一次）
+        self._caches = []
+        self.reload()
+
+    def use(self, path: str = None) -> set:
+        """
+        切换到另一个配置文件（None 为默认文件），返回发生变化的配置片段；已登记的缓存照常按片段清理
+        指定的文件不存在、无法读取或格式不对时抛出异常，并保持原来的文件与配置
+        """
+        if path is not None and not os.path.exists(path):
+            raise FileNotFoundError(f"关键词配置文件不存在: {path}")
+        previous_path = self.path
+        self.path = path or default_config_path()
+        try:
+            return self.reload(strict=True)
+        except CONFIG_ERRORS:
+            self.path = previous_path
+            raise
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self, strict: bool = False) -> set:
+        """
+        重新读取配置文件，返回发生变化的配置片段
+        文件写了一半或格式不对时：strict 为 True 则抛出异常；否则打印警告并保留当前配置
+        （首次加载则用默认值），mtime 不更新，下次检查时重试
+        """
+        mtime = self._file_mtime()
+        try:
+            data = load_keyword_file(self.path) if mtime is not None else {}
+            compiled = CompiledKeywords.from_mapping(data)
+        except CONFIG_ERRORS as e:
+            if strict:
+                raise
+            if mtime != self._failed_mtime:
+                print(f"  警告: 关键词配置 {self.path} 无法加载（{e}），沿用{'当前' if self._compiled else '默认'}配置")
+            self._failed_mtime = mtime
+            self._last_check = time.monotonic()
+            if self._compiled is None:
+                self._compiled = CompiledKeywords.from_mapping({})
+            return set()
+
+        previous = self._compiled
+        self._compiled = compiled
+        self._mtime = mtime
+        self._last_check = time.monotonic()
+        if previous is None:
+            return set()
+
+        sections = set(previous.section_hashes) | set(compiled.section_hashes)
+        changed = {
+            s for s in sections
+            if previous.section_hashes.get(s) != compiled.section_hashes.get(s)
+        }
+        if changed:
+            self._invalidate(changed)
+        return changed
+
+    def _invalidate(self, changed: set):
+        for sections, clear in self._caches:
+            if sections is None or sections & changed:
+                clear()
+
+    def register_cache(self, sections, clear):
+        """
+        登记缓存清理函数
+        sections 为依赖的配置片段名（如 "command_cues"、"group:power"），None 表示依赖全部
+        """
+        self._caches.append((None if sections is None else set(sections), clear))
+
+    def check(self) -> set:
+        """文件有更新时重新加载，返回变化的配置片段"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return set()
+        self._last_check = now
+        if self._file_mtime() != self._mtime:
+            return self.reload()
+        return set()
+
+    @property
+    def compiled(self) -> CompiledKeywords:
+        self.check()
+        return self._compiled
+
+    @property
+    def version(self) -> str:
+        return self.compiled.version
+
+
+_default_config = None
+
+
+def get_keyword_config() -> KeywordConfig:
+    """进程内共享的关键词配置"""
+    global _default_config
+    if _default_config is None:
+        _default_config = KeywordConfig()
+    return _default_config
+
+
+def get_keywords() -> CompiledKeywords:
+    """当前生效的编译后关键词（会按需热加载）"""
+    return get_keyword_config().compiled
+
+
+def use_keyword_file(path: str = None) -> set:
+    """进程内共享的关键词配置切换到 path（批处理中每个任务使用各自的关键词表）"""
+    return get_keyword_config().use(path)
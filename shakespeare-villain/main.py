@@ -1,17 +1,31 @@
 """
 主分析脚本：从CSV数据计算三维指标（词频-句法-互动）
 """
+import argparse
 import os
 import json
 from collections import Counter
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 import jieba
-from config import VILLAINS, KEYWORD_GROUPS, COMMAND_CUES, COMPLEX_CLAUSE_MARKERS
+from config import VILLAINS
+from keyword_config import get_keyword_config, get_keywords
+from jieba_setup import init_jieba
+from vocab import expand_keywords, get_pipeline
+from segmenter import SentenceSpans, clear_source, mark_source
+from checkpoint import CheckpointStore, fingerprint
+from metrics import LINES, TOKENS, cache_lookup, timed
+from sketches import VocabularySketch
+from sentiment import emotion_columns, get_lexicon
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+# 分块计算的每块台词数（检查点粒度，也决定内存峰值）
+CHUNK_SIZE = 2000
+# 近似模式的默认误差上界：(词频相对误差 epsilon, 超出误差的概率 delta, 词表大小相对误差)
+SKETCH_ERROR = (1e-4, 1e-3, 0.01)
 
 
 def load_stopwords(path: str) -> set:
@@ -66,68 +80,114 @@ def normalize_token(token: str, synonyms: dict) -> str:
     return synonyms.get(token, token)
 
 
+def tokenize_ids(text: str, stopwords: set, synonyms: dict) -> np.ndarray:
+    """分词并过滤停用词、单字，返回归并前的词ID数组（见 vocab.py）"""
+    return get_pipeline(stopwords, synonyms).encode(jieba.lcut(text))
+
+
 def tokenize_text(text: str, stopwords: set, synonyms: dict):
-    """分词并处理"""
-    tokens = jieba.lcut(text)
-    processed = []
-    for tok in tokens:
-        tok = tok.strip()
-        if not tok or len(tok) < 2:  # 过滤单字
-            continue
-        if tok in stopwords:
-            continue
-        tok = normalize_token(tok, synonyms)
-        processed.append(tok)
-    return processed
+    """分词并处理（过滤停用词、单字，同义词归并）"""
+    pipeline = get_pipeline(stopwords, synonyms)
+    ids = pipeline.encode(jieba.lcut(text))
+    return pipeline.vocab.decode(pipeline.folded(ids))
+
+
+@lru_cache(maxsize=65536)
+def _match_command(text: str) -> bool:
+    return get_keywords().command_pattern.search(text) is not None
+
+
+@lru_cache(maxsize=65536)
+def _match_complex(text: str) -> bool:
+    return get_keywords().complex_pattern.search(text) is not None
 
 
 def is_command_sentence(text: str) -> bool:
-    """判断是否为指令句"""
-    for cue in COMMAND_CUES:
-        if cue in text:
-            return True
-    stripped = text.strip()
-    if stripped.startswith(("去", "给", "把", "让", "叫")):
-        return True
-    return False
+    """判断是否为指令句（含指令词，或以"去/给/把/让/叫"开头）"""
+    # 热加载检查放在缓存之外，命中缓存时也能发现配置文件的更新（check 按间隔节流）
+    get_keyword_config().check()
+    return _match_command(text)
 
 
 def is_complex_sentence(text: str) -> bool:
     """判断是否为复杂句"""
-    return any(marker in text for marker in COMPLEX_CLAUSE_MARKERS)
+    get_keyword_config().check()
+    return _match_complex(text)
 
 
-def compute_features_for_group(df_group: pd.DataFrame,
-                               stopwords: set,
-                               synonyms: dict) -> dict:
+# 关键词配置热加载时，只清理依赖于变化部分的缓存
+get_keyword_config().register_cache({"command_cues"}, _match_command.cache_clear)
+get_keyword_config().register_cache({"complex_clause_markers"}, _match_complex.cache_clear)
+
+
+def keyword_vocabulary(synonyms: dict) -> set:
+    """所有关键词分组展开后的（归并前）词，近似模式下只为这些词保留精确计数"""
+    words = set()
+    for keywords in get_keywords().groups.values():
+        words |= expand_keywords(keywords, synonyms)
+    return words
+
+
+def approximate_token_counts(tokens, stopwords: set, synonyms: dict, sketch_error) -> dict:
+    """
+    近似模式的词频统计：内存与语料中不同词的个数无关
+    - 过滤规则与 tokenize_ids 相同（停用词、单字），但不进入进程内词表
+    - 关键词分组中的词精确计数，其余词只进入 VocabularySketch（词频 CountMinSketch + 词表大小 HyperLogLog）
+    """
+    tokens = [t for t in tokens if len(t.strip()) >= 2 and t.strip() not in stopwords]
+    keywords = keyword_vocabulary(synonyms)
+    sketch = VocabularySketch(sketch_error)
+    sketch.add_tokens(tokens)
+    return {
+        "token_count": len(tokens),
+        "token_counts": dict(Counter(t for t in tokens if t in keywords)),
+        "sketch": sketch.to_dict(),
+    }
+
+
+def map_features(df_group: pd.DataFrame,
+                 stopwords: set,
+                 synonyms: dict,
+                 spans: SentenceSpans = None,
+                 sketch_error=None) -> dict:
     """
-    针对某个角色的全部台词，计算三类指标
+    map 步骤：某个角色一部分台词的可合并部分统计（只含计数，可 JSON 序列化）
+    同一角色分散在多个分片/文档中的台词，各自 map 后用 merge_partials 相加，
+    再由 finalize_features 得到与整体计算相同的指标
+    spans: 预先算好的分句区间（line_id 为 df_group 的索引）；不传则现场分句
+    sketch_error: None 为精确模式；(epsilon, delta, 词表大小误差) 为近似模式（见 approximate_token_counts）
     """
     all_text = "。".join(df_group["text"].astype(str).tolist())
     
-    tokens = tokenize_text(all_text, stopwords, synonyms)
-    total_tokens = len(tokens) if tokens else 1
+    tokens = jieba.lcut(all_text)
+    lexicon = get_lexicon()
     
-    # --- 1. 词频维度 ---
-    token_counter = Counter(tokens)
-    keyword_stats = {}
-    for group_name, keywords in KEYWORD_GROUPS.items():
-        raw_count = sum(token_counter.get(k, 0) for k in keywords)
-        per_1000 = raw_count / total_tokens * 1000 if total_tokens > 0 else 0
-        keyword_stats[group_name] = {
-            "count": int(raw_count),
-            "per_1000": round(per_1000, 2)
+    # --- 1. 词频维度：归并前词频；情感维度：情感词典各维度命中数（见 sentiment.py） ---
+    if sketch_error is not None:
+        counts = approximate_token_counts(tokens, stopwords, synonyms, sketch_error)
+        emotion_scores = lexicon.score_tokens(tokens) if lexicon is not None else None
+    else:
+        pipeline = get_pipeline(stopwords, synonyms)
+        raw_ids = pipeline.vocab.encode(tokens)
+        token_ids = pipeline.filter(raw_ids)
+        id_counts = np.bincount(token_ids, minlength=len(pipeline.vocab))
+        nonzero = np.flatnonzero(id_counts)
+        counts = {
+            "token_count": int(len(token_ids)),
+            "token_counts": dict(zip(pipeline.vocab.decode(nonzero), id_counts[nonzero].tolist())),
         }
+        emotion_scores = lexicon.score_ids(pipeline.vocab, raw_ids)[0] if lexicon is not None else None
+    if emotion_scores is not None:
+        counts["emotion_counts"] = dict(zip(lexicon.dimensions, emotion_scores.tolist()))
     
     # --- 2. 句法维度（简化版） ---
-    sentences = [s for s in all_text.replace("？", "。").replace("！", "。").split("。") if s.strip()]
-    sentence_lengths = [len(s) for s in sentences] if sentences else [0]
-    avg_sentence_length = float(np.mean(sentence_lengths)) if sentence_lengths else 0.0
-    complex_sentences = [s for s in sentences if is_complex_sentence(s)]
-    complex_ratio = len(complex_sentences) / len(sentences) if sentences else 0.0
+    texts = df_group["text"].astype(str)
+    if spans is None:
+        spans = SentenceSpans.from_series(texts)
+    else:
+        spans = spans.subset(df_group.index)
     
     # --- 3. 互动维度 ---
-    total_utterances = len(df_group)
     command_count = 0
     interrupt_count = 0
     
@@ -138,7 +198,67 @@ def compute_features_for_group(df_group: pd.DataFrame,
         if "is_interrupt" in row and pd.notna(row["is_interrupt"]) and int(row["is_interrupt"]) == 1:
             interrupt_count += 1
     
-    command_ratio = command_count / total_utterances if total_utterances > 0 else 0.0
+    return {
+        **counts,
+        "sentence_count": len(spans),
+        "sentence_chars": int(spans.lengths.sum()),
+        "complex_count": spans.count_matching(texts, get_keywords().complex_pattern),
+        "utterance_count": len(df_group),
+        "command_count": command_count,
+        "interrupt_count": interrupt_count,
+    }
+
+
+def merge_partials(partials) -> dict:
+    """reduce 步骤：相加多个 map_features 的结果"""
+    merged = {"token_counts": Counter()}
+    sketch = None
+    for partial in partials:
+        for key, value in partial.items():
+            if key in ("token_counts", "emotion_counts"):
+                merged.setdefault(key, Counter()).update(value)
+            elif key == "sketch":
+                other = VocabularySketch.from_dict(value)
+                sketch = other if sketch is None else sketch.merge(other)
+            else:
+                merged[key] = merged.get(key, 0) + value
+    merged["token_counts"] = dict(merged["token_counts"])
+    if "emotion_counts" in merged:
+        merged["emotion_counts"] = dict(merged["emotion_counts"])
+    if sketch is not None:
+        merged["sketch"] = sketch.to_dict()
+    return merged
+
+
+def finalize_features(partial: dict, synonyms: dict) -> dict:
+    """由（合并后的）部分统计计算三类指标，返回值与 compute_features_for_group 相同"""
+    total_tokens = partial["token_count"] or 1
+    token_counter = Counter(partial["token_counts"])
+    # 近似模式下 token_counter 只含关键词，词表大小来自 HyperLogLog 估计
+    sketch = VocabularySketch.from_dict(partial["sketch"]) if "sketch" in partial else None
+    vocabulary_size = sketch.vocabulary_size() if sketch is not None else len(token_counter)
+    
+    # 关键词按 KEYWORD_MATCH_STAGE 展开到归并前的词后求和（见 vocab.py）
+    keyword_stats = {}
+    for group_name, keywords in get_keywords().groups.items():
+        raw_count = sum(token_counter[w] for w in expand_keywords(keywords, synonyms))
+        per_1000 = raw_count / total_tokens * 1000 if total_tokens > 0 else 0
+        keyword_stats[group_name] = {
+            "count": int(raw_count),
+            "per_1000": round(per_1000, 2)
+        }
+    
+    # 情感倾向与每千词情绪频次（分母与关键词相同）
+    lexicon = get_lexicon()
+    emotion_stats = {}
+    if lexicon is not None and "emotion_counts" in partial:
+        emotion_stats = emotion_columns(partial["emotion_counts"], partial["token_count"], lexicon)
+    
+    sentences = partial["sentence_count"]
+    avg_sentence_length = partial["sentence_chars"] / sentences if sentences else 0.0
+    complex_ratio = partial["complex_count"] / sentences if sentences else 0.0
+    total_utterances = partial["utterance_count"]
+    command_ratio = partial["command_count"] / total_utterances if total_utterances > 0 else 0.0
     
     return {
         "total_tokens": total_tokens,
@@ -146,26 +266,73 @@ def compute_features_for_group(df_group: pd.DataFrame,
         "avg_sentence_length": round(avg_sentence_length, 2),
         "complex_ratio": round(complex_ratio, 4),
         "command_ratio": round(command_ratio, 4),
-        "interrupt_count": interrupt_count,
+        "interrupt_count": partial["interrupt_count"],
         "total_utterances": total_utterances,
+        "vocabulary_size": vocabulary_size,
+        "emotion_stats": emotion_stats,
+        "token_counter": token_counter,
+        "sketch": sketch,
     }
 
 
-def main():
+def compute_features_for_group(df_group: pd.DataFrame,
+                               stopwords: set,
+                               synonyms: dict,
+                               spans: SentenceSpans = None,
+                               sketch_error=None) -> dict:
+    """
+    针对某个角色的全部台词，计算三类指标（单个分片的 map + finalize）
+    spans: 预先算好的分句区间（line_id 为 df_group 的索引）；不传则现场分句
+    sketch_error: 近似模式的误差上界（见 map_features）
+    """
+    return finalize_features(map_features(df_group, stopwords, synonyms, spans, sketch_error), synonyms)
+
+
+def features_to_row(character: str, feats: dict) -> dict:
+    """把单个角色的指标整理成特征表的一行"""
+    row = {"character": character}
+    for group_name, stat in feats["keyword_stats"].items():
+        row[f"{group_name}_per_1000"] = stat["per_1000"]
+    row["avg_sentence_length"] = feats["avg_sentence_length"]
+    row["complex_ratio"] = feats["complex_ratio"]
+    row["command_ratio"] = feats["command_ratio"]
+    row["interrupt_count"] = feats["interrupt_count"]
+    row["total_utterances"] = feats["total_utterances"]
+    row.update(feats.get("emotion_stats", {}))
+    return row
+
+
+def save_token_counts(results: dict, path: str):
+    """
+    持久化每个角色的词频（同义词归并前的计数，关键词统计所用的同一份数据），
+    供 experiments.py 在不重新分词的情况下重算关键词密度
+    """
+    payload = {}
+    for character, feats in results.items():
+        payload[character] = {
+            "total_tokens": feats["total_tokens"],
+            "counts": dict(feats["token_counter"]),
+        }
+        # 近似模式：counts 只含关键词，其余词的频次由草图估计
+        if feats.get("sketch") is not None:
+            payload[character]["sketch"] = feats["sketch"].to_dict()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+
+
+@timed("features")
+def main(chunk_size: int = CHUNK_SIZE, output_dir: str = OUTPUT_DIR, villains=VILLAINS, sketch_error=None):
+    """
+    output_dir: 读取台词、写出特征的目录；villains: 参与计算的角色
+    sketch_error: None 为精确词频；(epsilon, delta, 词表大小误差) 为近似模式，只有关键词保留精确计数
+    """
     # 1. 读数据
-    csv_path = os.path.join(OUTPUT_DIR, "villain_lines.csv")
+    csv_path = os.path.join(output_dir, "villain_lines.csv")
     if not os.path.exists(csv_path):
         print(f"错误: 找不到数据文件 {csv_path}")
         print("请先运行 extract_pdf.py 提取台词数据")
         return
     
-    df = pd.read_csv(csv_path, encoding="utf-8-sig")
-    print(f"读取数据: {len(df)} 条记录")
-    
-    # 只保留目标反派
-    df = df[df["character"].isin(VILLAINS)].copy()
-    print(f"筛选后: {len(df)} 条反派台词")
-    
     # 2. 加载停用词 & 同义词映射
     stopwords_path = os.path.join(DATA_DIR, "stopwords.txt")
     synonyms_path = os.path.join(DATA_DIR, "synonyms.json")
@@ -179,38 +346,90 @@ def main():
             json.dump(synonyms, f, ensure_ascii=False, indent=2)
         print(f"已创建同义词表: {synonyms_path}")
     
-    # 3. 按角色分组计算指标
+    # 初始化分词：持久化词典缓存 + 领域词用户词典（关键词、同义词、角色名）
+    speaker_names = set(villains)
+    all_lines_path = os.path.join(output_dir, "all_lines.csv")
+    if os.path.exists(all_lines_path):
+        speaker_names.update(pd.read_csv(all_lines_path, encoding="utf-8-sig", usecols=["character"])["character"].unique())
+    jieba_info = init_jieba(synonyms, speaker_names)
+    print(f"分词初始化: {jieba_info['seconds']}s (词典缓存{'命中' if jieba_info['cache_hit'] else '未命中'}, "
+          f"领域词 {jieba_info['new_words']} 个)")
+    
+    # 3. 分块计算：每块台词的部分统计（见 map_features）提交到检查点，
+    # 中途失败后重新运行从上次提交的块继续；内存中只有一块台词和各角色的合并统计
+    stat = os.stat(csv_path)
+    store = CheckpointStore("features", fingerprint(
+        csv_path, stat.st_size, stat.st_mtime_ns, chunk_size, list(villains),
+        get_keywords().version, sorted(stopwords), synonyms, sketch_error,
+        get_lexicon().version if get_lexicon() is not None else None), root=os.path.join(output_dir, "checkpoints"))
+    store.prune_stale()
+    
+    # 分句结果逐块追加，句法指标与文本证据（extract_evidence.py）共用
+    spans_path = os.path.join(output_dir, "sentence_spans.csv")
+    clear_source(spans_path)
+    if os.path.exists(spans_path):
+        os.remove(spans_path)
+    
+    merged = {}
+    total_rows = villain_rows = sentence_count = resumed = 0
+    chunks = pd.read_csv(csv_path, encoding="utf-8-sig", chunksize=chunk_size)
+    for chunk_no, chunk in enumerate(chunks):
+        total_rows += len(chunk)
+        # 只保留目标反派
+        chunk = chunk[chunk["character"].isin(villains)]
+        villain_rows += len(chunk)
+        spans = SentenceSpans.from_series(chunk["text"])
+        spans.to_frame().to_csv(spans_path, mode="a", header=chunk_no == 0, index=False)
+        sentence_count += len(spans)
+        
+        key = f"chunk-{chunk_no:05d}"
+        partials = store.get(key)
+        cache_lookup("checkpoint", partials is not None)
+        if partials is None:
+            partials = {
+                villain: map_features(group_df, stopwords, synonyms, spans, sketch_error)
+                for villain, group_df in chunk.groupby("character", sort=False)
+            }
+            store.put(key, partials)
+        else:
+            resumed += 1
+        for villain, partial in partials.items():
+            merged[villain] = merge_partials([merged[villain], partial]) if villain in merged else partial
+    
+    print(f"读取数据: {total_rows} 条记录")
+    print(f"筛选后: {villain_rows} 条反派台词")
+    LINES.inc(villain_rows, stage="features")
+    if resumed:
+        print(f"从检查点恢复: {resumed} 块（每块 {chunk_size} 条）")
+    mark_source(spans_path, csv_path)
+    print(f"分句: {sentence_count} 句，已保存: {spans_path}")
+    
     results = {}
-    for villain in VILLAINS:
-        group_df = df[df["character"] == villain]
-        if group_df.empty:
+    for villain in villains:
+        if villain not in merged:
             print(f"警告: 未找到 {villain} 的台词")
             continue
         print(f"\n正在分析 {villain}...")
-        feats = compute_features_for_group(group_df, stopwords, synonyms)
+        feats = finalize_features(merged[villain], synonyms)
         results[villain] = feats
+        TOKENS.inc(merged[villain]["token_count"], stage="features")
         print(f"  总词数: {feats['total_tokens']}")
+        print(f"  词表大小: {feats['vocabulary_size']}{'（估计）' if feats['sketch'] is not None else ''}")
         print(f"  平均句长: {feats['avg_sentence_length']}")
         print(f"  复杂句比例: {feats['complex_ratio']:.2%}")
         print(f"  指令句比例: {feats['command_ratio']:.2%}")
     
     # 4. 汇总成表格
-    rows = []
-    for villain, feats in results.items():
-        row = {"character": villain}
-        for group_name, stat in feats["keyword_stats"].items():
-            row[f"{group_name}_per_1000"] = stat["per_1000"]
-        row["avg_sentence_length"] = feats["avg_sentence_length"]
-        row["complex_ratio"] = feats["complex_ratio"]
-        row["command_ratio"] = feats["command_ratio"]
-        row["interrupt_count"] = feats["interrupt_count"]
-        row["total_utterances"] = feats["total_utterances"]
-        rows.append(row)
+    rows = [features_to_row(villain, feats) for villain, feats in results.items()]
     
     result_df = pd.DataFrame(rows)
-    out_path = os.path.join(OUTPUT_DIR, "villain_features.csv")
+    out_path = os.path.join(output_dir, "villain_features.csv")
     result_df.to_csv(out_path, index=False, encoding="utf-8-sig")
     print(f"\n✓ 已保存角色特征数据表到: {out_path}")
+    counts_path = os.path.join(output_dir, "token_counts.json")
+    save_token_counts(results, counts_path)
+    print(f"✓ 已保存角色词频: {counts_path}")
+    store.clear()
     print("\n数据预览:")
     print(result_df.to_string())
     
@@ -218,5 +437,14 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="计算反派角色的三维量化指标")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="每块台词数")
+    parser.add_argument("--approximate", action="store_true",
+                        help="近似模式：词频用 CountMinSketch、词表大小用 HyperLogLog，只有关键词精确计数")
+    parser.add_argument("--epsilon", type=float, default=SKETCH_ERROR[0], help="近似模式的词频相对误差上界")
+    parser.add_argument("--delta", type=float, default=SKETCH_ERROR[1], help="近似模式超出词频误差上界的概率")
+    parser.add_argument("--cardinality-error", type=float, default=SKETCH_ERROR[2], help="近似模式的词表大小相对误差")
+    args = parser.parse_args()
+    main(args.chunk_size,
+         sketch_error=(args.epsilon, args.delta, args.cardinality_error) if args.approximate else None)
 
@@ -0,0 +1,309 @@
+"""
+分片 map-reduce：把大规模多版本语料分给多台机器处理
+- 分片清单（output/shards.json）：把文档划分为若干分片
+- map：逐文档提取台词，输出每个文档、每个反派的可合并部分统计和证据候选（output/shards/<分片ID>.json）
+- reduce：按文本哈希去重后合并全部分片，输出与 main.py 相同的 villain_features.csv 和 token_counts.json
+本地多进程执行器（run）是参考实现，也用来核对分片结果与整体计算是否一致
+
+用法：
+    python mapreduce.py plan --dir 语料目录 --shards 8
+    python mapreduce.py map --shard shard-0003      # 各台机器分别运行
+    python mapreduce.py reduce
+    python mapreduce.py run --dir 语料目录 --shards 8 --workers 4
+    python mapreduce.py run --dir 语料目录 --approximate    # 词频草图，内存与词表大小无关
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from config import VILLAINS
+from extract_evidence import EVIDENCE_SECTIONS, _character_evidence, merge_examples
+from extract_word import (
+    DOCUMENT_PATTERNS, build_lines_dataframe, is_skipped_file, process_document,
+)
+from keyword_config import get_keywords
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+MANIFEST_PATH = OUTPUT_DIR / "shards.json"
+SHARD_OUTPUT_DIR = OUTPUT_DIR / "shards"
+MANIFEST_VERSION = 1
+
+# 扫描语料时跳过的目录：本工具的输出（报告、raw_text、jieba 缓存等）和版本库/缓存目录
+EXCLUDED_DIR_NAMES = {".git", "__pycache__", ".venv", "venv", "node_modules"}
+
+
+def build_manifest(documents, n_shards):
+    """
+    按文件大小均衡地把文档分到 n_shards 个分片（大文件优先放入当前最小的分片）
+    返回 {"version", "shards": [{"id", "documents": [{"path", "bytes"}]}]}（path 为绝对路径）
+    """
+    documents = sorted((Path(d).resolve() for d in documents), key=lambda p: (-p.stat().st_size, str(p)))
+    n_shards = max(1, min(n_shards, len(documents)))
+    shards = [{"id": f"shard-{i:04d}", "documents": [], "bytes": 0} for i in range(n_shards)]
+    for path in documents:
+        shard = min(shards, key=lambda s: s["bytes"])
+        size = path.stat().st_size
+        shard["documents"].append({"path": str(path), "bytes": size})
+        shard["bytes"] += size
+    return {"version": MANIFEST_VERSION, "shards": shards}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """文档路径保存为相对清单所在目录的路径，整个项目目录复制到其他机器后仍然有效"""
+    root = Path(path).resolve().parent
+    root.mkdir(parents=True, exist_ok=True)
+    saved = dict(manifest, shards=[
+        dict(shard, documents=[
+            dict(doc, path=os.path.relpath(Path(doc["path"]).resolve(), root)) for doc in shard["documents"]
+        ])
+        for shard in manifest["shards"]
+    ])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(saved, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """读取分片清单；相对路径按清单所在目录解析"""
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"不支持的分片清单版本: {manifest.get('version')}")
+    root = Path(path).resolve().parent
+    for shard in manifest["shards"]:
+        for doc in shard["documents"]:
+            doc["path"] = str(root / doc["path"])
+    return manifest
+
+
+def get_shard(manifest, shard_id):
+    for shard in manifest["shards"]:
+        if shard["id"] == shard_id:
+            return shard
+    raise KeyError(f"分片清单中没有 {shard_id}")
+
+
+def map_shard(shard, max_examples=2, sketch_error=None, raw_text_dir=OUTPUT_DIR):
+    """
+    map 步骤：处理一个分片内的全部文档
+    返回 {"shard", "documents": [{"file", "play", "text_hash", "partials": {反派: 部分统计},
+                                   "evidence": {反派: {分组: [示例]}}}]}
+    结果只含计数和文本，可 JSON 序列化，在任意机器上产出都能合并
+    sketch_error: 近似词频模式的误差上界（见 main.map_features），各台机器需使用相同的值
+    raw_text_dir: 保存各文档全文 raw_text_<文档ID>.txt 的目录（证据候选的出处指向这些文件；
+                  多台机器时随分片结果一起拷贝到 reduce 的 output/，缺失时展示退回证据中保存的文本）
+    """
+    from jieba_setup import init_jieba
+    from main import DATA_DIR, load_stopwords, load_synonyms, map_features
+
+    stopwords = load_stopwords(os.path.join(DATA_DIR, "stopwords.txt"))
+    synonyms = load_synonyms(os.path.join(DATA_DIR, "synonyms.json"))
+
+    processed = []
+    for doc in shard["documents"]:
+        result = process_document(doc["path"], raw_text_dir)
+        if result is None:
+            print(f"  跳过: {Path(doc['path']).name}（无法识别剧本）")
+            continue
+        processed.append(result)
+
+    speaker_names = set(VILLAINS)
+    for result in processed:
+        speaker_names.update(line["character"] for line in result["speaker_lines"])
+    init_jieba(synonyms, speaker_names)
+
+    keyword_groups = get_keywords().groups
+    evidence_groups = {g: keyword_groups[g] for g, _ in EVIDENCE_SECTIONS if g in keyword_groups}
+
+    documents = []
+    for result in processed:
+        entry = {"file": result["file"], "play": result["play"], "text_hash": result["text_hash"],
+                 "partials": {}, "evidence": {}}
+        if result["lines"]:
+            df = build_lines_dataframe(result["lines"])
+            for villain in VILLAINS:
+                group_df = df[df["character"] == villain]
+                if group_df.empty:
+                    continue
+                entry["partials"][villain] = map_features(group_df, stopwords, synonyms, sketch_error=sketch_error)
+                entry["evidence"][villain] = _character_evidence(group_df, evidence_groups, max_examples)
+        documents.append(entry)
+    return {"shard": shard["id"], "documents": documents}
+
+
+def shard_output_path(shard_id, output_dir=SHARD_OUTPUT_DIR):
+    return Path(output_dir) / f"{shard_id}.json"
+
+
+def save_shard_result(shard_result, output_dir=SHARD_OUTPUT_DIR):
+    path = shard_output_path(shard_result["shard"], output_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(shard_result, f, ensure_ascii=False)
+    return path
+
+
+def load_shard_results(manifest, output_dir=SHARD_OUTPUT_DIR):
+    """按清单顺序读取各分片的 map 结果；缺失的分片报错"""
+    missing = [s["id"] for s in manifest["shards"] if not shard_output_path(s["id"], output_dir).exists()]
+    if missing:
+        raise FileNotFoundError(f"以下分片尚未完成 map: {', '.join(missing)}")
+    results = []
+    for shard in manifest["shards"]:
+        with open(shard_output_path(shard["id"], output_dir), "r", encoding="utf-8") as f:
+            results.append(json.load(f))
+    return results
+
+
+def reduce_shards(shard_results, synonyms, max_examples=2):
+    """
+    reduce 步骤：文本相同的文档（不同文件/版本的同一文本）只计一次，
+    合并各反派的部分统计并计算最终指标
+    返回 ({反派: 指标}, {反派: {分组: [示例]}})
+    """
+    from main import finalize_features, merge_partials
+
+    partials = {v: [] for v in VILLAINS}
+    evidence = {v: {} for v in VILLAINS}
+    seen = {}
+    for shard_result in shard_results:
+        for doc in shard_result["documents"]:
+            if doc["text_hash"] in seen:
+                print(f"  跳过: {Path(doc['file']).name}（文本与 {Path(seen[doc['text_hash']]).name} 相同）")
+                continue
+            seen[doc["text_hash"]] = doc["file"]
+            for villain, partial in doc["partials"].items():
+                if villain in partials:
+                    partials[villain].append(partial)
+            for villain, groups in doc["evidence"].items():
+                if villain in evidence:
+                    for group, examples in groups.items():
+                        evidence[villain].setdefault(group, []).append(examples)
+
+    results = {v: finalize_features(merge_partials(p), synonyms) for v, p in partials.items() if p}
+    merged_evidence = {
+        v: {g: merge_examples(lists, max_examples) for g, lists in groups.items()}
+        for v, groups in evidence.items() if v in results
+    }
+    return results, merged_evidence
+
+
+def write_outputs(results, evidence, output_dir=OUTPUT_DIR):
+    """输出 villain_features.csv、token_counts.json（与 main.py 相同）和 evidence_candidates.json"""
+    from main import features_to_row, save_token_counts
+
+    output_dir = Path(output_dir)
+    result_df = pd.DataFrame([features_to_row(v, feats) for v, feats in results.items()])
+    result_df.to_csv(output_dir / "villain_features.csv", index=False, encoding="utf-8-sig")
+    save_token_counts(results, str(output_dir / "token_counts.json"))
+    with open(output_dir / "evidence_candidates.json", "w", encoding="utf-8") as f:
+        json.dump(evidence, f, ensure_ascii=False, indent=2)
+    return result_df
+
+
+def run_reduce(manifest, output_dir=OUTPUT_DIR, max_examples=2):
+    from main import DATA_DIR, load_synonyms
+
+    synonyms = load_synonyms(os.path.join(DATA_DIR, "synonyms.json"))
+    shard_results = load_shard_results(manifest, Path(output_dir) / "shards")
+    results, evidence = reduce_shards(shard_results, synonyms, max_examples)
+    result_df = write_outputs(results, evidence, output_dir)
+    print(f"✓ reduce 完成: {len(shard_results)} 个分片, {len(results)} 个角色")
+    print(result_df.to_string())
+    return result_df
+
+
+def run_local(manifest, workers=None, output_dir=OUTPUT_DIR, max_examples=2, sketch_error=None):
+    """参考执行器：本机多进程执行所有分片的 map，再 reduce"""
+    shard_dir = Path(output_dir) / "shards"
+    shards = manifest["shards"]
+    workers = workers or min(len(shards), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(map_shard, shard, max_examples, sketch_error) for shard in shards]
+        for shard, future in zip(shards, futures):
+            path = save_shard_result(future.result(), shard_dir)
+            print(f"  ✓ {shard['id']}: {len(shard['documents'])} 个文档 -> {path.name}")
+    return run_reduce(manifest, output_dir, max_examples)
+
+
+def find_documents(corpus_dir, patterns=DOCUMENT_PATTERNS, exclude=(OUTPUT_DIR,)):
+    """
+    语料目录下的全部文档（含子目录）
+    patterns: 文件名模式（默认 Word 和 PDF；纯文本版本需显式传入 "*.txt"）
+    exclude: 跳过的目录（默认 output/，其中的报告和 raw_text 不是语料）；EXCLUDED_DIR_NAMES 中的目录也跳过
+    """
+    corpus_dir = Path(corpus_dir).resolve()
+    excluded = [Path(d).resolve() for d in exclude]
+
+    def included(path):
+        if is_skipped_file(path):
+            return False
+        parts = path.relative_to(corpus_dir).parts[:-1]
+        if any(part in EXCLUDED_DIR_NAMES for part in parts):
+            return False
+        return not any(path == d or d in path.parents for d in excluded)
+
+    documents = set()
+    for pattern in patterns:
+        documents.update(p for p in corpus_dir.rglob(pattern) if p.is_file())
+    return sorted(p for p in documents if included(p))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片 map-reduce 计算反派特征")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    plan = sub.add_parser("plan", help="生成分片清单")
+    plan.add_argument("--dir", default=str(BASE_DIR.parent), help="语料目录（默认项目根目录）")
+    plan.add_argument("--shards", type=int, default=4, help="分片数")
+    plan.add_argument("--patterns", nargs="+", default=None,
+                      help="文档文件名模式（默认 Word 和 PDF，如需纯文本版本可加 '*.txt'）")
+
+    map_cmd = sub.add_parser("map", help="处理单个分片")
+    map_cmd.add_argument("--shard", required=True, help="分片ID")
+
+    sub.add_parser("reduce", help="合并全部分片结果")
+
+    run = sub.add_parser("run", help="本地多进程执行全部分片并合并")
+    run.add_argument("--dir", help="语料目录；不传则使用已有分片清单")
+    run.add_argument("--shards", type=int, default=4, help="分片数")
+    run.add_argument("--workers", type=int, default=None, help="进程数")
+    run.add_argument("--patterns", nargs="+", default=None, help="文档文件名模式（同 plan）")
+
+    for sub_parser in sub.choices.values():
+        sub_parser.add_argument("--manifest", default=str(MANIFEST_PATH), help="分片清单路径")
+    for sub_parser in (map_cmd, run):
+        sub_parser.add_argument("--approximate", action="store_true",
+                                help="近似词频模式（CountMinSketch + HyperLogLog，只有关键词精确计数）")
+    args = parser.parse_args()
+    sketch_error = None
+    if getattr(args, "approximate", False):
+        from main import SKETCH_ERROR
+        sketch_error = SKETCH_ERROR
+
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    if args.command == "plan" or (args.command == "run" and args.dir):
+        documents = find_documents(args.dir, tuple(args.patterns or DOCUMENT_PATTERNS))
+        manifest = build_manifest(documents, args.shards)
+        save_manifest(manifest, args.manifest)
+        print(f"✓ 分片清单已保存: {args.manifest}（{len(documents)} 个文档, {len(manifest['shards'])} 个分片）")
+        if args.command == "plan":
+            return manifest
+
+    manifest = load_manifest(args.manifest)
+    if args.command == "map":
+        shard_result = map_shard(get_shard(manifest, args.shard), sketch_error=sketch_error)
+        path = save_shard_result(shard_result)
+        print(f"✓ {args.shard} 完成: {len(shard_result['documents'])} 个文档 -> {path}")
+    elif args.command == "reduce":
+        run_reduce(manifest)
+    else:
+        run_local(manifest, workers=args.workers, sketch_error=sketch_error)
+
+
+if __name__ == "__main__":
+    main()
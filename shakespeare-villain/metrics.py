@@ -0,0 +1,269 @@
+"""
+运行指标：Prometheus 文本格式，供定时任务监控吞吐量和回归
+- 各步骤入口用 @timed("extract") 等装饰：记录耗时、运行次数（成功/失败）、最近一次成功的时间
+- 文档/台词/词数、缓存命中（jieba 词典缓存、检查点）、各角色提取的台词数、错误数由各步骤在运行中记录
+- 每个步骤结束后写出 output/metrics.prom（原子替换，node_exporter 的 textfile collector 可直接采集）；
+  各步骤通常是分别运行的进程，写出时与文件中已有的样本合并：其他步骤的样本保留，
+  counter 加上本进程自上次写出以来的增量，gauge 取本进程的值
+- 长时间运行的模式（watch.py、batch.py）可加 --metrics-port 开启本地 http://127.0.0.1:<端口>/metrics
+
+指标只在进程内累计；batch.py 的工作进程把每个任务的指标快照交回主进程，按 corpus 标签合并
+"""
+import functools
+import math
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+METRICS_PATH = OUTPUT_DIR / "metrics.prom"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$")
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+_UNESCAPE = re.compile(r"\\(.)")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _unescape(value) -> str:
+    return _UNESCAPE.sub(lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def _key(labels) -> tuple:
+    """样本的标签键：按标签名排序的 (名, 字符串值) 元组"""
+    return tuple(sorted((k, str(v)) for k, v in labels))
+
+
+def parse_textfile(text) -> dict:
+    """Prometheus 文本格式 -> {指标名: [类型, 说明, {标签键: 值}]}；无法识别的行忽略"""
+    families = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            parts = line[7:].split(" ", 1)
+            entry = families.setdefault(parts[0], ["untyped", "", {}])
+            entry[1 if line.startswith("# HELP ") else 0] = parts[1] if len(parts) > 1 else ""
+            continue
+        match = _SAMPLE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        key = _key((k, _unescape(v)) for k, v in _LABEL.findall(labels or ""))
+        families.setdefault(name, ["untyped", "", {}])[2][key] = value
+    return families
+
+
+def _render(families) -> str:
+    """families: 可迭代的 (指标名, 类型, 说明, {标签键: 值})"""
+    lines = []
+    for name, kind, help_text, samples in families:
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(samples.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            lines.append(f"{name}{{{labels}}} {_format(value)}" if labels else f"{name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _format(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Family:
+    """同名指标的全部样本：标签 -> 值（counter 只增，gauge 直接设置）"""
+
+    def __init__(self, registry, name, help_text, kind):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.samples = {}
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            self.samples[key] = self.samples.get(key, 0.0) + amount
+
+    def set(self, value, **labels):
+        with self.registry.lock:
+            self.samples[tuple(sorted(labels.items()))] = float(value)
+
+    def get(self, **labels) -> float:
+        return self.samples.get(tuple(sorted(labels.items())), 0.0)
+
+
+class Registry:
+    """
+    进程内的指标注册表
+    textfile: 步骤结束后写出的文件（None 表示不写，如 batch.py 中由主进程统一写出）
+    """
+
+    def __init__(self, textfile=METRICS_PATH):
+        self.families = {}
+        self.lock = threading.RLock()
+        self.textfile = textfile
+        # (文件, 指标名, 标签键) -> 上次写出时的 counter 值，再次写出时只把增量加到文件中
+        self._written = {}
+
+    def _family(self, name, help_text, kind) -> Family:
+        if name not in self.families:
+            self.families[name] = Family(self, name, help_text, kind)
+        return self.families[name]
+
+    def counter(self, name, help_text) -> Family:
+        return self._family(name, help_text, "counter")
+
+    def gauge(self, name, help_text) -> Family:
+        return self._family(name, help_text, "gauge")
+
+    def reset(self):
+        """清空全部样本（保留指标定义）"""
+        with self.lock:
+            for family in self.families.values():
+                family.samples.clear()
+            self._written.clear()
+
+    def snapshot(self) -> list:
+        """可 pickle 的样本快照：[(名称, 类型, 说明, [(标签, 值), ...]), ...]"""
+        with self.lock:
+            return [(f.name, f.kind, f.help, list(f.samples.items())) for f in self.families.values()]
+
+    def merge(self, snapshot, **labels):
+        """合并另一个进程/任务的快照，附加 labels（counter 累加，gauge 覆盖）"""
+        extra = tuple(labels.items())
+        with self.lock:
+            for name, kind, help_text, samples in snapshot:
+                family = self._family(name, help_text, kind)
+                for key, value in samples:
+                    key = tuple(sorted(key + extra))
+                    if kind == "counter":
+                        family.samples[key] = family.samples.get(key, 0.0) + value
+                    else:
+                        family.samples[key] = value
+
+    def render(self) -> str:
+        """本进程的全部样本"""
+        with self.lock:
+            return _render((f.name, f.kind, f.help, {_key(k): v for k, v in f.samples.items()})
+                           for f in self.families.values())
+
+    def write_textfile(self, path=None):
+        """
+        与文件中已有的样本合并后原子写出（先写临时文件再替换），采集端不会读到写了一半的文件
+        其他进程（步骤）写入的样本保留；本进程的 counter 只累加自上次写出以来的增量
+        """
+        path = Path(path or self.textfile)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        families = parse_textfile(path.read_text(encoding="utf-8")) if path.exists() else {}
+        with self.lock:
+            for family in self.families.values():
+                entry = families.setdefault(family.name, [family.kind, family.help, {}])
+                entry[0], entry[1] = family.kind, family.help
+                for key, value in family.samples.items():
+                    key = _key(key)
+                    if family.kind == "counter":
+                        written = self._written.get((str(path), family.name, key), 0.0)
+                        entry[2][key] = entry[2].get(key, 0.0) + value - written
+                        self._written[(str(path), family.name, key)] = value
+                    else:
+                        entry[2][key] = value
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(_render((name, *entry) for name, entry in families.items()))
+        os.replace(tmp_path, path)
+        return path
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.gauge("villain_stage_duration_seconds", "最近一次运行各步骤的耗时（秒）")
+STAGE_SECONDS_TOTAL = REGISTRY.counter("villain_stage_seconds_total", "各步骤累计耗时（秒）")
+STAGE_RUNS = REGISTRY.counter("villain_stage_runs_total", "各步骤运行次数（result=success/error）")
+STAGE_LAST_SUCCESS = REGISTRY.gauge("villain_stage_last_success_timestamp_seconds", "各步骤最近一次成功完成的时间")
+DOCUMENTS = REGISTRY.counter("villain_documents_processed_total", "处理的文档数")
+LINES = REGISTRY.counter("villain_lines_processed_total", "处理的台词数")
+TOKENS = REGISTRY.counter("villain_tokens_processed_total", "处理的词数（过滤停用词后）")
+CACHE_REQUESTS = REGISTRY.counter("villain_cache_requests_total", "缓存查询次数（result=hit/miss）")
+CACHE_HIT_RATIO = REGISTRY.gauge("villain_cache_hit_ratio", "缓存命中率")
+EXTRACTED_LINES = REGISTRY.gauge("villain_extracted_lines", "各角色提取到的台词数")
+ERRORS = REGISTRY.counter("villain_errors_total", "错误数")
+
+
+def cache_lookup(cache, hit):
+    """记录一次缓存查询，并更新该缓存的命中率"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    hits = CACHE_REQUESTS.get(cache=cache, result="hit")
+    CACHE_HIT_RATIO.set(hits / (hits + CACHE_REQUESTS.get(cache=cache, result="miss")), cache=cache)
+
+
+def record_stage(stage, seconds, ok=True):
+    """记录一次步骤运行，并写出 textfile（REGISTRY.textfile 为 None 时不写）"""
+    STAGE_SECONDS.set(seconds, stage=stage)
+    STAGE_SECONDS_TOTAL.inc(seconds, stage=stage)
+    STAGE_RUNS.inc(stage=stage, result="success" if ok else "error")
+    if ok:
+        STAGE_LAST_SUCCESS.set(time.time(), stage=stage)
+    else:
+        ERRORS.inc(stage=stage)
+    if REGISTRY.textfile is not None:
+        try:
+            REGISTRY.write_textfile()
+        except OSError as e:
+            print(f"警告: 无法写出指标文件 {REGISTRY.textfile}: {e}")
+
+
+def timed(stage):
+    """步骤入口的装饰器：记录耗时和结果（异常照常抛出）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            ok = False
+            try:
+                value = func(*args, **kwargs)
+                ok = True
+                return value
+            finally:
+                record_stage(stage, time.perf_counter() - start, ok)
+        return wrapper
+    return decorator
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY) -> ThreadingHTTPServer:
+    """在后台线程开启 /metrics 端点，返回 server（server.shutdown() 停止）"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"指标端点: http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,66 @@
+"""
+文本规范化：读入文档时统一转换一次，后续的角色名识别、关键词匹配、分句、指令句判断都只面对规范文本
+- 繁体字 -> 简体字（data/traditional_simplified.json，只收录能一对一转换、且转换结果是常用简体字的字）
+- 全角字母数字 -> 半角；半角标点、直角引号、其他省略号/破折号写法 -> 中文标点
+- 各种空白（全角空格、不换行空格、零宽字符）统一为普通空格，连续空格最多保留两个
+  （台词行"角色名  台词"的两个空格分隔、"班  柯"的字间空格都保留）
+转换表在导入时一次建好，转换本身是 str.translate 加一次正则替换
+"""
+import json
+import re
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+TRADITIONAL_PATH = DATA_DIR / "traditional_simplified.json"
+
+
+def load_traditional_map(path=TRADITIONAL_PATH) -> dict:
+    """繁体字 -> 简体字"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+TRADITIONAL_TO_SIMPLIFIED = load_traditional_map()
+
+# 全角字母数字 -> 半角
+_FULLWIDTH_ALNUM = {
+    chr(c): chr(c - 0xFEE0)
+    for c in [*range(0xFF10, 0xFF1A), *range(0xFF21, 0xFF3B), *range(0xFF41, 0xFF5B)]
+}
+# 标点 -> 中文标点（"." 不转换，英文剧名、"..." 省略号保持原样）
+PUNCTUATION = {
+    ",": "，", ";": "；", ":": "：", "?": "？", "!": "！", "(": "（", ")": "）",
+    "｡": "。", "､": "、", "｢": "“", "｣": "”",
+    "「": "“", "」": "”", "『": "‘", "』": "’",
+    "⋯": "…", "―": "—", "─": "—",
+}
+# 空白变体 -> 空格（全角空格占两个字宽，转为两个空格，"角色名　台词"仍是两个空格分隔）；
+# 零宽字符删除；孤立的 \r 视为换行
+WHITESPACE = {
+    "\u3000": "  ", "\u00a0": " ", "\u202f": " ", "\u205f": " ",
+    **{chr(c): " " for c in range(0x2002, 0x200B)},
+    "\u200b": None, "\u200c": None, "\u200d": None, "\ufeff": None,
+    "\r": "\n",
+}
+
+SIMPLIFIED_TABLE = str.maketrans(TRADITIONAL_TO_SIMPLIFIED)
+NORMALIZE_TABLE = str.maketrans({**TRADITIONAL_TO_SIMPLIFIED, **_FULLWIDTH_ALNUM, **PUNCTUATION, **WHITESPACE})
+
+# 三个以上的连续空格压成两个；行尾空格删除
+_SPACE_RUN = re.compile(r" +(?=\n|$)| {3,}")
+
+
+def _collapse(match):
+    return "" if match.end() == len(match.string) or match.string[match.end()] == "\n" else "  "
+
+
+def to_simplified(text: str) -> str:
+    """只做繁简转换（关键词、角色名等短字符串）"""
+    return text.translate(SIMPLIFIED_TABLE)
+
+
+def normalize_text(text: str) -> str:
+    """文档全文的规范形式（行数不变）"""
+    text = text.replace("\r\n", "\n").translate(NORMALIZE_TABLE)
+    return _SPACE_RUN.sub(_collapse, text)
@@ -0,0 +1,135 @@
+"""
+剧本章节识别：在全集（37部剧）或单行本文本中找出每部剧的起点
+- 所有剧名（中文各译名、英文名）规范化后编成一个字典，每行只做一次查找
+- 只有"独占一行的剧名"才是候选标题（对白里提到"哈姆雷特"不会切换剧本）；
+  候选标题之后若干行内出现结构标志（译者署名、剧中人物、第一幕、Dramatis Personae、ACT I）才确认
+- 逐行流式处理，只缓存候选标题之后等待确认的几行
+"""
+import re
+from collections import deque
+
+# 标准剧名 -> 别名（中文不同译名、英文名）
+PLAY_TITLES = {
+    "暴风雨": ["The Tempest"],
+    "维洛那二绅士": ["The Two Gentlemen of Verona"],
+    "温莎的风流娘儿们": ["温莎的风流妇人", "The Merry Wives of Windsor"],
+    "一报还一报": ["量罪记", "Measure for Measure"],
+    "错误的喜剧": ["错中错", "The Comedy of Errors"],
+    "无事生非": ["Much Ado About Nothing"],
+    "爱的徒劳": ["空爱一场", "Love's Labour's Lost"],
+    "仲夏夜之梦": ["A Midsummer Night's Dream"],
+    "威尼斯商人": ["The Merchant of Venice"],
+    "皆大欢喜": ["As You Like It"],
+    "驯悍记": ["The Taming of the Shrew"],
+    "终成眷属": ["All's Well That Ends Well"],
+    "第十二夜": ["Twelfth Night"],
+    "冬天的故事": ["冬天的童话", "The Winter's Tale"],
+    "约翰王": ["King John"],
+    "理查二世": ["King Richard II", "Richard II"],
+    "亨利四世上篇": ["King Henry IV Part 1", "Henry IV Part 1"],
+    "亨利四世下篇": ["King Henry IV Part 2", "Henry IV Part 2"],
+    "亨利五世": ["King Henry V", "Henry V"],
+    "亨利六世上篇": ["King Henry VI Part 1", "Henry VI Part 1"],
+    "亨利六世中篇": ["King Henry VI Part 2", "Henry VI Part 2"],
+    "亨利六世下篇": ["King Henry VI Part 3", "Henry VI Part 3"],
+    "理查三世": ["King Richard III", "Richard III"],
+    "亨利八世": ["King Henry VIII", "Henry VIII"],
+    "特洛伊罗斯与克瑞西达": ["Troilus and Cressida"],
+    "科利奥兰纳斯": ["Coriolanus"],
+    "泰特斯·安德洛尼克斯": ["Titus Andronicus"],
+    "罗密欧与朱丽叶": ["Romeo and Juliet"],
+    "雅典的泰门": ["Timon of Athens"],
+    "裘力斯·凯撒": ["尤利乌斯·恺撒", "Julius Caesar"],
+    "麦克白": ["Macbeth", "The Tragedy of Macbeth"],
+    "哈姆雷特": ["哈姆莱特", "王子复仇记", "Hamlet", "The Tragedy of Hamlet, Prince of Denmark"],
+    "李尔王": ["King Lear"],
+    "奥赛罗": ["奥瑟罗", "Othello", "The Tragedy of Othello, the Moor of Venice"],
+    "安东尼与克莉奥佩特拉": ["Antony and Cleopatra"],
+    "辛白林": ["Cymbeline"],
+    "泰尔亲王配力克里斯": ["Pericles", "Pericles, Prince of Tyre"],
+}
+
+# 比较标题前去掉的字符：空白（排版时字间加空格的"哈 姆 莱 特"）、书名号、间隔号和常见标点
+_HEADER_DELETE = str.maketrans("", "", " \t　 《》〈〉「」『』“”\"'’·•.,，。:：")
+# 标题行最长字数（原始行，含字间空格）；更长的行直接跳过
+MAX_HEADER_LENGTH = 60
+# 结构标志（作用于规范化后的行）
+STRUCTURE_CUE = re.compile(
+    r"^(?:剧中人物|人物表?|第一幕|第一场|.{1,8}译|dramatispersonae|personsoftheplay|act(?:i|1|one)(?![ivx\d]))"
+)
+# 候选标题之后最多等待多少个非空行
+LOOKAHEAD = 12
+
+
+def normalize_header(line: str) -> str:
+    """标题比较用的规范形式：去空白和标点，英文小写"""
+    return line.translate(_HEADER_DELETE).casefold()
+
+
+def _build_title_index(titles):
+    """规范化后的剧名/别名 -> 标准剧名"""
+    index = {}
+    for canonical, aliases in titles.items():
+        for alias in (canonical, *aliases):
+            index[normalize_header(alias)] = canonical
+    return index
+
+
+_TITLE_INDEX = _build_title_index(PLAY_TITLES)
+
+
+def match_title(line: str):
+    """独占一行的剧名 -> 标准剧名；否则 None"""
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_HEADER_LENGTH:
+        return None
+    return _TITLE_INDEX.get(normalize_header(stripped))
+
+
+def is_structure_cue(line: str) -> bool:
+    return STRUCTURE_CUE.match(normalize_header(line)) is not None
+
+
+def iter_play_sections(lines, lookahead=LOOKAHEAD):
+    """
+    逐行产出 (剧名, 行)；第一部剧确认之前的前言、版权页等剧名为 None
+    候选标题确认后，该标题行及其后的行都归入新剧本；未确认则仍归入当前剧本
+    """
+    current = None
+    pending = None          # 等待确认的候选剧名
+    held = deque()          # 候选标题行及其后等待确认的行
+    waited = 0
+
+    def flush(play):
+        while held:
+            yield play, held.popleft()
+
+    for line in lines:
+        line = line.rstrip("\n")
+        title = match_title(line)
+        if pending is not None:
+            if title is not None and title != pending:
+                # 又出现另一个候选标题（如目录页），前一个作废
+                yield from flush(current)
+                pending, waited = None, 0
+            elif line.strip() and is_structure_cue(line):
+                current = pending
+                yield from flush(current)
+                pending, waited = None, 0
+                yield current, line
+                continue
+            else:
+                held.append(line)
+                if line.strip():
+                    waited += 1
+                if waited >= lookahead:
+                    yield from flush(current)
+                    pending, waited = None, 0
+                continue
+        if title is not None and title != current:
+            pending, waited = title, 0
+            held.append(line)
+            continue
+        yield current, line
+
+    yield from flush(current)
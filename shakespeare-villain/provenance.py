@@ -0,0 +1,111 @@
+"""
+台词出处：每条台词记录 (doc_id, offset, length)，指向 output/raw_text_<doc_id>.txt 中的一段 UTF-8 字节
+（extract_word.py 保存的规范化全文；doc_id 是全文字节的哈希，同一剧本的不同版本各有各的ID）
+- RawTextSource: 全文以只读 mmap 打开，展示证据时按需切片，只解码要显示的部分；
+  首次打开时核对文件内容与 doc_id 一致，不一致（或文件不存在）时不切片，由调用方退回 text 列
+- SpeakerTimeline: 同一文档中按偏移排序的全部发言（all_lines.csv 的出处列，不读台词文本），
+  用于给证据台词配上前后发言作为上下文
+"""
+import hashlib
+import mmap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+
+class RawTextSource:
+    """output_dir 下各文档全文的只读 mmap（首次访问时打开并核对内容，close() 统一关闭）"""
+
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.output_dir = Path(output_dir)
+        self._files = {}
+        self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def path(self, doc) -> Path:
+        return self.output_dir / f"raw_text_{doc}.txt"
+
+    def _buffer(self, doc):
+        if doc not in self._maps:
+            path = self.path(doc)
+            buffer = None
+            if doc and path.exists() and path.stat().st_size > 0:
+                f = open(path, "rb")
+                self._files[doc] = f
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if hashlib.sha256(buffer).hexdigest()[:len(doc)] != doc:
+                    print(f"警告: {path.name} 的内容与文档ID不符，台词改用表中保存的文本")
+                    buffer.close()
+                    buffer = None
+            self._maps[doc] = buffer
+        return self._maps[doc]
+
+    def slice(self, doc, offset, length, limit=None):
+        """
+        台词文本；limit 为最多解码的字符数（只读取 limit 个字符可能占用的字节）
+        没有出处（offset < 0）、全文不存在或内容与 doc 不符时返回 None
+        """
+        if not isinstance(doc, str):
+            return None
+        buffer = self._buffer(doc)
+        if buffer is None or offset is None or offset < 0 or offset + length > len(buffer):
+            return None
+        end = offset + length if limit is None else min(offset + length, offset + limit * 4)
+        text = buffer[offset:end].decode("utf-8", errors="ignore")
+        return text if limit is None else text[:limit]
+
+    def close(self):
+        for buffer in self._maps.values():
+            if buffer is not None:
+                buffer.close()
+        for f in self._files.values():
+            f.close()
+        self._maps.clear()
+        self._files.clear()
+
+
+class SpeakerTimeline:
+    """每个文档的发言按 offset 排序；around() 用二分查找取某句台词前后的发言"""
+
+    def __init__(self, lines: pd.DataFrame):
+        self.docs = {}
+        lines = lines[(lines["offset"] >= 0) & lines["doc_id"].notna()]
+        for doc, group in lines.groupby("doc_id", sort=False):
+            group = group.sort_values("offset")
+            self.docs[doc] = (
+                group["offset"].to_numpy(dtype=np.int64),
+                group["length"].to_numpy(dtype=np.int64),
+                group["character"].to_numpy(dtype=object),
+            )
+
+    @classmethod
+    def load(cls, csv_path):
+        """读取 all_lines.csv 的出处列；文件不存在或没有出处列时返回 None"""
+        csv_path = Path(csv_path)
+        if not csv_path.exists():
+            return None
+        columns = pd.read_csv(csv_path, encoding="utf-8-sig", nrows=0).columns
+        if "doc_id" not in columns or "offset" not in columns:
+            return None
+        return cls(pd.read_csv(csv_path, encoding="utf-8-sig", dtype={"doc_id": str},
+                               usecols=["doc_id", "character", "offset", "length"]))
+
+    def around(self, doc, offset, before=1, after=1):
+        """文档 doc 中 offset 处台词的前 before 句和后 after 句发言：([(角色, offset, length), ...], [...])"""
+        if doc not in self.docs:
+            return [], []
+        offsets, lengths, characters = self.docs[doc]
+        pos = int(np.searchsorted(offsets, offset))
+        nxt = pos + 1 if pos < len(offsets) and offsets[pos] == offset else pos
+        entry = lambda i: (characters[i], int(offsets[i]), int(lengths[i]))
+        return ([entry(i) for i in range(max(pos - before, 0), pos)],
+                [entry(i) for i in range(nxt, min(nxt + after, len(offsets)))])
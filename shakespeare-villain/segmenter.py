@@ -0,0 +1,145 @@
+"""
+分句：逐行单遍扫描，输出句子区间 (line_id, start, end)，不复制文本
+- 句末标点：。？！；（及半角 ?!;）、省略号 …… / ...
+- 句末标点后紧跟的右引号、右括号归入同一句的结尾
+- 区间不含句末标点和首尾空白，句长即 end - start
+区间保存在 output/sentence_spans.csv，句法指标和文本证据共用同一份分句结果；
+line_id 是 villain_lines.csv 的行号，旁边的 sentence_spans.source.json 记录分句时台词表的大小和修改时间，
+台词表被替换后（watch.py、extract_word.py、mapreduce.py 等）不再复用旧的区间
+"""
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+SPANS_PATH = OUTPUT_DIR / "sentence_spans.csv"
+
+SENTENCE_END = re.compile(r"(?:[。？！；?!;]+|…+|\.{3,})[”’」』）)\"']*")
+NON_SPACE = re.compile(r"\S")
+
+
+def source_path(spans_path=SPANS_PATH) -> Path:
+    """分句结果对应的台词表指纹文件"""
+    return Path(spans_path).with_suffix(".source.json")
+
+
+def lines_fingerprint(csv_path) -> dict:
+    stat = Path(csv_path).stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def mark_source(spans_path, csv_path):
+    """分句结果写完后记录台词表指纹"""
+    with open(source_path(spans_path), "w", encoding="utf-8") as f:
+        json.dump(lines_fingerprint(csv_path), f)
+
+
+def clear_source(spans_path):
+    source_path(spans_path).unlink(missing_ok=True)
+
+
+def iter_line_spans(line: str):
+    """单行内的句子区间 (start, end)"""
+    start = 0
+    for match in SENTENCE_END.finditer(line):
+        yield from _trimmed(line, start, match.start())
+        start = match.end()
+    yield from _trimmed(line, start, len(line))
+
+
+def _trimmed(line, start, end):
+    """去掉区间首尾空白；全为空白时不产出"""
+    first = NON_SPACE.search(line, start, end)
+    if first is None:
+        return
+    start = first.start()
+    while end > start and line[end - 1].isspace():
+        end -= 1
+    yield start, end
+
+
+def iter_sentence_spans(lines):
+    """
+    lines: 可迭代的 (line_id, 文本)
+    逐句产出 (line_id, start, end)
+    """
+    for line_id, line in lines:
+        for start, end in iter_line_spans(line):
+            yield line_id, start, end
+
+
+class SentenceSpans:
+    """句子区间表（三列整数数组），按 line_id 引用原台词"""
+
+    def __init__(self, line_ids, starts, ends):
+        self.line_ids = np.asarray(line_ids, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """lines: 可迭代的 (line_id, 文本)"""
+        spans = list(iter_sentence_spans(lines))
+        if not spans:
+            return cls([], [], [])
+        line_ids, starts, ends = zip(*spans)
+        return cls(line_ids, starts, ends)
+
+    @classmethod
+    def from_series(cls, texts: pd.Series):
+        """按 Series 的索引作为 line_id 分句"""
+        return cls.from_lines(zip(texts.index, texts.astype(str)))
+
+    def __len__(self):
+        return len(self.line_ids)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.ends - self.starts
+
+    def subset(self, line_ids) -> "SentenceSpans":
+        """只保留属于指定台词的句子"""
+        mask = np.isin(self.line_ids, np.asarray(list(line_ids)))
+        return SentenceSpans(self.line_ids[mask], self.starts[mask], self.ends[mask])
+
+    def count_matching(self, texts, pattern) -> int:
+        """统计包含 pattern 的句子数（正则在原文区间上直接匹配，不切片复制）"""
+        return sum(
+            1 for line_id, start, end in zip(self.line_ids, self.starts, self.ends)
+            if pattern.search(texts[line_id], start, end)
+        )
+
+    def text(self, texts, i) -> str:
+        """第 i 句的文本"""
+        return texts[self.line_ids[i]][self.starts[i]:self.ends[i]]
+
+    def longest(self, n) -> np.ndarray:
+        """最长的 n 句的下标（按长度降序，同长时按原文顺序）"""
+        order = np.argsort(-self.lengths, kind="stable")
+        return order[:n]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"line_id": self.line_ids, "start": self.starts, "end": self.ends})
+
+    def save(self, path=SPANS_PATH):
+        self.to_frame().to_csv(path, index=False)
+
+    @classmethod
+    def load(cls, path=SPANS_PATH):
+        df = pd.read_csv(path)
+        return cls(df["line_id"].values, df["start"].values, df["end"].values)
+
+    @classmethod
+    def load_for(cls, csv_path, path=SPANS_PATH):
+        """读取与 csv_path 当前内容对应的分句结果；没有、未写完或台词表已被替换时返回 None"""
+        meta = source_path(path)
+        if not Path(path).exists() or not meta.exists() or not Path(csv_path).exists():
+            return None
+        with open(meta, "r", encoding="utf-8") as f:
+            if json.load(f) != lines_fingerprint(csv_path):
+                return None
+        return cls.load(path)
@@ -0,0 +1,229 @@
+"""
+情感/情绪维度：基于本地情感词典（data/emotion_lexicon.json）为台词打分
+- 词典中的词预先放进共享词表（vocab.py），得到 词ID × 维度 的权重矩阵
+- 全部台词分词后拼成一个词ID数组，查表后按台词下标做一次 bincount，得到每句台词的各维度得分
+- 单字情感词（"恨"、"怕"）也计入，不受停用词/单字过滤影响；每千词频次的分母与关键词相同（过滤后的词数）
+- 汇总：每个角色（main.py 写入 villain_features.csv）、每一幕、每个滑动窗口（连续若干句台词）
+情感倾向 sentiment = (positive - negative) / (positive + negative)，没有情感词时为 0
+
+用法：
+    python sentiment.py --window 20 --step 10
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+
+import jieba
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = BASE_DIR / "data"
+OUTPUT_DIR = BASE_DIR / "output"
+LEXICON_PATH = DATA_DIR / "emotion_lexicon.json"
+
+# 情感极性维度；其余维度为情绪类别
+POLARITY = ("positive", "negative")
+
+
+class EmotionLexicon:
+    """
+    情感词典：维度 -> {词: 权重}
+    - weights(vocab): 词ID × 维度 的权重矩阵，只覆盖到词典中最大的词ID（更大的ID都不是情感词）
+    - word_weights: 词 -> 各维度权重；按词排序后的数组用于不经过词表的近似模式（score_tokens）
+    """
+
+    def __init__(self, dimensions: dict):
+        self.entries = {
+            dim: dict(words) if isinstance(words, dict) else dict.fromkeys(words, 1.0)
+            for dim, words in dimensions.items()
+        }
+        self.dimensions = tuple(self.entries)
+        self.emotions = tuple(d for d in self.dimensions if d not in POLARITY)
+        self.word_weights = {}
+        for d, (dim, words) in enumerate(self.entries.items()):
+            for word, weight in words.items():
+                self.word_weights.setdefault(word, np.zeros(len(self.dimensions)))[d] += weight
+        self._sorted_words = np.array(sorted(self.word_weights), dtype=str)
+        self._sorted_weights = np.array([self.word_weights[w] for w in self._sorted_words]).reshape(
+            len(self._sorted_words), len(self.dimensions))
+        payload = json.dumps(self.entries, ensure_ascii=False, sort_keys=True)
+        self.version = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+        self._vocab = None
+        self._weights = None
+
+    @classmethod
+    def load(cls, path=LEXICON_PATH) -> "EmotionLexicon":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["dimensions"])
+
+    def weights(self, vocab) -> np.ndarray:
+        if self._vocab is not vocab:
+            ids = {word: vocab.intern(word) for word in self.word_weights}
+            weights = np.zeros((max(ids.values(), default=-1) + 1, len(self.dimensions)))
+            for word, token_id in ids.items():
+                weights[token_id] = self.word_weights[word]
+            self._vocab, self._weights = vocab, weights
+        return self._weights
+
+    def score_ids(self, vocab, ids: np.ndarray, line_index: np.ndarray = None, n_lines: int = 1) -> np.ndarray:
+        """
+        未过滤的词ID数组 -> (台词数 × 维度) 得分
+        line_index[i] 为第 i 个词所属的台词下标；不传则全部计入同一行
+        """
+        weights = self.weights(vocab)
+        n_dims = len(self.dimensions)
+        ids = np.asarray(ids, dtype=np.int64)
+        if line_index is None:
+            line_index = np.zeros(len(ids), dtype=np.int64)
+        hit = ids < len(weights)
+        rows = weights[ids[hit]]
+        flat = line_index[hit][:, None] * n_dims + np.arange(n_dims)
+        scores = np.bincount(flat.ravel(), weights=rows.ravel(), minlength=n_lines * n_dims)
+        return scores.reshape(n_lines, n_dims)
+
+    def score_tokens(self, tokens) -> np.ndarray:
+        """不经过词表的查找（近似模式）：词数组在排序后的词典词数组上二分查找，整体是数组运算"""
+        scores = np.zeros(len(self.dimensions))
+        if not len(tokens) or not len(self._sorted_words):
+            return scores
+        tokens = np.asarray(tokens, dtype=str)
+        pos = np.searchsorted(self._sorted_words, tokens)
+        pos[pos == len(self._sorted_words)] = 0
+        hit = self._sorted_words[pos] == tokens
+        return scores + self._sorted_weights[pos[hit]].sum(axis=0)
+
+
+_lexicon = None
+
+
+def get_lexicon() -> EmotionLexicon:
+    """进程内共享的情感词典；词典文件不存在时返回 None（不计算情感维度）"""
+    global _lexicon
+    if _lexicon is None and LEXICON_PATH.exists():
+        _lexicon = EmotionLexicon.load()
+    return _lexicon
+
+
+def emotion_columns(counts: dict, total_tokens: int, lexicon: EmotionLexicon) -> dict:
+    """各维度命中数 -> 特征表的列：sentiment、emotion_<情绪>_per_1000"""
+    positive, negative = counts.get("positive", 0.0), counts.get("negative", 0.0)
+    polar = positive + negative
+    columns = {"sentiment": round((positive - negative) / polar, 4) if polar else 0.0}
+    for emotion in lexicon.emotions:
+        per_1000 = counts.get(emotion, 0.0) / total_tokens * 1000 if total_tokens else 0.0
+        columns[f"emotion_{emotion}_per_1000"] = round(per_1000, 2)
+    return columns
+
+
+def score_lines(texts: pd.Series, stopwords: set, synonyms: dict, lexicon: EmotionLexicon = None) -> pd.DataFrame:
+    """
+    每句台词的各维度得分和（过滤后的）词数
+    所有台词的词ID拼成一个数组，查表和按行求和都是整体的数组运算
+    """
+    from vocab import get_pipeline
+
+    lexicon = lexicon or get_lexicon()
+    pipeline = get_pipeline(stopwords, synonyms)
+    token_lists = [jieba.lcut(str(text)) for text in texts]
+    lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+    ids = pipeline.vocab.encode(itertools.chain.from_iterable(token_lists)).astype(np.int64)
+    line_index = np.repeat(np.arange(len(token_lists)), lengths)
+
+    scores = lexicon.score_ids(pipeline.vocab, ids, line_index, len(token_lists))
+    pipeline.filter(ids)  # 补全新词的过滤表
+    tokens = np.bincount(line_index[pipeline.keep[ids]], minlength=len(token_lists))
+    result = pd.DataFrame(scores, columns=list(lexicon.dimensions), index=texts.index)
+    result.insert(0, "tokens", tokens)
+    return result
+
+
+def summarize(sums: pd.DataFrame, lexicon: EmotionLexicon) -> pd.DataFrame:
+    """已按某个粒度求和的得分表 -> 情感倾向和每千词情绪频次"""
+    rows = [
+        emotion_columns(row, int(row["tokens"]), lexicon)
+        for row in sums[["tokens", *lexicon.dimensions]].to_dict("records")
+    ]
+    return pd.concat([sums.reset_index(drop=True), pd.DataFrame(rows)], axis=1)
+
+
+def aggregate(df: pd.DataFrame, scores: pd.DataFrame, by, lexicon: EmotionLexicon) -> pd.DataFrame:
+    """按 by 中的列（如 character、play+act）汇总"""
+    grouped = pd.concat([df[by], scores], axis=1).groupby(by, sort=False)
+    sums = grouped.sum(numeric_only=True).reset_index()
+    sums.insert(len(by), "lines", grouped.size().values)
+    return summarize(sums, lexicon)
+
+
+def window_scores(df: pd.DataFrame, scores: pd.DataFrame, lexicon: EmotionLexicon, window=20, step=10) -> pd.DataFrame:
+    """
+    每个角色按台词顺序取连续 window 句为一个窗口（步长 step），观察情感随剧情的变化
+    用前缀和一次求出所有窗口的和
+    """
+    columns = ["tokens", *lexicon.dimensions]
+    frames = []
+    for character, index in df.groupby("character", sort=False).groups.items():
+        values = scores.loc[index, columns].to_numpy(dtype=np.float64)
+        n = len(values)
+        prefix = np.vstack([np.zeros(len(columns)), np.cumsum(values, axis=0)])
+        starts = np.arange(0, max(n - window, 0) + 1, step)
+        if n > window and starts[-1] + window < n:
+            # 补一个以最后一句结尾的窗口，末尾不足一个步长的台词也被覆盖
+            starts = np.append(starts, n - window)
+        ends = np.minimum(starts + window, n)
+        sums = pd.DataFrame(prefix[ends] - prefix[starts], columns=columns)
+        sums.insert(0, "end_line", ends)
+        sums.insert(0, "start_line", starts)
+        sums.insert(0, "character", character)
+        frames.append(summarize(sums, lexicon))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反派台词的情感/情绪得分")
+    parser.add_argument("--window", type=int, default=20, help="滑动窗口的台词句数")
+    parser.add_argument("--step", type=int, default=10, help="滑动窗口步长")
+    args = parser.parse_args()
+
+    csv_path = OUTPUT_DIR / "villain_lines.csv"
+    if not csv_path.exists():
+        print(f"错误: 找不到数据文件 {csv_path}")
+        print("请先运行 extract_word.py 提取台词数据")
+        return
+    lexicon = get_lexicon()
+    if lexicon is None:
+        print(f"错误: 找不到情感词典 {LEXICON_PATH}")
+        return
+
+    from config import VILLAINS
+    from jieba_setup import init_jieba
+    from main import load_stopwords, load_synonyms
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    df = df[df["character"].isin(VILLAINS)]
+    stopwords = load_stopwords(os.path.join(DATA_DIR, "stopwords.txt"))
+    synonyms = load_synonyms(os.path.join(DATA_DIR, "synonyms.json"))
+    init_jieba(synonyms, VILLAINS)
+
+    scores = score_lines(df["text"], stopwords, synonyms, lexicon)
+    outputs = {
+        "sentiment_by_character.csv": aggregate(df, scores, ["character"], lexicon),
+        "sentiment_by_act.csv": aggregate(df, scores, ["character", "play", "act"], lexicon),
+        "sentiment_windows.csv": window_scores(df, scores, lexicon, args.window, args.step),
+    }
+    for name, table in outputs.items():
+        table.to_csv(OUTPUT_DIR / name, index=False, encoding="utf-8-sig")
+        print(f"✓ 已保存: {OUTPUT_DIR / name}（{len(table)} 行）")
+
+    by_character = outputs["sentiment_by_character.csv"]
+    print("\n各角色情感倾向:")
+    print(by_character[["character", "lines", "sentiment",
+                        *(f"emotion_{e}_per_1000" for e in lexicon.emotions)]].to_string(index=False))
+    return outputs
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+角色相似度检索：基于特征向量回答"哪些角色说话最像伊阿古"
+特征向量 = villain_features 指标列 + 词语分布（term profile）
+"""
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+
+# 参与相似度计算的指标列（与 villain_features.csv 一致）
+FEATURE_COLUMNS = [
+    "power_per_1000", "lie_per_1000", "ambition_per_1000",
+    "violence_per_1000", "fear_per_1000",
+    "avg_sentence_length", "complex_ratio", "command_ratio",
+]
+
+METRICS = ("cosine", "seuclidean")
+
+
+def build_term_profiles(token_counters, max_terms=2000, min_df=2):
+    """
+    把每个角色的词频 Counter 转为每千词频次矩阵
+    只保留在至少 min_df 个角色中出现、总频次最高的 max_terms 个词
+    """
+    doc_freq = Counter()
+    total_freq = Counter()
+    for counter in token_counters:
+        doc_freq.update(counter.keys())
+        total_freq.update(counter)
+
+    vocab = [tok for tok, _ in total_freq.most_common() if doc_freq[tok] >= min_df][:max_terms]
+    term_index = {tok: j for j, tok in enumerate(vocab)}
+
+    profiles = np.zeros((len(token_counters), len(vocab)), dtype=np.float32)
+    for i, counter in enumerate(token_counters):
+        total = sum(counter.values()) or 1
+        for tok, count in counter.items():
+            j = term_index.get(tok)
+            if j is not None:
+                profiles[i, j] = count / total * 1000
+    return profiles, vocab
+
+
+class CharacterIndex:
+    """
+    角色特征向量索引
+    - 每列先标准化（z-score），指标列与词语分布两部分各自按块加权
+    - 余弦相似度：行向量单位化后的矩阵乘法
+    - 标准化欧氏距离：||a||² + ||b||² - 2a·b，同样是一次矩阵乘法
+    """
+
+    def __init__(self, names, features, term_profiles=None, term_weight=1.0):
+        self.names = list(names)
+        self.name_to_row = {name: i for i, name in enumerate(self.names)}
+
+        blocks = [self._standardize(np.asarray(features, dtype=np.float64))]
+        if term_profiles is not None and term_profiles.shape[1] > 0:
+            # 词语维度远多于指标维度，按维度数缩放，避免淹没指标列
+            scale = term_weight * np.sqrt(blocks[0].shape[1] / term_profiles.shape[1])
+            blocks.append(self._standardize(np.asarray(term_profiles, dtype=np.float64)) * scale)
+        self.vectors = np.hstack(blocks).astype(np.float32)
+
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.unit_vectors = self.vectors / np.where(norms == 0, 1, norms)
+        self.sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    @staticmethod
+    def _standardize(matrix):
+        """按列 z-score 标准化，常数列置零"""
+        std = matrix.std(axis=0)
+        return (matrix - matrix.mean(axis=0)) / np.where(std == 0, 1, std)
+
+    @classmethod
+    def from_features(cls, features_df, token_counters=None, max_terms=2000, term_weight=1.0):
+        """从特征表（及可选的每角色词频）构建索引"""
+        feature_cols = [c for c in FEATURE_COLUMNS if c in features_df.columns]
+        profiles = None
+        if token_counters is not None:
+            profiles, _ = build_term_profiles(token_counters, max_terms=max_terms)
+        return cls(features_df["character"].tolist(),
+                   features_df[feature_cols].fillna(0).values,
+                   profiles, term_weight=term_weight)
+
+    def similarity_matrix(self, metric="cosine"):
+        """全部角色两两相似度（批量矩阵计算）"""
+        if metric == "cosine":
+            return self.unit_vectors @ self.unit_vectors.T
+        if metric == "seuclidean":
+            sq_dist = self.sq_norms[:, None] + self.sq_norms[None, :] - 2 * (self.vectors @ self.vectors.T)
+            return -np.sqrt(np.maximum(sq_dist, 0))
+        raise ValueError(f"未知的度量: {metric}（可选: {', '.join(METRICS)}）")
+
+    def _scores_for(self, row, metric):
+        """单个角色对全部角色的得分（越大越相似）"""
+        if metric == "cosine":
+            return self.unit_vectors @ self.unit_vectors[row]
+        if metric == "seuclidean":
+            sq_dist = self.sq_norms + self.sq_norms[row] - 2 * (self.vectors @ self.vectors[row])
+            return -np.sqrt(np.maximum(sq_dist, 0))
+        raise ValueError(f"未知的度量: {metric}（可选: {', '.join(METRICS)}）")
+
+    def top_k(self, character, k=5, metric="cosine"):
+        """
+        查询与某角色最相似的 k 个角色
+        返回 [(角色, 得分), ...]；余弦为相似度，标准化欧氏距离返回正的距离值
+        """
+        if character not in self.name_to_row:
+            raise KeyError(f"索引中没有角色: {character}")
+        row = self.name_to_row[character]
+        scores = self._scores_for(row, metric)
+        scores[row] = -np.inf  # 排除自己
+
+        k = min(k, len(self.names) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        sign = -1 if metric == "seuclidean" else 1
+        return [(self.names[i], round(float(sign * scores[i]), 4)) for i in top]
+
+
+def build_index_from_lines(lines_df, stopwords, synonyms, min_utterances=5, **kwargs):
+    """按角色计算特征与词频，构建索引（同名角色跨剧本时以"剧本/角色"区分）"""
+    from main import compute_features_for_group, features_to_row
+
+    lines_df = lines_df.copy()
+    if lines_df.groupby("character")["play"].nunique().max() > 1:
+        lines_df["character"] = lines_df["play"] + "/" + lines_df["character"]
+
+    rows, counters = [], []
+    for character, group_df in lines_df.groupby("character", sort=False):
+        if len(group_df) < min_utterances:
+            continue
+        feats = compute_features_for_group(group_df, stopwords, synonyms)
+        rows.append(features_to_row(character, feats))
+        counters.append(feats["token_counter"])
+
+    features_df = pd.DataFrame(rows)
+    return CharacterIndex.from_features(features_df, counters, **kwargs), features_df
+
+
+def main(query="伊阿古", k=5):
+    from main import DATA_DIR, load_stopwords, load_synonyms
+    from jieba_setup import init_jieba
+
+    csv_path = OUTPUT_DIR / "all_lines.csv"
+    if not csv_path.exists():
+        csv_path = OUTPUT_DIR / "villain_lines.csv"
+    if not csv_path.exists():
+        print(f"错误: 找不到台词数据 {csv_path}")
+        print("请先运行 extract_word.py 提取台词数据")
+        return
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    print(f"读取台词: {len(df)} 条, {df['character'].nunique()} 个角色 ({csv_path.name})")
+
+    stopwords = load_stopwords(str(Path(DATA_DIR) / "stopwords.txt"))
+    synonyms = load_synonyms(str(Path(DATA_DIR) / "synonyms.json"))
+    init_jieba(synonyms, df["character"].unique())
+    index, features_df = build_index_from_lines(df, stopwords, synonyms)
+    print(f"索引角色数: {len(index.names)}, 向量维度: {index.vectors.shape[1]}")
+
+    sim = pd.DataFrame(index.similarity_matrix("cosine"), index=index.names, columns=index.names)
+    out_path = OUTPUT_DIR / "character_similarity.csv"
+    sim.round(4).to_csv(out_path, encoding="utf-8-sig")
+    print(f"✓ 角色相似度矩阵已保存: {out_path}")
+
+    matches = [name for name in index.names if name == query or name.endswith(f"/{query}")]
+    if not matches:
+        print(f"警告: 索引中没有角色 {query}")
+        return index
+    for metric in METRICS:
+        print(f"\n与 {query} 最相似的角色（{metric}）:")
+        for i, (name, score) in enumerate(index.top_k(matches[0], k=k, metric=metric), 1):
+            print(f"  {i}. {name}: {score}")
+
+    return index
+
+
+if __name__ == "__main__":
+    main()
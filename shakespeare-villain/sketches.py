@@ -0,0 +1,232 @@
+"""
+近似计数草图（内存固定，与语料规模无关）
+- CountMinSketch：频次估计，只会高估；误差 <= epsilon * 总计数的概率至少为 1 - delta
+- HyperLogLog：不同键的个数（词表大小）估计，相对标准误差约 1.04 / sqrt(寄存器数)
+键为非负整数（词ID、词对ID、hash_tokens 得到的词哈希等），批量输入 numpy 数组，哈希全部向量化
+草图可序列化为 JSON（to_dict / from_dict），在检查点、分片结果中保存后再合并
+"""
+import base64
+import hashlib
+import math
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+# 乘法移位哈希的奇数乘数（64 位黄金分割常数派生）
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _hash_params(depth, seed):
+    """每行一组随机奇数乘数和偏移"""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, size=depth, dtype=np.uint64)
+    return multipliers, offsets
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def hash_tokens(tokens) -> np.ndarray:
+    """词 -> 稳定的 64 位哈希（与进程、词表无关，不同机器的草图可以合并）"""
+    return np.fromiter((_token_hash(t) for t in tokens), dtype=np.uint64)
+
+
+def _encode_array(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes())).decode("ascii")
+
+
+def _decode_array(data: str, dtype, shape) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).reshape(shape).copy()
+
+
+def _mix(keys):
+    """先把键打散（相邻的词ID哈希后也互不相关）"""
+    with np.errstate(over="ignore"):
+        keys = np.asarray(keys, dtype=np.uint64) * _GOLDEN
+        return keys ^ (keys >> np.uint64(29))
+
+
+class CountMinSketch:
+    """
+    depth 行 × width 列的计数表，width 取 2 的幂
+    每个键在每行落到一个格子，查询取各行最小值
+    """
+
+    def __init__(self, width=1 << 16, depth=4, seed=0):
+        self.bits = max(1, int(math.ceil(math.log2(width))))
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, self.width), dtype=np.int64)
+        self.total = 0
+        self._multipliers, self._offsets = _hash_params(depth, seed)
+
+    @classmethod
+    def from_error(cls, epsilon=1e-4, delta=1e-3, seed=0):
+        """按误差上界确定大小：width = e / epsilon，depth = ln(1 / delta)"""
+        width = int(math.ceil(math.e / epsilon))
+        depth = max(1, int(math.ceil(math.log(1 / delta))))
+        return cls(width, depth, seed)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def _columns(self, keys):
+        """depth × len(keys) 的列下标"""
+        mixed = _mix(keys)
+        shift = np.uint64(64 - self.bits)
+        with np.errstate(over="ignore"):
+            hashed = mixed[None, :] * self._multipliers[:, None] + self._offsets[:, None]
+        return (hashed >> shift).astype(np.int64)
+
+    def add(self, keys, counts=1):
+        keys = np.asarray(keys)
+        if keys.size == 0:
+            return
+        counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), keys.shape).ravel()
+        columns = self._columns(keys.ravel())
+        # 展平为 table 的一维下标：小批量（如逐句添加）时代价只与键数成正比，不必扫描整行
+        cells = (columns + np.arange(self.depth, dtype=np.int64)[:, None] * self.width).ravel()
+        flat = self.table.reshape(-1)
+        if len(cells) * 8 < flat.size:
+            np.add.at(flat, cells, np.tile(counts, self.depth))
+        else:
+            flat += np.bincount(cells, weights=np.tile(counts, self.depth), minlength=flat.size).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def query(self, keys) -> np.ndarray:
+        keys = np.asarray(keys)
+        if keys.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(keys.ravel())
+        rows = np.arange(self.depth)[:, None]
+        return self.table[rows, columns].min(axis=0).reshape(keys.shape)
+
+    def merge(self, other: "CountMinSketch"):
+        """合并同样参数的草图（分片结果相加）"""
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("只能合并宽度、深度和种子相同的 CountMinSketch")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_dict(self) -> dict:
+        return {"width": self.width, "depth": self.depth, "seed": self.seed, "total": self.total,
+                "table": _encode_array(self.table)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CountMinSketch":
+        sketch = cls(data["width"], data["depth"], data["seed"])
+        sketch.table = _decode_array(data["table"], np.int64, (sketch.depth, sketch.width))
+        sketch.total = data["total"]
+        return sketch
+
+
+class HyperLogLog:
+    """
+    2^precision 个寄存器；键哈希的高 precision 位选寄存器，其余位的前导零个数 + 1 取最大值
+    precision 至少为 11，保证其余位（<= 53 位）转为浮点数时没有精度损失
+    """
+
+    def __init__(self, precision=14, seed=0):
+        if not 11 <= precision <= 18:
+            raise ValueError("HyperLogLog 的 precision 取值范围为 11~18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.seed = seed
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        multipliers, offsets = _hash_params(1, seed)
+        self._multiplier, self._offset = multipliers[0], offsets[0]
+
+    @classmethod
+    def from_error(cls, error=0.01, seed=0):
+        """按相对标准误差确定寄存器数：m >= (1.04 / error)^2"""
+        precision = int(math.ceil(math.log2((1.04 / error) ** 2)))
+        return cls(min(max(precision, 11), 18), seed)
+
+    @property
+    def nbytes(self):
+        return self.registers.nbytes
+
+    def add(self, keys):
+        keys = np.asarray(keys)
+        if keys.size == 0:
+            return
+        with np.errstate(over="ignore"):
+            hashed = _mix(keys.ravel()) * self._multiplier + self._offset
+        index = (hashed >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest_bits = 64 - self.precision
+        rest = hashed & np.uint64((1 << rest_bits) - 1)
+        # 最高位 1 的位置：frexp 对 <= 53 位的整数是精确的
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest > 0, rest_bits - exponent + 1, rest_bits + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> int:
+        """不同键个数的估计（小基数时使用线性计数修正）"""
+        m = float(self.m)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: "HyperLogLog"):
+        if (self.precision, self.seed) != (other.precision, other.seed):
+            raise ValueError("只能合并精度和种子相同的 HyperLogLog")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "seed": self.seed, "registers": _encode_array(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        sketch = cls(data["precision"], data["seed"])
+        sketch.registers = _decode_array(data["registers"], np.uint8, (sketch.m,))
+        return sketch
+
+
+class VocabularySketch:
+    """
+    词频草图（CountMinSketch）+ 词表大小草图（HyperLogLog），用于超大语料的近似词汇统计
+    error: (epsilon, delta, cardinality_error)
+    """
+
+    def __init__(self, error=(1e-4, 1e-3, 0.01), frequency=None, vocabulary=None):
+        epsilon, delta, cardinality_error = error
+        self.error = tuple(error)
+        self.frequency = frequency or CountMinSketch.from_error(epsilon, delta)
+        self.vocabulary = vocabulary or HyperLogLog.from_error(cardinality_error)
+
+    def add_tokens(self, tokens):
+        keys = hash_tokens(tokens)
+        self.frequency.add(keys)
+        self.vocabulary.add(keys)
+
+    def query(self, tokens) -> np.ndarray:
+        """词频估计（只会高估）"""
+        return self.frequency.query(hash_tokens(tokens))
+
+    def vocabulary_size(self) -> int:
+        return self.vocabulary.count()
+
+    def merge(self, other: "VocabularySketch"):
+        self.frequency.merge(other.frequency)
+        self.vocabulary.merge(other.vocabulary)
+        return self
+
+    def to_dict(self) -> dict:
+        return {"error": list(self.error), "frequency": self.frequency.to_dict(),
+                "vocabulary": self.vocabulary.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VocabularySketch":
+        return cls(data["error"], CountMinSketch.from_dict(data["frequency"]),
+                   HyperLogLog.from_dict(data["vocabulary"]))
@@ -0,0 +1,116 @@
+"""
+角色名索引：把角色名的各种写法折叠成同一个键，识别台词行首的发言者
+- 折叠：去掉全角/半角空白（排版时的"国  王"、"班  柯"）、间隔号等标点，繁体字转简体（normalize.py 的转换表）
+- 别名（"国王" -> "克劳狄斯"）与角色名放在同一个字典里，识别一行只需沿行首逐字查字典，
+  与别名数量无关
+- 名字后面必须紧跟分隔符（空白、冒号、括号）或行尾，"麦克白夫人"不会被识别为"麦克白"
+"""
+from collections import Counter
+import re
+
+from normalize import TRADITIONAL_TO_SIMPLIFIED
+
+# 折叠时删除的字符：空白、间隔号及名字中偶尔夹杂的点号
+_NAME_DELETE = " \t\u3000\u00a0·•・．."
+NAME_TABLE = str.maketrans({**TRADITIONAL_TO_SIMPLIFIED, **{c: None for c in _NAME_DELETE}})
+
+WHITESPACE = " \t\u3000\u00a0"
+# 名字之后允许出现的分隔符
+SEPARATORS = frozenset(WHITESPACE + "：:(（")
+# 行首可忽略的项目符号
+LEADING_MARKS = WHITESPACE + "·•・"
+
+
+def fold_name(name: str) -> str:
+    """角色名的规范形式"""
+    return name.translate(NAME_TABLE)
+
+
+def _is_name_char(ch: str) -> bool:
+    return "\u4e00" <= ch <= "\u9fff" or ch.isalpha()
+
+
+class SpeakerIndex:
+    """规范化角色名/别名 -> 标准角色名"""
+
+    def __init__(self, aliases: dict = None):
+        self.names = {}
+        self.max_length = 0
+        for alias, canonical in (aliases or {}).items():
+            self.add(alias, canonical)
+
+    def add(self, alias: str, canonical: str = None):
+        key = fold_name(alias)
+        if key:
+            self.names[key] = canonical or key
+            self.max_length = max(self.max_length, len(key))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return fold_name(name) in self.names
+
+    def get(self, name, default=None):
+        return self.names.get(fold_name(name), default)
+
+    def match(self, line: str):
+        """
+        行首发言者：返回 (标准角色名, 台词)，不是台词行时返回 None
+        沿行首逐字折叠（跳过空白），最多查 max_length 次字典，取最长的有效名字
+        """
+        n = len(line)
+        i = 0
+        while i < n and line[i] in LEADING_MARKS:
+            i += 1
+        folded = ""
+        best = None
+        while i < n and len(folded) < self.max_length:
+            ch = line[i]
+            i += 1
+            if ch in WHITESPACE:
+                continue
+            ch = ch.translate(NAME_TABLE)
+            if not ch:
+                continue
+            if not _is_name_char(ch):
+                break
+            folded += ch
+            canonical = self.names.get(folded)
+            if canonical is not None and (i == n or line[i] in SEPARATORS):
+                best = (canonical, i)
+        if best is None:
+            return None
+        canonical, end = best
+        dialogue = line[end:].strip(WHITESPACE).lstrip("：:").strip()
+        return canonical, dialogue
+
+
+# 候选发言者（用于从剧本中发现角色名）：角色名 + 冒号或两个以上空格 + 台词
+SPEAKER_LINE_PATTERN = re.compile(r"^([\u4e00-\u9fff·]{2,8})(?:\s*[：:]\s*|\s{2,})(.+)$")
+# 字间有空格的角色名："班  柯  台词"
+SPACED_SPEAKER_PATTERN = re.compile(r"^([\u4e00-\u9fff](?:[ \u3000]{1,6}[\u4e00-\u9fff]){1,3})(?:\s*[：:]\s*|\s{2,})(.+)$")
+# 误识别为角色名的行首（场次、页眉等）
+NON_SPEAKER_PATTERN = re.compile(r"^(第[一二三四五六七八九十]+[幕场]|莎士比亚全集)")
+
+
+def discover_speakers(lines, min_turns=3) -> Counter:
+    """统计形如台词行的行首名字（已折叠），出现少于 min_turns 次的视为噪声（人物表、舞台说明等）"""
+    counts = Counter()
+    for line in lines:
+        line = line.strip()
+        match = SPEAKER_LINE_PATTERN.match(line) or SPACED_SPEAKER_PATTERN.match(line)
+        if not match or len(match.group(2).strip()) <= 2:
+            continue
+        name = fold_name(match.group(1))
+        if not NON_SPEAKER_PATTERN.match(name):
+            counts[name] += 1
+    return Counter({name: c for name, c in counts.items() if c >= min_turns})
+
+
+def build_speaker_index(lines, aliases: dict = None, min_turns=3) -> SpeakerIndex:
+    """剧本中发现的角色名 + 显式别名（别名优先）"""
+    index = SpeakerIndex({name: name for name in discover_speakers(lines, min_turns)})
+    for alias, canonical in (aliases or {}).items():
+        index.add(alias, canonical)
+    return index
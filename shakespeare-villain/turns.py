@@ -0,0 +1,143 @@
+"""
+话轮序列：由 extract_word.extract_speaker_turns 单遍扫描全文得到的台词记录构建所有角色的发言顺序
+（扫描时顺带记下每个话轮的最后一行是否被打断，这里不再重新扫描全文）
+- 邻接矩阵：同一场内谁紧接着谁发言
+- 对话对象（to）：台词中的呼语（"……，伊阿古！"）优先，否则取上一位发言者，再否则取下一位
+- 打断（is_interrupt）：上一话轮以"——"或"……"结尾，且换了发言者
+"""
+import re
+
+import numpy as np
+
+# 场次/幕次标题：话轮不跨场衔接
+SCENE_BREAK = re.compile(r"^第\s*[一二三四五六七八九十]+\s*[幕场]")
+# 舞台说明中不带角色名的形式："(同下。)"、"同下。"、"众下。"
+BRACKETED_DIRECTION = r"^[(（\[［【].*[)）\]］】]$"
+BARE_EXIT = r"^(?:众人?|同|余众|均)?(?:下|退场|下场)。?$"
+# "殿下"、"天下"、"心上"等以上/下结尾的普通词，不是上场/下场
+NOT_ENTRANCE_EXIT = "殿陛天地手部在之心晚身头马世面台脸床"
+# 话轮结尾被打断的标志（允许后面跟右引号/括号）
+INTERRUPTED_END = re.compile(r"(?:—{2,}|…+|\.{3,})[”’」』）)]*$")
+VOCATIVE_PUNCT = "，,！!？?。；;"
+
+
+class TurnGraph:
+    """
+    一个剧本的话轮结构
+    - speakers: 角色名列表，下标即角色ID
+    - line_nos / speaker_ids / addressee_ids / interrupts: 每个话轮一项（addressee_id 为 -1 表示未知）
+    - adjacency[a, b]: 角色 b 紧接在角色 a 之后发言的次数
+    """
+
+    def __init__(self, speakers, line_nos, speaker_ids, addressee_ids, interrupts, adjacency):
+        self.speakers = speakers
+        self.line_nos = line_nos
+        self.speaker_ids = speaker_ids
+        self.addressee_ids = addressee_ids
+        self.interrupts = interrupts
+        self.adjacency = adjacency
+
+    def __len__(self):
+        return len(self.line_nos)
+
+    def annotations(self) -> dict:
+        """行号 -> (对话对象, 是否打断)"""
+        return {
+            int(line_no): (self.speakers[a] if a >= 0 else "", int(flag))
+            for line_no, a, flag in zip(self.line_nos, self.addressee_ids, self.interrupts)
+        }
+
+    def edges(self, play_name: str = "") -> list:
+        """邻接矩阵中的非零边：[{play, from, to, count}, ...]"""
+        rows, cols = np.nonzero(self.adjacency)
+        return [
+            {"play": play_name, "from": self.speakers[a], "to": self.speakers[b],
+             "count": int(self.adjacency[a, b])}
+            for a, b in zip(rows, cols)
+        ]
+
+
+def stage_direction_pattern(names):
+    """
+    舞台说明（不算台词的延续）：括号括起的说明、"同下。"等，
+    以及含剧中角色名的上场/下场（"罗德利哥及伊阿古上。"、"麦克德夫重上。"），
+    普通台词"我忠心耿耿地侍奉殿下。"不算
+    """
+    forms = [BRACKETED_DIRECTION, BARE_EXIT]
+    names = sorted({n for n in names if n}, key=len, reverse=True)
+    if names:
+        alternatives = "|".join(re.escape(n) for n in names)
+        forms.append(rf"^(?=.{{0,40}}$)(?=.*(?:{alternatives}))[^！？!?]*"
+                     rf"(?<![{NOT_ENTRANCE_EXIT}])(?:上|下|退场|下场)。?$")
+    return re.compile("|".join(forms))
+
+
+def is_interrupted(tail) -> bool:
+    """话轮最后一行（不含舞台说明）是否以"——"/"……"结尾"""
+    return bool(tail and INTERRUPTED_END.search(tail))
+
+
+def _vocative_pattern(names):
+    """所有角色名的呼语正则：名字前是行首/标点/空白，名字后紧跟标点"""
+    alternatives = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    punct = re.escape(VOCATIVE_PUNCT)
+    return re.compile(rf"(?:^|(?<=[{punct}\s]))({alternatives})(?=[{punct}])")
+
+
+def build_turn_graph(records, turn_tails) -> TurnGraph:
+    """
+    records: extract_speaker_turns 产出的台词记录（按原文顺序，每条一个话轮；用到 line_no、character、text）
+    turn_tails: 与 records 对齐的 (场次序号, 话轮最后一行是否被打断)（extract_speaker_turns 的 turn_tails 参数填写）
+    """
+    speakers = sorted({r["character"] for r in records})
+    speaker_index = {name: i for i, name in enumerate(speakers)}
+    vocative = _vocative_pattern(speakers) if speakers else None
+
+    line_nos, speaker_ids, vocatives = [], [], []
+    for record in records:
+        sid = speaker_index[record["character"]]
+        line_nos.append(record["line_no"])
+        speaker_ids.append(sid)
+        addressee = -1
+        if vocative is not None:
+            for match in vocative.finditer(record["text"]):
+                other = speaker_index[match.group(1)]
+                if other != sid:
+                    addressee = other
+                    break
+        vocatives.append(addressee)
+    scene_ids = [scene for scene, _ in turn_tails]
+    ended_cut = [cut for _, cut in turn_tails]
+
+    n_turns = len(line_nos)
+    n_speakers = len(speakers)
+    speaker_ids = np.asarray(speaker_ids, dtype=np.int32)
+    scene_ids = np.asarray(scene_ids, dtype=np.int32)
+    addressee_ids = np.asarray(vocatives, dtype=np.int32)
+    ended_cut = np.asarray(ended_cut, dtype=bool)
+
+    # 同一场内相邻且换人的话轮
+    if n_turns > 1:
+        prev, cur = speaker_ids[:-1], speaker_ids[1:]
+        handover = (scene_ids[:-1] == scene_ids[1:]) & (prev != cur)
+    else:
+        prev = cur = np.zeros(0, dtype=np.int32)
+        handover = np.zeros(0, dtype=bool)
+
+    adjacency = np.zeros((n_speakers, n_speakers), dtype=np.int32)
+    np.add.at(adjacency, (prev[handover], cur[handover]), 1)
+
+    interrupts = np.zeros(n_turns, dtype=bool)
+    interrupts[1:] = handover & ended_cut[:-1]
+
+    # 没有呼语时：回应上一位发言者，否则（场首）面向下一位发言者
+    missing = addressee_ids < 0
+    from_prev = np.zeros(n_turns, dtype=bool)
+    from_prev[1:] = handover & missing[1:]
+    addressee_ids[1:][from_prev[1:]] = prev[from_prev[1:]]
+    from_next = np.zeros(n_turns, dtype=bool)
+    from_next[:-1] = handover & (addressee_ids[:-1] < 0)
+    addressee_ids[:-1][from_next[:-1]] = cur[from_next[:-1]]
+
+    return TurnGraph(speakers, np.asarray(line_nos, dtype=np.int64), speaker_ids,
+                     addressee_ids, interrupts.astype(np.int8), adjacency)
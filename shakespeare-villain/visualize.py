@@ -6,6 +6,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
+from metrics import timed
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'STHeiti']
@@ -15,27 +16,42 @@ BASE_DIR = Path(__file__).parent
 OUTPUT_DIR = BASE_DIR / "output"
 
 
-def create_radar_chart(df: pd.DataFrame):
+def create_radar_chart(df: pd.DataFrame, output_dir=OUTPUT_DIR):
     """创建雷达图：展示三个反派在多个维度上的差异"""
     # 选择要展示的指标
     metrics = [
         "power_per_1000",
         "lie_per_1000",
         "ambition_per_1000",
+        "violence_per_1000",
+        "fear_per_1000",
         "avg_sentence_length",
         "complex_ratio",
-        "command_ratio"
+        "command_ratio",
+        "negativity",
+        "emotion_anger_per_1000",
     ]
     
     metric_labels = {
         "power_per_1000": "权力词汇",
         "lie_per_1000": "谎言词汇",
         "ambition_per_1000": "野心词汇",
+        "violence_per_1000": "暴力词汇",
+        "fear_per_1000": "恐惧词汇",
         "avg_sentence_length": "平均句长",
         "complex_ratio": "复杂句比例",
-        "command_ratio": "指令句比例"
+        "command_ratio": "指令句比例",
+        "negativity": "负面情感",
+        "emotion_anger_per_1000": "愤怒情绪",
     }
     
+    # 情感倾向取反，轴向外表示越负面（与其他"越多越强"的轴一致）
+    df = df.copy()
+    if "sentiment" in df.columns:
+        df["negativity"] = -df["sentiment"]
+    # 特征表中没有的指标（旧数据、关键词配置中没有的分组）不画
+    metrics = [m for m in metrics if m in df.columns]
+    
     # 归一化数据（0-1范围）
     df_normalized = df.copy()
     for metric in metrics:
@@ -83,13 +99,13 @@ def create_radar_chart(df: pd.DataFrame):
     ax.grid(True)
     
     plt.tight_layout()
-    output_path = OUTPUT_DIR / "radar_chart.png"
+    output_path = Path(output_dir) / "radar_chart.png"
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"✓ 雷达图已保存: {output_path}")
     plt.close()
 
 
-def create_bar_charts(df: pd.DataFrame):
+def create_bar_charts(df: pd.DataFrame, output_dir=OUTPUT_DIR):
     """创建柱状图：展示关键词频次对比"""
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
     fig.suptitle('莎士比亚反派性格量化特征对比', fontsize=16, fontweight='bold')
@@ -155,14 +171,15 @@ def create_bar_charts(df: pd.DataFrame):
         ax4.grid(axis='y', alpha=0.3)
     
     plt.tight_layout()
-    output_path = OUTPUT_DIR / "bar_charts.png"
+    output_path = Path(output_dir) / "bar_charts.png"
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"✓ 柱状图已保存: {output_path}")
     plt.close()
 
 
-def main():
-    csv_path = OUTPUT_DIR / "villain_features.csv"
+@timed("visualize")
+def main(output_dir=OUTPUT_DIR):
+    csv_path = Path(output_dir) / "villain_features.csv"
     
     if not csv_path.exists():
         print(f"错误: 找不到特征数据文件 {csv_path}")
@@ -173,8 +190,8 @@ def main():
     print(f"读取特征数据: {len(df)} 个角色")
     
     # 创建可视化
-    create_radar_chart(df)
-    create_bar_charts(df)
+    create_radar_chart(df, output_dir)
+    create_bar_charts(df, output_dir)
     
     print("\n✓ 所有可视化图表已生成完成！")
 
@@ -0,0 +1,151 @@
+"""
+词表与词ID处理流水线：
+分词结果先转成整数ID，停用词过滤、单字过滤、同义词归并都预先编成 ID 查找表，
+对整个 ID 数组做向量化运算，而不是逐词 Python 循环
+
+关键词匹配阶段（config.KEYWORD_MATCH_STAGE）：
+- "raw":    关键词与归并前的词比较，"王冠"只匹配"王冠"
+- "folded": 关键词与归并后的词比较，关键词本身也按同义词表归并，
+            因此列出"王冠"的分组会统计所有归并为"权力"的词
+"""
+import numpy as np
+
+from config import KEYWORD_MATCH_STAGE
+
+MATCH_STAGES = ("raw", "folded")
+
+
+class Vocabulary:
+    """词 <-> 整数ID 的双向映射（只增不减）"""
+
+    def __init__(self):
+        self.token_to_id = {}
+        self.id_to_token = []
+
+    def __len__(self):
+        return len(self.id_to_token)
+
+    def intern(self, token: str) -> int:
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.id_to_token)
+            self.token_to_id[token] = token_id
+            self.id_to_token.append(token)
+        return token_id
+
+    def encode(self, tokens) -> np.ndarray:
+        return np.fromiter((self.intern(t) for t in tokens), dtype=np.int32)
+
+    def decode(self, ids):
+        return [self.id_to_token[i] for i in ids]
+
+    def ids_of(self, tokens) -> np.ndarray:
+        """已在词表中的词的ID（不在词表中的词不会出现在任何文本里，直接忽略）"""
+        ids = [self.token_to_id[t] for t in tokens if t in self.token_to_id]
+        return np.asarray(ids, dtype=np.int32)
+
+
+class TokenPipeline:
+    """
+    ID 级处理流水线
+    - keep[id]: 去首尾空白后长度 >= min_length 且不是停用词
+    - fold[id]: 去首尾空白并按同义词表归并后的词ID
+    词表增长时只为新增ID补算查找表
+    """
+
+    def __init__(self, vocab: Vocabulary, stopwords: set, synonyms: dict, min_length: int = 2):
+        self.vocab = vocab
+        self.stopwords = stopwords
+        self.synonyms = synonyms
+        self.min_length = min_length
+        self.keep = np.zeros(0, dtype=bool)
+        self.fold = np.zeros(0, dtype=np.int32)
+
+    def _sync_tables(self):
+        start = len(self.keep)
+        end = len(self.vocab)
+        if start == end:
+            return
+        keep = np.empty(end - start, dtype=bool)
+        fold = np.empty(end - start, dtype=np.int32)
+        for offset, token in enumerate(self.vocab.id_to_token[start:end]):
+            stripped = token.strip()
+            keep[offset] = len(stripped) >= self.min_length and stripped not in self.stopwords
+            fold[offset] = self.vocab.intern(self.synonyms.get(stripped, stripped))
+        # 归并目标词可能是新词，再补一轮
+        self.keep = np.concatenate([self.keep, keep])
+        self.fold = np.concatenate([self.fold, fold])
+        self._sync_tables()
+
+    def encode(self, tokens) -> np.ndarray:
+        """分词结果 -> 过滤后的（归并前）词ID数组"""
+        return self.filter(self.vocab.encode(tokens))
+
+    def filter(self, ids: np.ndarray) -> np.ndarray:
+        """未过滤的词ID数组 -> 去掉停用词、单字后的词ID数组"""
+        self._sync_tables()
+        return ids[self.keep[ids]]
+
+    def folded(self, ids: np.ndarray) -> np.ndarray:
+        """同义词归并（向量化查表）"""
+        self._sync_tables()
+        return self.fold[ids]
+
+    def keyword_ids(self, keywords, stage: str = KEYWORD_MATCH_STAGE) -> np.ndarray:
+        """
+        关键词分组在"归并前"ID空间中对应的全部词ID
+        stage="folded" 时，包含所有归并后落入该分组的词（含同义词来源）
+        """
+        if stage not in MATCH_STAGES:
+            raise ValueError(f"未知的关键词匹配阶段: {stage}（可选: {', '.join(MATCH_STAGES)}）")
+        ids = self.vocab.ids_of(keywords)
+        if stage == "raw":
+            return ids
+        self._sync_tables()
+        targets = np.unique(self.fold[ids])
+        return np.flatnonzero(np.isin(self.fold, targets)).astype(np.int32)
+
+
+def expand_keywords(keywords, synonyms: dict, stage: str = KEYWORD_MATCH_STAGE) -> set:
+    """
+    把关键词分组展开为"归并前"的词集合（用于已保存的归并前词频）
+    stage="folded" 时加入归并目标相同的所有同义词
+    """
+    if stage not in MATCH_STAGES:
+        raise ValueError(f"未知的关键词匹配阶段: {stage}（可选: {', '.join(MATCH_STAGES)}）")
+    words = set(keywords)
+    if stage == "raw":
+        return words
+    targets = {synonyms.get(k, k) for k in words}
+    words |= targets
+    words |= {src for src, dst in synonyms.items() if dst in targets}
+    return words
+
+
+_vocab = Vocabulary()
+_pipeline = None
+
+
+def get_pipeline(stopwords: set, synonyms: dict, min_length: int = 2) -> TokenPipeline:
+    """
+    进程内共享词表，只缓存最近一条流水线（查找表只算一次）
+    传入的停用词/同义词表与缓存的是同一对象或内容相同时直接复用；否则替换，旧的查找表随之释放
+    """
+    global _pipeline
+    cached = _pipeline
+    if cached is not None and cached.min_length == min_length and cached.vocab is _vocab:
+        if cached.stopwords is stopwords and cached.synonyms is synonyms:
+            return cached
+        # 每次运行都会重新读取停用词/同义词表：内容没变时沿用已算好的查找表
+        if cached.stopwords == stopwords and cached.synonyms == synonyms:
+            cached.stopwords, cached.synonyms = stopwords, synonyms
+            return cached
+    _pipeline = TokenPipeline(_vocab, stopwords, synonyms, min_length)
+    return _pipeline
+
+
+def reset_vocabulary():
+    """清空进程内共享的词表和流水线（批处理中每个任务开始时调用，词表不随任务数增长）"""
+    global _vocab, _pipeline
+    _vocab = Vocabulary()
+    _pipeline = None
@@ -0,0 +1,254 @@
+"""
+监视模式：持续监视项目根目录中的Word文档，新增或修改后自动提取台词并增量更新特征
+
+用法：
+    python watch.py                  # 持续监视
+    python watch.py --once           # 处理一次当前文档后退出
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from config import VILLAINS
+from metrics import DOCUMENTS, ERRORS, EXTRACTED_LINES, LINES, record_stage, serve, timed
+from extract_word import (
+    PLAY_CONFIGS, find_word_files, is_skipped_file, process_document,
+    build_lines_dataframe, save_speaker_lines, save_turn_edges, file_hash,
+)
+
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output"
+# 提取失败后重试的最长间隔（秒）
+MAX_RETRY_DELAY = 300.0
+
+
+def file_signature(path):
+    """文件签名：(修改时间, 大小)，任一变化即视为文档已改动"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DocumentWatcher:
+    """
+    轮询式文档监视器
+    - 签名连续 debounce 秒不变才认为写入完成（避免处理正在保存的文件）
+    - 只把新增/变化的文档交给进程池提取；字节内容与已处理文件相同（副本、仅 touch）的直接跳过
+    - 提取出错（如文件仍被锁定、尚未写完）的文档留在待处理列表中，按指数退避重试；文件再次变化时立即重新计时
+    - 提取完成后重写台词CSV，并只重算受影响角色的特征
+    """
+
+    def __init__(self, watch_dir, output_dir=OUTPUT_DIR, interval=2.0, debounce=3.0, workers=2):
+        self.watch_dir = Path(watch_dir)
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.debounce = debounce
+        self.workers = workers
+        self.processed = {}   # 文件 -> 已处理的签名
+        self.pending = {}     # 文件 -> (最近签名, 最近一次变化时间)
+        self.results = {}     # 剧本名 -> process_document 的结果
+        self.content_owner = {}  # 文件内容哈希 -> 最先处理该内容的文件
+        self.retries = {}     # 提取失败的文件 -> (失败次数, 下次重试时间)
+
+    def scan(self):
+        """当前目录中所有待监视文档的签名"""
+        snapshot = {}
+        for path in find_word_files(self.watch_dir):
+            if is_skipped_file(path):
+                continue
+            try:
+                snapshot[path] = file_signature(path)
+            except FileNotFoundError:
+                continue  # 扫描过程中被删除
+        return snapshot
+
+    def ready_documents(self, snapshot, now):
+        """根据最新快照更新待处理列表，返回写入已稳定的文档"""
+        ready = []
+        for path, signature in snapshot.items():
+            if self.processed.get(path) == signature:
+                self.pending.pop(path, None)
+                continue
+            last_signature, changed_at = self.pending.get(path, (None, now))
+            if signature != last_signature:
+                self.pending[path] = (signature, now)
+                self.retries.pop(path, None)
+            elif now - changed_at >= self.debounce and now >= self.retries.get(path, (0, now))[1]:
+                ready.append(path)
+        for path in set(self.pending) - set(snapshot):
+            del self.pending[path]
+            self.retries.pop(path, None)
+        return ready
+
+    def schedule_retry(self, path):
+        """提取失败：不标记为已处理，等待 debounce * 2^(失败次数-1) 秒（不超过 MAX_RETRY_DELAY）后重试"""
+        attempts = self.retries.get(path, (0, 0.0))[0] + 1
+        delay = min(self.debounce * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+        self.retries[path] = (attempts, time.monotonic() + delay)
+        return delay
+
+    def skip_duplicates(self, paths, snapshot):
+        """
+        按文件内容哈希过滤：内容已成功处理过的文档不再提取
+        返回 [(路径, 内容哈希)]；内容哈希在提取成功后才登记（见 process），失败的内容之后仍会重试
+        同一批中内容相同的文档只提取第一个，其余留在待处理列表中，下一轮再判断
+        """
+        fresh = []
+        batch = {}
+        for path in paths:
+            try:
+                digest = file_hash(path)
+            except FileNotFoundError:
+                continue
+            owner = self.content_owner.get(digest)
+            if owner is not None and (owner == path or owner.exists()):
+                if owner != path:
+                    print(f"  跳过: {path.name}（与 {owner.name} 内容相同）")
+                self.processed[path] = snapshot[path]
+                self.pending.pop(path, None)
+                continue
+            # 文件内容变了：它之前登记的内容哈希作废
+            self.content_owner = {d: p for d, p in self.content_owner.items() if p != path}
+            if digest in batch:
+                continue
+            batch[digest] = path
+            fresh.append((path, digest))
+        return fresh
+
+    async def process(self, executor, paths, snapshot):
+        """在进程池中提取文档，返回内容发生变化的剧本"""
+        loop = asyncio.get_running_loop()
+        fresh = self.skip_duplicates(paths, snapshot)
+        futures = [
+            loop.run_in_executor(executor, process_document, str(path), str(self.output_dir))
+            for path, _ in fresh
+        ]
+        changed_plays = set()
+        for (path, digest), future in zip(fresh, futures):
+            try:
+                result = await future
+            except Exception as e:
+                delay = self.schedule_retry(path)
+                print(f"  处理 {path.name} 时出错: {e}（{delay:.0f}s 后重试）")
+                ERRORS.inc(stage="extract", document=path.name)
+                continue
+            # 提取成功后才标记为已处理并登记内容哈希，失败的文档及其内容之后会重试
+            self.processed[path] = snapshot[path]
+            self.pending.pop(path, None)
+            self.retries.pop(path, None)
+            self.content_owner[digest] = path
+            if result is None:
+                print(f"  跳过: {path.name}（无法识别剧本）")
+                continue
+            previous = self.results.get(result["play"])
+            if previous is not None and previous["text_hash"] == result["text_hash"]:
+                print(f"  {path.name} -> {result['play']}: 文本未变化，无需重算")
+                continue
+            print(f"  ✓ {path.name} -> {result['play']}: {len(result['lines'])} 条台词")
+            DOCUMENTS.inc(stage="extract")
+            LINES.inc(len(result["speaker_lines"]) or len(result["lines"]), stage="extract")
+            self.results[result["play"]] = result
+            changed_plays.add(result["play"])
+        return changed_plays
+
+    def write_lines(self):
+        """按剧本顺序重写 villain_lines.csv、all_lines.csv 与 turn_edges.csv"""
+        ordered = [self.results[p] for p in PLAY_CONFIGS if p in self.results]
+        all_lines = [line for r in ordered for line in r["lines"]]
+        all_speaker_lines = [line for r in ordered for line in r["speaker_lines"]]
+        if all_speaker_lines:
+            save_speaker_lines(all_speaker_lines, self.output_dir)
+            save_turn_edges([e for r in ordered for e in r["turn_edges"]], self.output_dir)
+        if not all_lines:
+            return None
+        df = build_lines_dataframe(all_lines)
+        df.to_csv(self.output_dir / "villain_lines.csv", index=False, encoding="utf-8-sig")
+        for (play, character), count in df.groupby(["play", "character"]).size().items():
+            EXTRACTED_LINES.set(count, play=play, character=character)
+        return df
+
+    @timed("features")
+    def update_features(self, lines_df, changed_plays):
+        """只重算发生变化的剧本对应角色的特征，其余行沿用已有结果"""
+        from main import DATA_DIR, compute_features_for_group, features_to_row, load_stopwords, load_synonyms
+        from jieba_setup import init_jieba
+
+        characters = {PLAY_CONFIGS[p]["character"] for p in changed_plays}
+        stopwords = load_stopwords(os.path.join(DATA_DIR, "stopwords.txt"))
+        synonyms = load_synonyms(os.path.join(DATA_DIR, "synonyms.json"))
+        init_jieba(synonyms, VILLAINS)
+
+        features_path = self.output_dir / "villain_features.csv"
+        rows = {}
+        if features_path.exists():
+            existing = pd.read_csv(features_path, encoding="utf-8-sig")
+            rows = {r["character"]: r for r in existing.to_dict("records")}
+        for character in characters:
+            group_df = lines_df[lines_df["character"] == character]
+            if group_df.empty:
+                rows.pop(character, None)
+                continue
+            feats = compute_features_for_group(group_df, stopwords, synonyms)
+            rows[character] = features_to_row(character, feats)
+            print(f"  ✓ 已重算 {character} 的特征")
+
+        ordered = [rows[v] for v in VILLAINS if v in rows]
+        pd.DataFrame(ordered).to_csv(features_path, index=False, encoding="utf-8-sig")
+
+    async def run(self, once=False):
+        """监视循环；once=True 时处理完当前已稳定的文档即退出"""
+        self.output_dir.mkdir(exist_ok=True)
+        print(f"正在监视: {self.watch_dir}（轮询间隔 {self.interval}s，防抖 {self.debounce}s）")
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                snapshot = self.scan()
+                now = time.monotonic()
+                if once:
+                    # 单次模式：跳过防抖等待，直接处理当前全部文档
+                    ready = [p for p, sig in snapshot.items() if self.processed.get(p) != sig]
+                else:
+                    ready = self.ready_documents(snapshot, now)
+
+                if ready:
+                    print(f"\n检测到 {len(ready)} 个新增/修改的文档")
+                    start = time.perf_counter()
+                    changed_plays = await self.process(executor, ready, snapshot)
+                    record_stage("extract", time.perf_counter() - start)
+                    if changed_plays:
+                        lines_df = self.write_lines()
+                        if lines_df is not None:
+                            await asyncio.get_running_loop().run_in_executor(
+                                None, self.update_features, lines_df, changed_plays
+                            )
+
+                if once:
+                    return
+                await asyncio.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视Word文档并增量提取台词")
+    parser.add_argument("--dir", default=str(BASE_DIR.parent), help="监视目录（默认项目根目录）")
+    parser.add_argument("--interval", type=float, default=2.0, help="轮询间隔（秒）")
+    parser.add_argument("--debounce", type=float, default=3.0, help="文件大小和修改时间保持不变多久后才处理（秒）")
+    parser.add_argument("--workers", type=int, default=2, help="提取进程数")
+    parser.add_argument("--once", action="store_true", help="处理一次后退出")
+    parser.add_argument("--metrics-port", type=int, help="在本地该端口开启 /metrics 指标端点")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        serve(args.metrics_port)
+
+    watcher = DocumentWatcher(args.dir, interval=args.interval, debounce=args.debounce, workers=args.workers)
+    try:
+        asyncio.run(watcher.run(once=args.once))
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+
+
+if __name__ == "__main__":
+    main()